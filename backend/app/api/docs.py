@@ -1,13 +1,13 @@
 from fastapi import APIRouter
 from app.models.docs import DocSearchRequest, DocSearchResponse
-from app.services.rag import search_docs
+from app.services.rag import search_docs, search_cache_stats, shard_stats
 
 router = APIRouter(prefix="/docs", tags=["docs"])
 
 @router.post("/search", response_model=DocSearchResponse)
 def docs_search(req: DocSearchRequest):
     try:
-        snippets = search_docs(req.query, top_k=req.top_k)
+        snippets = search_docs(req.query, top_k=req.top_k, library=req.library)
     except RuntimeError as e:
         # Log and return no results instead of crashing
         print(f"[docs/search] Error: {e}")
@@ -17,3 +17,19 @@ def docs_search(req: DocSearchRequest):
         query=req.query, 
         results=snippets
     )
+
+
+@router.get("/cache")
+def docs_cache_stats():
+    """
+    Hit/miss counters of the query vector and search result caches.
+    """
+    return search_cache_stats()
+
+
+@router.get("/shards")
+def docs_shards():
+    """
+    Per-library shards loaded against the memory budget, and which are built.
+    """
+    return shard_stats()
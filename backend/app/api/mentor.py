@@ -1,16 +1,67 @@
+import json
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from app.models.mentor import MentorHelpRequest, MentorHelpResponse
-from app.services.mentor import mentor_help
+from app.services.mentor import mentor_help_async
+from app.services.mentor_stream import stream_mentor_help
+from app.services.response_cache import response_cache_stats
+from app.services.prompt_builder import prompt_token_stats
+from app.services.corpus_router import detect_library
 
 router = APIRouter(prefix="/mentor", tags=["mentor"])
 
 @router.post("/help", response_model=MentorHelpResponse)
-def mentor_help_endpoint(req: MentorHelpRequest):
-    library_name = "scikit-learn"
-    
-    return mentor_help(
+async def mentor_help_endpoint(req: MentorHelpRequest):
+    # Async so a slow completion doesn't hold a threadpool worker
+    library_name = detect_library(req.code)
+
+    return await mentor_help_async(
         code=req.code,
         error=req.error,
         question=req.question,
-        library_name=library_name
-    )
\ No newline at end of file
+        library_name=library_name,
+        run_code=req.run_code,
+    )
+
+
+@router.post("/help/stream")
+async def mentor_help_stream(req: MentorHelpRequest):
+    """
+    Server-sent events: `explanation` frames carry JSON-encoded text as the
+    model writes it, `suggested_fix` and `doc_references` frames arrive once
+    each is complete, and a final `end` frame carries the MentorHelpResponse.
+    An `error` frame replaces `end` if the request fails part-way.
+    """
+    library_name = detect_library(req.code)
+
+    async def events():
+        try:
+            async for event, payload in stream_mentor_help(
+                req.code, req.error, req.question, library_name, req.run_code
+            ):
+                data = payload.model_dump_json() if event == "end" else json.dumps(payload)
+                yield f"event: {event}\ndata: {data}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache")
+def mentor_cache_stats():
+    """
+    Hit/miss counters of the mentor response cache.
+    """
+    return response_cache_stats()
+
+
+@router.get("/prompt-stats")
+def mentor_prompt_stats():
+    """
+    Prompt sizes in tokens: running average and max, and the last prompt's breakdown.
+    """
+    return prompt_token_stats.stats()
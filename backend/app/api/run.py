@@ -1,17 +1,75 @@
-from fastapi import APIRouter
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.run import RunResult, RunRequest
-from app.services.executor import run_user_code, DEFAULT_TIMEOUT_SECONDS
+from app.services.executor import (
+    run_user_code_async,
+    acquire_run_slot,
+    release_run_slot,
+    ExecutorBusy,
+    DEFAULT_TIMEOUT_SECONDS,
+)
+from app.services.executor_stream import stream_user_code
 
 router = APIRouter(prefix="/run", tags=["run"])
 
 @router.post("/", response_model=RunResult)
-def run_code(req: RunRequest):
-    # Stub: will later run sklearn code in sandbox
+async def run_code(req: RunRequest):
+    # Async so waiting runs don't tie up the threadpool that serves /docs and /health
     timeout = req.timeout_seconds or DEFAULT_TIMEOUT_SECONDS
     
-    stdout, stderr = run_user_code(
-        code = req.code,
-        timeout_seconds = timeout
+    try:
+        return await run_user_code_async(
+            code = req.code,
+            timeout_seconds = timeout
+        )
+    except ExecutorBusy as e:
+        raise _busy_response(e)
+
+
+@router.post("/stream")
+async def run_code_stream(req: RunRequest):
+    """
+    Server-sent events: `stdout` / `stderr` frames carry JSON-encoded text as
+    it is produced, and a final `end` frame carries a RunStreamEnd.
+    """
+    timeout = req.timeout_seconds or DEFAULT_TIMEOUT_SECONDS
+
+    # Take the slot before responding so a busy runner still gets a 429/503
+    try:
+        queue_wait = await acquire_run_slot()
+    except ExecutorBusy as e:
+        raise _busy_response(e)
+
+    async def events():
+        async for event, payload in stream_user_code(req.code, timeout, queue_wait):
+            data = payload.model_dump_json() if event == "end" else json.dumps(payload)
+            yield f"event: {event}\ndata: {data}\n\n"
+
+    return _RunSlotResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    
-    return RunResult(stdout=stdout, stderr=stderr)
\ No newline at end of file
+
+
+class _RunSlotResponse(StreamingResponse):
+    """
+    Releases the run slot taken for the stream once the response is over,
+    including when the client disconnects before the body starts (then
+    the body generator never runs, so it can't release it itself).
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            release_run_slot()
+
+
+def _busy_response(e: ExecutorBusy) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
\ No newline at end of file
@@ -0,0 +1,203 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Bump when chunk boundaries or chunk fields change, so fetch_chunk.py
+# re-chunks pages it would otherwise reuse from the last run.
+CHUNKER_VERSION = 2
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+_FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})")
+# Sphinx permalinks, e.g. [#](#linear-models "Link to this heading") or [¶](#id)
+_HEADERLINK_RE = re.compile(r'\[(?:#|¶)\]\(#([^)\s]+)(?:\s+"[^"]*")?\)')
+_DEFINITION_RE = re.compile(r"^\s*:\s+")
+_MD_ESCAPE_RE = re.compile(r"\\([\\`*_{}\[\]()#+\-.!|])")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class _Block:
+    __slots__ = ("text", "kind", "anchor")
+
+    def __init__(self, text: str, kind: str, anchor: Optional[str] = None) -> None:
+        self.text = text
+        self.kind = kind  # "heading", "code" or "text"
+        self.anchor = anchor
+
+
+def _plain(text: str) -> str:
+    """
+    Heading text without markdown emphasis or escapes.
+    """
+    text = _MD_ESCAPE_RE.sub(r"\1", text.replace("*", ""))
+    return " ".join(text.split())
+
+
+def _parse_sections(md: str) -> List[Tuple[List[str], Optional[str], List[_Block]]]:
+    """
+    Split markdown into sections at headings. Returns (heading path, anchor of
+    the deepest heading that has one, blocks) per section.
+
+    Blocks are paragraphs, tables, fenced code and definition lists; a blank
+    line only ends a definition list if the next line doesn't continue it.
+    """
+    sections = []
+    stack: List[Tuple[int, str, Optional[str]]] = []
+    blocks: List[_Block] = []
+    para: List[str] = []
+
+    def flush_para() -> None:
+        if para:
+            text = "\n".join(para).strip()
+            if text:
+                anchors = _HEADERLINK_RE.findall(text)
+                blocks.append(_Block(_HEADERLINK_RE.sub("", text), "text", anchors[0] if anchors else None))
+            para.clear()
+
+    def close_section() -> None:
+        flush_para()
+        if blocks:
+            anchor = next((a for _, _, a in reversed(stack) if a), None)
+            sections.append(([title for _, title, _ in stack], anchor, list(blocks)))
+            blocks.clear()
+
+    lines = md.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        fence = _FENCE_RE.match(line)
+        if fence:
+            flush_para()
+            marker = fence.group(1)
+            code = [line]
+            i += 1
+            while i < len(lines):
+                code.append(lines[i])
+                i += 1
+                if lines[i - 1].strip().startswith(marker):
+                    break
+            blocks.append(_Block("\n".join(code), "code"))
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            close_section()
+            level = len(heading.group(1))
+            raw = heading.group(2)
+            anchors = _HEADERLINK_RE.findall(raw)
+            title = _plain(_HEADERLINK_RE.sub("", raw))
+            stack = [s for s in stack if s[0] < level]
+            stack.append((level, title, anchors[0] if anchors else None))
+            blocks.append(_Block(f"{heading.group(1)} {title}", "heading"))
+            i += 1
+            continue
+
+        if not line.strip():
+            # Keep multi-paragraph definitions together with their term
+            nxt = next((l for l in lines[i + 1:] if l.strip()), "")
+            in_definition = any(_DEFINITION_RE.match(l) for l in para)
+            if not (in_definition and (nxt.startswith((" ", "\t")) or _DEFINITION_RE.match(nxt))):
+                flush_para()
+                i += 1
+                continue
+
+        para.append(line)
+        i += 1
+
+    close_section()
+    return sections
+
+
+def _split_oversized(block: _Block, max_chars: int) -> List[str]:
+    """
+    Split a block that can't fit in one chunk: code at line boundaries (each
+    piece re-fenced), prose at lines, then sentences, then hard cuts.
+    """
+    if block.kind == "code":
+        lines = block.text.split("\n")
+        opener = lines[0]
+        closed = len(lines) > 1 and _FENCE_RE.match(lines[-1]) is not None
+        closer = lines[-1] if closed else _FENCE_RE.match(opener).group(1)
+        body = lines[1:-1] if closed else lines[1:]
+        budget = max_chars - len(opener) - len(closer) - 2
+        return [f"{opener}\n{piece}\n{closer}" for piece in _pack(body, budget, "\n")]
+
+    pieces = []
+    for line in block.text.split("\n"):
+        if len(line) <= max_chars:
+            pieces.append(line)
+        else:
+            pieces.extend(_pack(_SENTENCE_END_RE.split(line), max_chars, " "))
+    return _pack(pieces, max_chars, "\n")
+
+
+def _pack(parts: List[str], max_chars: int, sep: str) -> List[str]:
+    out: List[str] = []
+    buf = ""
+    for part in parts:
+        while len(part) > max_chars:
+            if buf:
+                out.append(buf)
+                buf = ""
+            cut = part.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            out.append(part[:cut])
+            part = part[cut:].lstrip()
+        if buf and len(buf) + len(sep) + len(part) > max_chars:
+            out.append(buf)
+            buf = ""
+        buf = f"{buf}{sep}{part}" if buf else part
+    if buf.strip():
+        out.append(buf)
+    return out
+
+
+def chunk_markdown(md: str, max_chars: int = 1200, min_chars: int = 200) -> List[Dict]:
+    """
+    Structure-aware chunking of a markdown page.
+
+    Chunks never cross a heading, except that a section shorter than
+    `min_chars` is carried into the next one instead of becoming a tiny chunk
+    of its own. Headings with no content of their own yet are always carried
+    into the next chunk (and dropped at the end of the page). Code fences, tables and definition lists are never cut unless
+    a single one is longer than `max_chars`. There is no overlap.
+
+    Returns dicts with text, title (page title), section (heading path) and
+    anchor (permalink id, or None).
+    """
+    sections = _parse_sections(md)
+    title = next((path[0] for path, _, _ in sections if path), "")
+
+    chunks: List[Dict] = []
+    buf: List[str] = []
+    size = 0
+    meta: Dict = {}
+    has_body = False
+
+    def emit() -> None:
+        nonlocal buf, size, has_body
+        if not has_body:
+            # Only headings so far: keep them for the content that follows
+            return
+        text = "\n\n".join(buf).strip()
+        if text:
+            chunks.append({"text": text, "title": title, **meta})
+        buf, size, has_body = [], 0, False
+
+    for path, section_anchor, blocks in sections:
+        for block in blocks:
+            pieces = [block.text] if len(block.text) <= max_chars else _split_oversized(block, max_chars)
+            for piece in pieces:
+                if buf and size + len(piece) + 2 > max_chars:
+                    emit()
+                # A chunk is labelled by the first section it has content from
+                if not buf or (not has_body and block.kind != "heading"):
+                    meta = {"section": path, "anchor": block.anchor or section_anchor}
+                elif block.anchor and not meta.get("anchor"):
+                    meta["anchor"] = block.anchor
+                has_body = has_body or block.kind != "heading"
+                buf.append(piece)
+                size += len(piece) + 2
+        if size >= min_chars:
+            emit()
+    emit()
+    return chunks
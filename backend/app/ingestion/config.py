@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
@@ -6,13 +7,54 @@ TEXT_DIR = DATA_DIR / "text"
 
 VECTORSTORE_DIR = DATA_DIR / "vectorstore"
 
-# Add more URLs later
-DOC_URLS = [
-    "https://scikit-learn.org/stable/user_guide.html",
-    "https://scikit-learn.org/stable/api/index.html",
-]
+# Per-library sources, chunk sizes and file names are in corpora.py.
+
+# Crawl mode (fetch_chunk.py --crawl): start from a corpus's doc URLs and
+# follow links that stay under its crawl prefix.
+CRAWL_MAX_PAGES = 5000
+CRAWL_CONCURRENCY = 8
+CRAWL_PER_HOST_CONCURRENCY = 4
+CRAWL_PER_HOST_RPS = 5.0
+CRAWL_MAX_RETRIES = 3
+
+# Processes used to clean and chunk pages in fetch_chunk.py
+CHUNK_WORKERS = os.cpu_count() or 1
+# Chunk size bounds for the heading-aware chunker (characters); a corpus
+# can set its own
+CHUNK_MAX_CHARS = 1200
+CHUNK_MIN_CHARS = 200
 
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Encoder runtime (encoder.py): torch (sentence-transformers on PyTorch), onnx
+# (ONNX Runtime) or onnx_int8 (dynamically quantized ONNX). The ONNX ones need
+# `pip install "sentence-transformers[onnx]"`; check them against torch with
+# encoder_parity.py. Documents are embedded with EMBED_BACKEND and queries
+# with QUERY_EMBED_BACKEND.
+EMBED_BACKEND = os.getenv("BONDO_EMBED_BACKEND", "torch")
+QUERY_EMBED_BACKEND = os.getenv("BONDO_QUERY_EMBED_BACKEND", EMBED_BACKEND)
+# Intra-op threads for the encoder (0 = the runtime's default, all cores)
+EMBED_THREADS = int(os.getenv("BONDO_EMBED_THREADS", "0"))
+# Quantized model file in the model repo, or the instruction set to quantize
+# for locally (into ONNX_DIR) if the repo doesn't have one: avx2 runs on any
+# x86-64 from the last decade, arm64 on ARM
+EMBED_ONNX_INT8_FILE = os.getenv("BONDO_EMBED_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+EMBED_ONNX_QUANTIZATION = os.getenv("BONDO_EMBED_ONNX_QUANTIZATION", "avx2")
+ONNX_DIR = DATA_DIR / "onnx"
+# embed_index.py: chunks embedded per batch, and batches between checkpoints
+EMBED_BATCH_SIZE = 256
+EMBED_CHECKPOINT_EVERY = 20
+
+# Vector index built by embed_index.py: flat (exact), ivf_flat, hnsw or ivf_pq.
+# The approximate ones trade some recall for speed and memory; compare them
+# on the real corpus with index_benchmark.py.
+INDEX_TYPE = os.getenv("BONDO_INDEX_TYPE", "flat")
+INDEX_IVF_NLIST = int(os.getenv("BONDO_INDEX_IVF_NLIST", "0"))  # 0 = about 4 * sqrt(n)
+INDEX_HNSW_M = 32
+INDEX_PQ_M = 48
+INDEX_TRAIN_SAMPLE = 50000
+# Query-time tunables, applied by rag.py when it loads the index
+INDEX_NPROBE = int(os.getenv("BONDO_INDEX_NPROBE", "16"))
+INDEX_EF_SEARCH = int(os.getenv("BONDO_INDEX_EF_SEARCH", "64"))
 
 def ensure_data_dirs() -> None:
     RAW_HTML_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,143 @@
+import os
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+from app.ingestion.config import TEXT_DIR, VECTORSTORE_DIR, CHUNK_MAX_CHARS, CHUNK_MIN_CHARS
+
+
+class ShardFiles(NamedTuple):
+    """
+    Files of one corpus's vector store (its shard), written by embed_index.py.
+    """
+    embeddings: Path
+    metadata: Path
+    faiss_index: Path
+    # Binary copy of the metadata that rag.py memory-maps
+    doc_store: Path
+    # Written last; a running backend reloads the shard when this changes
+    build_info: Path
+    # Inverted index over chunk text and URLs (rag.py's lexical scoring)
+    terms: Path
+    # Fully qualified API name -> chunk rows (rag.py's exact lookup)
+    symbols: Path
+    # In-progress build: written next to the outputs and swapped in at the end
+    partial_embeddings: Path
+    partial_metadata: Path
+    checkpoint: Path
+
+
+class Corpus(NamedTuple):
+    """
+    One library's docs: where to fetch them, how to chunk them and which
+    imports they answer for.
+    """
+    # Shown to the model ("You are a scikit-learn mentor") and used in the API
+    name: str
+    # Prefix of the corpus's data files
+    slug: str
+    # Top-level modules whose imports route queries to this corpus
+    modules: Tuple[str, ...]
+    doc_urls: Tuple[str, ...]
+    # Crawl mode (fetch_chunk.py --crawl) follows links under this prefix
+    crawl_prefix: str
+    chunk_max_chars: int = CHUNK_MAX_CHARS
+    chunk_min_chars: int = CHUNK_MIN_CHARS
+
+    @property
+    def chunks_file(self) -> Path:
+        # Output of fetch_chunk.py / input of embed_index.py
+        return TEXT_DIR / f"{self.slug}_doc_chunks.jsonl"
+
+    @property
+    def page_manifest_file(self) -> Path:
+        # Per-page HTTP validators and content hashes, used to skip unchanged pages
+        return TEXT_DIR / f"{self.slug}_doc_pages.json"
+
+    @property
+    def crawl_frontier_file(self) -> Path:
+        return TEXT_DIR / f"{self.slug}_crawl_frontier.json"
+
+    @property
+    def files(self) -> ShardFiles:
+        prefix = VECTORSTORE_DIR / f"{self.slug}_doc"
+        return ShardFiles(
+            embeddings=Path(f"{prefix}_embeddings.npy"),
+            metadata=Path(f"{prefix}_metadata.jsonl"),
+            faiss_index=Path(f"{prefix}_index.faiss"),
+            doc_store=Path(f"{prefix}_store.bin"),
+            build_info=Path(f"{prefix}_build.json"),
+            terms=Path(f"{prefix}_terms"),
+            symbols=Path(f"{prefix}_symbols.json"),
+            partial_embeddings=Path(f"{prefix}_embeddings.partial.npy"),
+            partial_metadata=Path(f"{prefix}_metadata.partial.jsonl"),
+            checkpoint=Path(f"{prefix}_build_checkpoint.json"),
+        )
+
+
+CORPORA: List[Corpus] = [
+    Corpus(
+        name="scikit-learn",
+        slug="sklearn",
+        modules=("sklearn",),
+        doc_urls=(
+            "https://scikit-learn.org/stable/user_guide.html",
+            "https://scikit-learn.org/stable/api/index.html",
+        ),
+        crawl_prefix="https://scikit-learn.org/stable/",
+    ),
+    Corpus(
+        name="pandas",
+        slug="pandas",
+        modules=("pandas",),
+        doc_urls=(
+            "https://pandas.pydata.org/docs/user_guide/index.html",
+            "https://pandas.pydata.org/docs/reference/index.html",
+        ),
+        crawl_prefix="https://pandas.pydata.org/docs/",
+    ),
+    Corpus(
+        name="NumPy",
+        slug="numpy",
+        modules=("numpy",),
+        doc_urls=(
+            "https://numpy.org/doc/stable/user/index.html",
+            "https://numpy.org/doc/stable/reference/index.html",
+        ),
+        crawl_prefix="https://numpy.org/doc/stable/",
+    ),
+    Corpus(
+        name="PyTorch",
+        slug="torch",
+        modules=("torch",),
+        doc_urls=("https://pytorch.org/docs/stable/index.html",),
+        crawl_prefix="https://pytorch.org/docs/stable/",
+        # API pages are mostly long signatures and parameter lists
+        chunk_max_chars=1600,
+    ),
+]
+
+# Comma-separated names or slugs of the corpora to fetch, build and search
+# (default: all). Queries that import none of them go to DEFAULT_CORPUS.
+ENABLED_CORPORA = os.getenv("BONDO_CORPORA", "")
+DEFAULT_CORPUS = os.getenv("BONDO_DEFAULT_CORPUS", "scikit-learn")
+
+
+def get_corpus(name: str) -> Optional[Corpus]:
+    """
+    Corpus by name or slug, case-insensitively.
+    """
+    name = name.strip().lower()
+    return next((c for c in CORPORA if name in (c.name.lower(), c.slug)), None)
+
+
+def enabled_corpora() -> List[Corpus]:
+    if not ENABLED_CORPORA.strip():
+        return list(CORPORA)
+    wanted = [get_corpus(name) for name in ENABLED_CORPORA.split(",") if name.strip()]
+    return [c for c in CORPORA if c in wanted]
+
+
+def default_corpus() -> Corpus:
+    corpus = get_corpus(DEFAULT_CORPUS)
+    if corpus is None:
+        raise ValueError(f"Unknown default corpus: {DEFAULT_CORPUS}")
+    return corpus
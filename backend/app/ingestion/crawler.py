@@ -0,0 +1,242 @@
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urldefrag, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+
+# fetch(url, previous page state, session) -> (html, new page state, changed)
+FetchFn = Callable[[str, Optional[Dict], requests.Session], Tuple[str, Dict, bool]]
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class _HostLimiter:
+    """
+    Caps in-flight requests to one host and spaces them out to a max rate.
+    """
+
+    def __init__(self, max_concurrent: int, requests_per_second: float) -> None:
+        self._slots = threading.Semaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_start = 0.0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._slots:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """
+    Absolute, fragment-free URLs of all <a href> links on a page.
+    """
+    links = []
+    for a in BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("a")).find_all("a", href=True):
+        url, _ = urldefrag(urljoin(base_url, a["href"]))
+        links.append(url.split("?", 1)[0])
+    return links
+
+
+class Crawler:
+    """
+    Concurrent same-site crawler for the docs.
+
+    Starts from the seed URLs and follows links that stay under `prefix`.
+    Pages are fetched over one pooled HTTP session, with per-host concurrency
+    and rate limits and retries with exponential backoff. The frontier is
+    checkpointed to disk so an interrupted crawl picks up where it stopped.
+    """
+
+    def __init__(
+        self,
+        seeds: List[str],
+        prefix: str,
+        fetch: FetchFn,
+        page_states: Dict[str, Dict],
+        frontier_path: Path,
+        max_pages: int = 5000,
+        concurrency: int = 8,
+        per_host_concurrency: int = 4,
+        per_host_rps: float = 5.0,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        checkpoint_every: int = 50,
+    ) -> None:
+        self.seeds = seeds
+        self.prefix = prefix
+        self.fetch = fetch
+        self.page_states = page_states
+        self.frontier_path = frontier_path
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_rps = per_host_rps
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.checkpoint_every = checkpoint_every
+
+        self._limiters: Dict[str, _HostLimiter] = {}
+        self._limiters_lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        # Frontier state (only touched from the coordinating thread)
+        self.pending: List[str] = []
+        self.seen: set = set()
+        self.done: Dict[str, Dict] = {}
+        self.failed: Dict[str, str] = {}
+
+    # -- frontier persistence ------------------------------------------------
+
+    def load_frontier(self) -> bool:
+        """
+        Resume from a checkpoint. Returns False if there is none to resume.
+        """
+        if not self.frontier_path.exists():
+            return False
+        data = json.loads(self.frontier_path.read_text(encoding="utf-8"))
+        if data.get("complete"):
+            return False
+        if data.get("prefix") != self.prefix:
+            print("[crawl] Frontier was built for a different prefix, starting over.")
+            return False
+        self.pending = data["pending"]
+        self.done = data["done"]
+        self.failed = data["failed"]
+        self.seen = set(self.pending) | set(self.done) | set(self.failed)
+        print(
+            f"[crawl] Resuming: {len(self.done)} done, {len(self.pending)} pending, "
+            f"{len(self.failed)} failed."
+        )
+        return True
+
+    def save_frontier(self, in_flight: List[str] = (), complete: bool = False) -> None:
+        data = {
+            "prefix": self.prefix,
+            "complete": complete,
+            # In-flight URLs go back to the front so a resume refetches them
+            "pending": list(in_flight) + self.pending,
+            "done": self.done,
+            "failed": self.failed,
+        }
+        tmp = self.frontier_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(self.frontier_path)
+
+    # -- crawling --------------------------------------------------------------
+
+    def _in_scope(self, url: str) -> bool:
+        if not url.startswith(self.prefix):
+            return False
+        path = urlparse(url).path
+        return path.endswith(".html") or path.endswith("/")
+
+    def _enqueue(self, url: str) -> None:
+        if url in self.seen or not self._in_scope(url):
+            return
+        if len(self.seen) >= self.max_pages:
+            return
+        self.seen.add(url)
+        self.pending.append(url)
+
+    def _limiter(self, url: str) -> _HostLimiter:
+        host = urlparse(url).netloc
+        with self._limiters_lock:
+            if host not in self._limiters:
+                self._limiters[host] = _HostLimiter(self.per_host_concurrency, self.per_host_rps)
+            return self._limiters[host]
+
+    def _fetch_with_retries(self, url: str) -> Tuple[str, Dict, bool]:
+        limiter = self._limiter(url)
+        attempt = 0
+        while True:
+            try:
+                with limiter.slot():
+                    return self.fetch(url, self.page_states.get(url), self._session)
+            except requests.exceptions.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                retryable = status is None or status in RETRY_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                retry_after = e.response.headers.get("Retry-After") if e.response is not None else None
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                attempt += 1
+                print(f"[crawl] {url}: {e!r}, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _crawl_one(self, url: str) -> Tuple[Dict, bool, List[str]]:
+        html, state, changed = self._fetch_with_retries(url)
+        return state, changed, extract_links(html, url)
+
+    def run(self, resume: bool = True) -> Dict[str, Tuple[Dict, bool]]:
+        """
+        Crawl until the frontier is empty or max_pages is reached.
+        Returns {url: (page state, changed)} for every fetched page, in crawl order.
+        """
+        if not (resume and self.load_frontier()):
+            self.pending, self.seen, self.done, self.failed = [], set(), {}, {}
+            for url in self.seeds:
+                self._enqueue(url)
+
+        started = time.time()
+        since_checkpoint = 0
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                while self.pending or in_flight:
+                    while self.pending and len(in_flight) < self.concurrency:
+                        url = self.pending.pop(0)
+                        in_flight[pool.submit(self._crawl_one, url)] = url
+
+                    finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        url = in_flight.pop(future)
+                        try:
+                            state, changed, links = future.result()
+                        except Exception as e:
+                            print(f"[crawl] Giving up on {url}: {e!r}")
+                            self.failed[url] = repr(e)
+                            continue
+
+                        self.done[url] = {"state": state, "changed": changed}
+                        for link in links:
+                            self._enqueue(link)
+
+                    since_checkpoint += len(finished)
+                    if since_checkpoint >= self.checkpoint_every:
+                        self.save_frontier(list(in_flight.values()))
+                        since_checkpoint = 0
+                        print(
+                            f"[crawl] {len(self.done)} done, {len(self.pending)} pending, "
+                            f"{len(in_flight)} in flight"
+                        )
+            except BaseException:
+                self.save_frontier(list(in_flight.values()))
+                raise
+
+        self.save_frontier(complete=True)
+        print(
+            f"[crawl] Finished: {len(self.done)} pages, {len(self.failed)} failed "
+            f"in {time.time() - started:.1f}s"
+        )
+        return {url: (d["state"], d["changed"]) for url, d in self.done.items()}
@@ -0,0 +1,101 @@
+import mmap
+import json
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+# Layout (little-endian, all arrays 8-byte aligned):
+#   header     MAGIC, uint64 n
+#   vids       int64[n]   vids sorted ascending
+#   rows       int64[n]   row of each sorted vid
+#   offsets    uint64[n + 1] byte offset of each row's record in the blob
+#   blob       row records, UTF-8 JSON, back to back
+MAGIC = b"BONDODS1"
+_HEADER = struct.Struct("<8sQ")
+
+
+def write_doc_store(records: Iterable[Dict], path: Path) -> int:
+    """
+    Write metadata records (each with a "vid") to an offset-indexed binary
+    file. Records are streamed to a temporary blob first, so only the index
+    arrays are held in memory. Returns the number of records.
+    """
+    vids = []
+    offsets = [0]
+    with tempfile.TemporaryFile(dir=path.parent) as blob:
+        for record in records:
+            data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            blob.write(data)
+            vids.append(record["vid"])
+            offsets.append(offsets[-1] + len(data))
+
+        vids = np.array(vids, dtype=np.int64)
+        rows = np.argsort(vids, kind="stable")
+
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(vids)))
+            f.write(vids[rows].astype("<i8").tobytes())
+            f.write(rows.astype("<i8").tobytes())
+            f.write(np.array(offsets, dtype="<u8").tobytes())
+            blob.seek(0)
+            while True:
+                piece = blob.read(1 << 20)
+                if not piece:
+                    break
+                f.write(piece)
+        tmp.replace(path)
+    return len(vids)
+
+
+class DocStore:
+    """
+    Read-only, memory-mapped view of a file written by write_doc_store().
+
+    Opening it only maps the file; a record is decoded when it's asked for.
+    Processes that open the same file share its pages via the OS page cache.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise RuntimeError(f"{path} is not a doc store file")
+        self._n = n
+
+        pos = _HEADER.size
+        self._sorted_vids = np.frombuffer(self._mm, dtype="<i8", count=n, offset=pos)
+        pos += 8 * n
+        self._rows = np.frombuffer(self._mm, dtype="<i8", count=n, offset=pos)
+        pos += 8 * n
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=n + 1, offset=pos)
+        self._blob_start = pos + 8 * (n + 1)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def row_for_vid(self, vid: int) -> Optional[int]:
+        i = int(np.searchsorted(self._sorted_vids, vid))
+        if i < self._n and self._sorted_vids[i] == vid:
+            return int(self._rows[i])
+        return None
+
+    def rows_for_vids(self, vids: np.ndarray) -> np.ndarray:
+        """
+        Row of each vid, or -1 where the vid isn't in the store.
+        """
+        vids = np.asarray(vids, dtype=np.int64)
+        if self._n == 0:
+            return np.full(len(vids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_vids, vids), self._n - 1)
+        return np.where(self._sorted_vids[pos] == vids, self._rows[pos], -1)
+
+    def get(self, row: int) -> Dict:
+        start = self._blob_start + int(self._offsets[row])
+        end = self._blob_start + int(self._offsets[row + 1])
+        return json.loads(self._mm[start:end])
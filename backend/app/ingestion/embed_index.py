@@ -1,123 +1,418 @@
+import os
 import json
+import time
+import hashlib
+import argparse
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
 from app.ingestion.config import (
-    TEXT_DIR,
-    VECTORSTORE_DIR,
-    EMBED_MODEL_NAME,
+    EMBED_BACKEND,
+    EMBED_BATCH_SIZE,
+    EMBED_CHECKPOINT_EVERY,
+    INDEX_TYPE,
     ensure_data_dirs,
 )
+from app.ingestion.corpora import Corpus, ShardFiles, enabled_corpora, get_corpus
+from app.ingestion.encoder import ENCODER_BACKENDS, load_encoder
+from app.ingestion.index_factory import INDEX_TYPES, make_index, train_index
+from app.ingestion.doc_store import write_doc_store
+from app.ingestion.term_index import write_term_index
+from app.ingestion.symbol_index import write_symbol_index
 
-# Input chunks file from the previous step
-CHUNKS_FILE = TEXT_DIR / "sklearn_doc_chunks.jsonl"
-
-# Output paths
-EMBEDDINGS_FILE = VECTORSTORE_DIR / "sklearn_doc_embeddings.npy"
-METADATA_FILE = VECTORSTORE_DIR / "sklearn_doc_metadata.jsonl"
-FAISS_INDEX_FILE = VECTORSTORE_DIR / "sklearn_doc_index.faiss"
-
-
-def load_chunks(path: Path) -> List[Dict]:
+def iter_chunks(path: Path) -> Iterator[Dict]:
     """
-    Load doc chunks from the JSONL file produced by fetch_and_chunk.py.
+    Stream doc chunks from the JSONL file produced by fetch_chunk.py.
     Each line is a JSON object with keys like: id, url, source, text.
     """
-    chunks: List[Dict] = []
-    print(f"Loading chunks from {path} ...")
     with path.open("r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
-            chunks.append(json.loads(line))
-            
-    print(f"Loaded {len(chunks)} chunks.")
-    return chunks
+            yield json.loads(line)
+
+
+def count_chunks(path: Path) -> int:
+    with path.open("rb") as f:
+        return sum(1 for line in f if line.strip())
 
 
-def compute_embeddings(texts: List[str]) -> np.ndarray:
+def compute_embeddings(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
     """
-    Compute embeddings for a list of texts using SentenceTransformer.
+    Compute normalized embeddings for one batch of texts.
     """
-    print(f"Loading embedding model: {EMBED_MODEL_NAME}")
-    model = SentenceTransformer(EMBED_MODEL_NAME)
-    
-    print(f"Computing embeddings for {len(texts)} texts...")
     embeddings = model.encode(
         texts,
         batch_size=32,
-        show_progress_bar=True,
+        show_progress_bar=False,
         convert_to_numpy=True,
         normalize_embeddings=True
     )
-    
-    print(f"Embeddings shape: {embeddings.shape}")
-    return embeddings
+    return np.asarray(embeddings, dtype=np.float32)
 
 
-def build_faiss_index(embeddings: np.ndarray) -> faiss.Index:
+def chunk_vector_id(chunk: Dict) -> int:
     """
-    Build a FAISS index for the given embeddings.
-    We use an inner-product index with normalized embeddings (cosine similarity).
+    Stable int64 FAISS id for a chunk, derived from its page URL and content
+    hash (not its position, so chunks added or removed elsewhere on the page
+    don't change it). Editing a chunk's text gives it a new id, and the old
+    vector is left out of the next build.
     """
-    dim = embeddings.shape[1]
-    print(f"Building FAISS index (dim={dim})...")
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
-    print(f"FAISS index contains {index.ntotal} vectors.")
-    return index
+    text_hash = chunk.get("hash") or hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+    digest = hashlib.sha1(f"{chunk['url']}\0{text_hash}".encode("utf-8")).hexdigest()
+    return int(digest[:15], 16)
+
+
+def load_previous_store(files: ShardFiles) -> Optional[Dict]:
+    """
+    Vectors from the shard's last build, so unchanged chunks aren't
+    re-embedded. The embeddings are memory-mapped rather than read into RAM.
+    """
+    if not (files.metadata.exists() and files.embeddings.exists()):
+        return None
+
+    vids = []
+    for m in iter_chunks(files.metadata):
+        if "vid" not in m:
+            print("Previous metadata has no vector ids, re-embedding everything.")
+            return None
+        vids.append(m["vid"])
+
+    embeddings = np.load(files.embeddings, mmap_mode="r")
+    if len(embeddings) != len(vids):
+        print("Previous vector store is inconsistent, re-embedding everything.")
+        return None
+
+    vids = np.array(vids, dtype=np.int64)
+    order = np.argsort(vids)
+    return {"vids": vids[order], "rows": order, "embeddings": embeddings}
+
+
+def _previous_rows(previous: Optional[Dict], vids: np.ndarray) -> np.ndarray:
+    """
+    Row of each vid in the previous embeddings, or -1 if it has to be embedded.
+    """
+    if previous is None or len(previous["vids"]) == 0:
+        return np.full(len(vids), -1, dtype=np.int64)
+    pos = np.searchsorted(previous["vids"], vids)
+    pos = np.minimum(pos, len(previous["vids"]) - 1)
+    found = previous["vids"][pos] == vids
+    return np.where(found, previous["rows"][pos], -1)
+
+
+def _source_fingerprint(path: Path, total: int) -> Dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunks": total}
+
+
+def _load_checkpoint(files: ShardFiles, source: Dict, dim: int) -> Optional[Dict]:
+    if not (files.checkpoint.exists() and files.partial_embeddings.exists() and files.partial_metadata.exists()):
+        return None
+    checkpoint = json.loads(files.checkpoint.read_text(encoding="utf-8"))
+    if checkpoint.get("source") != source or checkpoint.get("dim") != dim:
+        print("Chunks changed since the interrupted build, starting over.")
+        return None
+    return checkpoint
 
 
-def save_embeddings(embeddings: np.ndarray, path: Path) -> None:
-    print(f"Saving embeddings to {path} ...")
-    np.save(path, embeddings)
-    
-    
-def save_metadata(chunks: List[Dict], path: Path) -> None:
-    print(f"Saving metadata to {path} ...")
-    with path.open("w", encoding="utf-8") as f:
-        for ch in chunks:
-            f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+def _save_checkpoint(
+    files: ShardFiles,
+    embeddings: np.memmap,
+    meta_f,
+    rows_done: int,
+    meta_bytes: int,
+    source: Dict,
+    dim: int,
+) -> None:
+    # Data first, then the checkpoint that points at it
+    embeddings.flush()
+    meta_f.flush()
+    os.fsync(meta_f.fileno())
+    checkpoint = {
+        "source": source,
+        "dim": dim,
+        "rows_done": rows_done,
+        "metadata_bytes": meta_bytes,
+    }
+    tmp = files.checkpoint.with_suffix(".tmp")
+    tmp.write_text(json.dumps(checkpoint), encoding="utf-8")
+    tmp.replace(files.checkpoint)
+
+
+def _add_partial_rows(files: ShardFiles, index: faiss.Index, embeddings: np.ndarray, rows: int, batch_size: int) -> None:
+    """
+    Add the first `rows` vectors of the in-progress build to `index`.
+    """
+    metadata = iter_chunks(files.partial_metadata)
+    for start in range(0, rows, batch_size):
+        vids = np.array([m["vid"] for m in islice(metadata, min(batch_size, rows - start))], dtype=np.int64)
+        index.add_with_ids(np.ascontiguousarray(embeddings[start:start + len(vids)]), vids)
+
+
+def build_vector_store(
+    chunks_path: Path,
+    files: ShardFiles,
+    batch_size: int = EMBED_BATCH_SIZE,
+    previous: Optional[Dict] = None,
+    resume: bool = True,
+    index_type: str = INDEX_TYPE,
+    backend: str = EMBED_BACKEND,
+) -> faiss.Index:
+    """
+    Stream chunks in batches of `batch_size`: embed the ones not in `previous`,
+    write every vector into a memory-mapped .npy and the index, and append
+    metadata as we go. Progress is checkpointed every EMBED_CHECKPOINT_EVERY
+    batches, so an interrupted build resumes from its last checkpoint.
+
+    Only one batch of chunks is held in memory at a time (plus the index).
+    Index types that need training (IVF) are trained on a sample once all
+    embeddings are written, and filled from the memmap after that.
+    Returns the index; the finished embeddings and metadata are left in the
+    partial files for main() to move into place.
+    """
+    total = count_chunks(chunks_path)
+    # A checkpoint from another encoder can't be resumed
+    source = {**_source_fingerprint(chunks_path, total), "encoder": backend}
+
+    model = None
+    if previous is not None:
+        dim = previous["embeddings"].shape[1]
+    else:
+        model = load_encoder(backend)
+        dim = model.get_sentence_embedding_dimension()
+
+    checkpoint = _load_checkpoint(files, source, dim) if resume else None
+    rows_done = checkpoint["rows_done"] if checkpoint else 0
+    meta_bytes = checkpoint["metadata_bytes"] if checkpoint else 0
+    index = make_index(dim, total, index_type)
+
+    if checkpoint:
+        embeddings = np.lib.format.open_memmap(files.partial_embeddings, mode="r+")
+        meta_f = files.partial_metadata.open("r+b")
+        meta_f.truncate(meta_bytes)
+        meta_f.seek(meta_bytes)
+        print(f"Resuming build at chunk {rows_done}/{total}")
+        if index.is_trained:
+            _add_partial_rows(files, index, embeddings, rows_done, batch_size)
+    else:
+        embeddings = np.lib.format.open_memmap(
+            files.partial_embeddings, mode="w+", dtype=np.float32, shape=(total, dim)
+        )
+        meta_f = files.partial_metadata.open("wb")
+
+    print(f"Embedding {total - rows_done} chunks in batches of {batch_size}...")
+    reused = embedded = batches = 0
+    chunks = islice(iter_chunks(chunks_path), rows_done, None)
+    try:
+        while True:
+            batch = list(islice(chunks, batch_size))
+            if not batch:
+                break
+            for c in batch:
+                c["vid"] = chunk_vector_id(c)
+            vids = np.array([c["vid"] for c in batch], dtype=np.int64)
+
+            rows = _previous_rows(previous, vids)
+            vectors = np.empty((len(batch), dim), dtype=np.float32)
+            old = rows >= 0
+            if old.any():
+                vectors[old] = previous["embeddings"][rows[old]]
+            if not old.all():
+                if model is None:
+                    model = load_encoder(backend)
+                new = np.flatnonzero(~old)
+                vectors[new] = compute_embeddings(model, [batch[i]["text"] for i in new])
+
+            start = rows_done
+            embeddings[start:start + len(batch)] = vectors
+            if index.is_trained:
+                index.add_with_ids(vectors, vids)
+            lines = "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in batch).encode("utf-8")
+            meta_f.write(lines)
+
+            rows_done += len(batch)
+            meta_bytes += len(lines)
+            reused += int(old.sum())
+            embedded += int((~old).sum())
+            batches += 1
+            if batches % EMBED_CHECKPOINT_EVERY == 0:
+                _save_checkpoint(files, embeddings, meta_f, rows_done, meta_bytes, source, dim)
+                print(f"  {rows_done}/{total} chunks ({embedded} embedded, {reused} reused)")
+    except BaseException:
+        _save_checkpoint(files, embeddings, meta_f, rows_done, meta_bytes, source, dim)
+        meta_f.close()
+        raise
+
+    embeddings.flush()
+    meta_f.close()
+    if not index.is_trained:
+        train_index(index, embeddings)
+        _add_partial_rows(files, index, embeddings, total, batch_size)
+    del embeddings
+
+    stale = len(previous["vids"]) - reused if previous is not None else 0
+    print(f"Done: {embedded} embedded, {reused} reused, {stale} stale vectors dropped.")
+    print(f"FAISS index contains {index.ntotal} vectors.")
+    return index
 
 
 def save_faiss_index(index: faiss.Index, path: Path) -> None:
     print(f"Saving FAISS index to {path} ...")
-    faiss.write_index(index, str(path))
-    
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    faiss.write_index(index, str(tmp))
+    tmp.replace(path)
 
-def main() -> None:
+
+def save_build_info(path: Path, count: int, index_type: str, backend: str) -> None:
+    info = {"built_at": time.time(), "chunks": count, "index_type": index_type, "encoder": backend}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(info), encoding="utf-8")
+    tmp.replace(path)
+
+
+def previous_encoder(files: ShardFiles) -> Optional[str]:
+    """
+    Encoder backend of the shard's last build (torch for builds that
+    predate recording it), or None if it hasn't been built.
+    """
+    try:
+        info = json.loads(files.build_info.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    return info.get("encoder", "torch")
+
+
+def main(
+    corpora: List[Corpus],
+    full_rebuild: bool = False,
+    resume: bool = True,
+    batch_size: int = EMBED_BATCH_SIZE,
+    index_type: str = INDEX_TYPE,
+    backend: str = EMBED_BACKEND,
+) -> None:
     ensure_data_dirs()
-    
-    if not CHUNKS_FILE.exists():
+    for corpus in corpora:
+        print(f"=== {corpus.name} ===")
+        build_corpus(
+            corpus,
+            full_rebuild=full_rebuild,
+            resume=resume,
+            batch_size=batch_size,
+            index_type=index_type,
+            backend=backend,
+        )
+
+
+def build_corpus(
+    corpus: Corpus,
+    full_rebuild: bool = False,
+    resume: bool = True,
+    batch_size: int = EMBED_BATCH_SIZE,
+    index_type: str = INDEX_TYPE,
+    backend: str = EMBED_BACKEND,
+) -> None:
+    """
+    Build or update one corpus's shard from its chunks file.
+    """
+    files = corpus.files
+    if not corpus.chunks_file.exists():
         raise FileNotFoundError(
-            f"Chunks file not found: {CHUNKS_FILE}. "
-            "Run fetch_and_chunk.py first."
+            f"Chunks file not found: {corpus.chunks_file}. "
+            "Run fetch_chunk.py first."
         )
-        
-    # 1. Load chunks
-    chunks = load_chunks(CHUNKS_FILE)
-    texts = [c["text"] for c in chunks]
-
-    # 2. Compute embeddings
-    embeddings = compute_embeddings(texts)
-
-    # 3. Build FAISS index
-    index = build_faiss_index(embeddings)
-
-    # 4. Save everything
-    VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
-    save_embeddings(embeddings, EMBEDDINGS_FILE)
-    save_metadata(chunks, METADATA_FILE)
-    save_faiss_index(index, FAISS_INDEX_FILE)
-    
+
+    # 1. Vectors we can reuse from the last build, if the same encoder made them
+    built_with = previous_encoder(files)
+    if built_with not in (None, backend) and not full_rebuild:
+        print(f"Last build used the {built_with} encoder, re-embedding everything with {backend}.")
+        full_rebuild = True
+    previous = None if full_rebuild else load_previous_store(files)
+
+    # 2. Stream chunks through the encoder into the embeddings, metadata and index
+    index = build_vector_store(
+        corpus.chunks_file,
+        files,
+        batch_size=batch_size,
+        previous=previous,
+        resume=resume,
+        index_type=index_type,
+        backend=backend,
+    )
+
+    # 3. Swap the new store in
+    save_faiss_index(index, files.faiss_index)
+    files.partial_embeddings.replace(files.embeddings)
+    files.partial_metadata.replace(files.metadata)
+    files.checkpoint.unlink(missing_ok=True)
+    print(f"Writing doc store to {files.doc_store} ...")
+    count = write_doc_store(iter_chunks(files.metadata), files.doc_store)
+    print(f"Writing term index to {files.terms} ...")
+    write_term_index(iter_chunks(files.metadata), files.terms)
+    print(f"Writing symbol index to {files.symbols} ...")
+    symbol_count = write_symbol_index(iter_chunks(files.metadata), files.symbols)
+    print(f"  {symbol_count} API symbols")
+    save_build_info(files.build_info, count, index_type, backend)
+
     print("Done building vector store.")
-    print(f"  Embeddings: {EMBEDDINGS_FILE}")
-    print(f"  Metadata:   {METADATA_FILE}")
-    print(f"  Index:      {FAISS_INDEX_FILE}")
+    print(f"  Embeddings: {files.embeddings}")
+    print(f"  Metadata:   {files.metadata}")
+    print(f"  Index:      {files.faiss_index}")
+    print(f"  Doc store:  {files.doc_store}")
+    print(f"  Terms:      {files.terms}")
+    print(f"  Symbols:    {files.symbols}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build or update the doc vector stores.")
+    parser.add_argument(
+        "--library",
+        action="append",
+        help="Corpus to build, by name or slug (repeatable; default: every enabled corpus with chunks).",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-embed every chunk instead of reusing vectors from the last build.",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint of an interrupted build.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="Chunks read and embedded per batch.",
+    )
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        default=INDEX_TYPE,
+        help="FAISS index to build (default from BONDO_INDEX_TYPE).",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=ENCODER_BACKENDS,
+        default=EMBED_BACKEND,
+        help="Encoder runtime (default from BONDO_EMBED_BACKEND).",
+    )
+    args = parser.parse_args()
+    if args.library:
+        corpora = [get_corpus(name) for name in args.library]
+        if None in corpora:
+            parser.error(f"Unknown library in {args.library}")
+    else:
+        corpora = [c for c in enabled_corpora() if c.chunks_file.exists()]
+    main(
+        corpora,
+        full_rebuild=args.full,
+        resume=not args.restart,
+        batch_size=args.batch_size,
+        index_type=args.index_type,
+        backend=args.backend,
+    )
@@ -0,0 +1,74 @@
+from typing import Dict
+from sentence_transformers import SentenceTransformer
+from app.ingestion.config import (
+    EMBED_MODEL_NAME,
+    EMBED_BACKEND,
+    EMBED_THREADS,
+    EMBED_ONNX_INT8_FILE,
+    EMBED_ONNX_QUANTIZATION,
+    ONNX_DIR,
+)
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+
+def _onnx_kwargs(threads: int) -> Dict:
+    # Comes with the onnx extra of sentence-transformers, so only imported here
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return {"provider": "CPUExecutionProvider", "session_options": options}
+
+
+def _load_int8(threads: int) -> SentenceTransformer:
+    """
+    The model repo's quantized ONNX file if it has one, else a copy
+    quantized for EMBED_ONNX_QUANTIZATION on first use and kept in ONNX_DIR.
+    """
+    try:
+        return SentenceTransformer(
+            EMBED_MODEL_NAME,
+            backend="onnx",
+            model_kwargs={"file_name": EMBED_ONNX_INT8_FILE, **_onnx_kwargs(threads)},
+        )
+    except (OSError, ValueError) as e:
+        print(f"No {EMBED_ONNX_INT8_FILE} for {EMBED_MODEL_NAME} ({e!r}), quantizing locally")
+
+    local_dir = ONNX_DIR / EMBED_MODEL_NAME.replace("/", "__")
+    suffix = f"qint8_{EMBED_ONNX_QUANTIZATION}"
+    file_name = f"onnx/model_{suffix}.onnx"
+    if not (local_dir / file_name).exists():
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        model = SentenceTransformer(EMBED_MODEL_NAME, backend="onnx")
+        model.save(str(local_dir))
+        export_dynamic_quantized_onnx_model(model, EMBED_ONNX_QUANTIZATION, str(local_dir), file_suffix=suffix)
+        print(f"Saved quantized model to {local_dir / file_name}")
+    return SentenceTransformer(
+        str(local_dir),
+        backend="onnx",
+        model_kwargs={"file_name": file_name, **_onnx_kwargs(threads)},
+    )
+
+
+def load_encoder(backend: str = EMBED_BACKEND, threads: int = EMBED_THREADS) -> SentenceTransformer:
+    """
+    The embedding model on one of ENCODER_BACKENDS, with `threads` intra-op
+    threads (0 = default). Every backend is a SentenceTransformer, so
+    encode() is called the same way on all of them.
+    """
+    print(f"Loading embedding model: {EMBED_MODEL_NAME} ({backend}, {threads or 'default'} threads)")
+    if backend == "torch":
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        return SentenceTransformer(EMBED_MODEL_NAME)
+    if backend == "onnx":
+        # Uses the repo's onnx/model.onnx, or exports one from the PyTorch weights
+        return SentenceTransformer(EMBED_MODEL_NAME, backend="onnx", model_kwargs=_onnx_kwargs(threads))
+    if backend == "onnx_int8":
+        return _load_int8(threads)
+    raise ValueError(f"Unknown encoder backend: {backend} (expected one of {', '.join(ENCODER_BACKENDS)})")
@@ -0,0 +1,148 @@
+import sys
+import time
+import argparse
+from typing import Dict, List
+import numpy as np
+import faiss
+from app.ingestion.config import EMBED_THREADS
+from app.ingestion.corpora import DEFAULT_CORPUS, get_corpus
+from app.ingestion.embed_index import compute_embeddings, count_chunks, iter_chunks
+from app.ingestion.encoder import ENCODER_BACKENDS, load_encoder
+
+# Lowest cosine similarity to the torch embedding of the same text that a
+# backend may give before it fails the check
+PARITY_MIN_COSINE = 0.99
+
+
+def sample_chunks(path, n: int, seed: int = 0) -> List[Dict]:
+    """
+    `n` chunks picked at random from a metadata JSONL file, in file order.
+    """
+    total = count_chunks(path)
+    rows = set(np.random.default_rng(seed).choice(total, size=min(n, total), replace=False).tolist())
+    return [chunk for row, chunk in enumerate(iter_chunks(path)) if row in rows]
+
+
+def chunk_query(chunk: Dict) -> str:
+    """
+    A query the chunk should answer: its heading path, or the start of its text.
+    """
+    section = chunk.get("section") or []
+    return " ".join(section) if section else chunk["text"][:200]
+
+
+def _encode_queries(model, queries: List[str]):
+    """
+    Query vectors, one query per call as the backend serves them, and the
+    median latency in ms.
+    """
+    vectors, seconds = [], []
+    for query in queries:
+        start = time.perf_counter()
+        vectors.append(compute_embeddings(model, [query])[0])
+        seconds.append(time.perf_counter() - start)
+    return np.stack(vectors), float(np.median(seconds) * 1000)
+
+
+def _recall(found: np.ndarray, targets: np.ndarray) -> float:
+    return float(np.mean([t in f for f, t in zip(found, targets)]))
+
+
+def parity(
+    corpus_name: str,
+    backends: List[str],
+    n_samples: int = 500,
+    k: int = 10,
+    threads: int = EMBED_THREADS,
+) -> List[Dict]:
+    """
+    Compare each backend with torch on sampled chunks of a built corpus:
+    cosine similarity of the chunk embeddings, and retrieval of each chunk
+    by its heading path from the corpus's index (recall@k, and overlap of
+    the top k with torch's). Returns one row per backend, torch first.
+    """
+    corpus = get_corpus(corpus_name)
+    if corpus is None:
+        raise ValueError(f"Unknown library: {corpus_name}")
+    files = corpus.files
+    if not (files.metadata.exists() and files.faiss_index.exists()):
+        raise FileNotFoundError(f"No vector store for {corpus.name}. Run embed_index.py first.")
+
+    chunks = sample_chunks(files.metadata, n_samples)
+    texts = [c["text"] for c in chunks]
+    queries = [chunk_query(c) for c in chunks]
+    targets = np.array([c["vid"] for c in chunks], dtype=np.int64)
+    index = faiss.read_index(str(files.faiss_index))
+
+    results = []
+    reference = reference_found = None
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        start = time.perf_counter()
+        model = load_encoder(backend, threads)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings = compute_embeddings(model, texts)
+        docs_per_second = len(texts) / (time.perf_counter() - start)
+        query_vectors, query_ms = _encode_queries(model, queries)
+        _, found = index.search(query_vectors, k)
+
+        if reference is None:
+            reference, reference_found = embeddings, found
+        cosine = np.sum(embeddings * reference, axis=1)
+        results.append({
+            "backend": backend,
+            "min_cosine": float(cosine.min()),
+            "mean_cosine": float(cosine.mean()),
+            "recall": _recall(found, targets),
+            "overlap": float(np.mean([len(set(f) & set(r)) / k for f, r in zip(found, reference_found)])),
+            "query_ms": query_ms,
+            "docs_per_s": docs_per_second,
+            "load_s": load_seconds,
+        })
+        del model
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check that the ONNX encoders embed like the PyTorch one, and how fast they are."
+    )
+    parser.add_argument("--library", default=DEFAULT_CORPUS, help="Built corpus to sample chunks from.")
+    parser.add_argument("--backends", default=",".join(ENCODER_BACKENDS), help="Comma-separated backends.")
+    parser.add_argument("--samples", type=int, default=500, help="Number of sampled chunks.")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query (recall@k).")
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS, help="Intra-op threads (0 = default).")
+    parser.add_argument("--min-cosine", type=float, default=PARITY_MIN_COSINE, help="Lowest cosine allowed.")
+    args = parser.parse_args()
+
+    results = parity(
+        args.library,
+        backends=args.backends.split(","),
+        n_samples=args.samples,
+        k=args.k,
+        threads=args.threads,
+    )
+    reference_recall = results[0]["recall"]
+
+    print(
+        f"\n{'backend':<11}{'min cos':>9}{'mean cos':>10}{'recall@' + str(args.k):>11}{'delta':>8}"
+        f"{'overlap':>9}{'query ms':>10}{'docs/s':>9}{'load s':>8}"
+    )
+    failed = []
+    for r in results:
+        print(
+            f"{r['backend']:<11}{r['min_cosine']:>9.4f}{r['mean_cosine']:>10.4f}{r['recall']:>11.3f}"
+            f"{r['recall'] - reference_recall:>+8.3f}{r['overlap']:>9.3f}{r['query_ms']:>10.2f}"
+            f"{r['docs_per_s']:>9.0f}{r['load_s']:>8.2f}"
+        )
+        if r["min_cosine"] < args.min_cosine:
+            failed.append(r["backend"])
+
+    if failed:
+        print(f"\nBelow cosine {args.min_cosine}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,124 @@
 import json
 import time
+import hashlib
+import argparse
 from pathlib import Path
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 import requests
 from bs4 import BeautifulSoup
 from markdownify import markdownify as html_to_md
-from app.ingestion.config import RAW_HTML_DIR, TEXT_DIR, DOC_URLS
+from app.ingestion.config import (
+    RAW_HTML_DIR,
+    TEXT_DIR,
+    CRAWL_MAX_PAGES,
+    CRAWL_CONCURRENCY,
+    CRAWL_PER_HOST_CONCURRENCY,
+    CRAWL_PER_HOST_RPS,
+    CRAWL_MAX_RETRIES,
+    CHUNK_WORKERS,
+)
+from app.ingestion.corpora import Corpus, enabled_corpora, get_corpus
+from app.ingestion.crawler import Crawler
+from app.ingestion.chunker import CHUNKER_VERSION, chunk_markdown
+
+# lxml is several times faster than the pure-Python parser on big API pages,
+# but it's optional.
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
 
 def ensure_dirs() -> None:
     RAW_HTML_DIR.mkdir(parents=True, exist_ok=True)
     TEXT_DIR.mkdir(parents=True, exist_ok=True)
-    
-def fetch_html(url: str) -> str:
+
+
+def url_to_safe_name(url: str) -> str:
+    # Make a filesystem-friendly name from the URL
+    return url.replace("https://", "").replace("http://", "").replace("/", "_")
+
+
+def raw_html_path(url: str) -> Path:
+    return RAW_HTML_DIR / f"{url_to_safe_name(url)}.html"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fetch_html(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    session: Optional[requests.Session] = None,
+) -> requests.Response:
     print(f"Fetching: {url}")
     start_time = time.time()
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
+    resp = (session or requests).get(url, headers=headers or {}, timeout=30)
+    if resp.status_code != 304:
+        resp.raise_for_status()
     end_time = time.time()
-    print(f"Fetched {url} in {end_time - start_time:.2f} seconds")
-    return resp.text
+    print(f"Fetched {url} in {end_time - start_time:.2f} seconds ({resp.status_code})")
+    return resp
 
 def save_raw_html(url: str, html: str) -> Path:
-    # Make a filesystem-friendly name from the URL
-    safe_name = url.replace("https://", "").replace("http://", "").replace("/", "_")
-    path = RAW_HTML_DIR / f"{safe_name}.html"
+    path = raw_html_path(url)
     path.write_text(html, encoding="utf-8")
     return path
 
-def load_or_fetch_html(url: str) -> str:
+def fetch_page(
+    url: str,
+    page_state: Optional[Dict] = None,
+    session: Optional[requests.Session] = None,
+) -> Tuple[str, Dict, bool]:
     """
-    Simple cache: if we've already downloaded this URL, read from disk.
+    Revalidating cache: if we've already downloaded this URL, ask the server
+    whether it changed (ETag / Last-Modified) and reuse the copy on disk if not.
+    Raises on network errors.
+
+    Returns (html, new page state, changed).
     """
-    safe_name = url.replace("https://", "").replace("http://", "").replace("/", "_")
-    path = RAW_HTML_DIR / f"{safe_name}.html"
+    page_state = page_state or {}
+    path = raw_html_path(url)
+
+    headers = {}
     if path.exists():
-        print(f"Using cached HTML for: {url}")
-        return path.read_text(encoding="utf-8")
+        if page_state.get("etag"):
+            headers["If-None-Match"] = page_state["etag"]
+        if page_state.get("last_modified"):
+            headers["If-Modified-Since"] = page_state["last_modified"]
+
+    resp = fetch_html(url, headers=headers, session=session)
+
+    if resp.status_code == 304:
+        print(f"Not modified, using cached HTML for: {url}")
+        html = path.read_text(encoding="utf-8")
+        return html, page_state, content_hash(html) != page_state.get("content_hash")
 
+    html = resp.text
+    save_raw_html(url, html)
+    new_state = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "content_hash": content_hash(html),
+    }
+    return html, new_state, new_state["content_hash"] != page_state.get("content_hash")
+
+def load_or_fetch_html(url: str, page_state: Optional[Dict] = None) -> Tuple[str, Dict, bool]:
+    """
+    fetch_page(), falling back to the cached HTML if the server can't be reached.
+    """
+    page_state = page_state or {}
     try:
-        html = fetch_html(url)
-        save_raw_html(url, html)
-        return html
+        return fetch_page(url, page_state)
     except requests.exceptions.RequestException as e:
+        path = raw_html_path(url)
+        if path.exists():
+            print(f"Error fetching {url}: {e}. Using cached HTML.")
+            html = path.read_text(encoding="utf-8")
+            return html, page_state, content_hash(html) != page_state.get("content_hash")
         print(f"Error fetching {url}: {e}")
         raise
 
@@ -51,7 +127,7 @@ def clean_html_to_text(html: str) -> str:
     Convert HTML to a roughly readable markdown-style text.
     We also strip some nav/footer sections using simple heuristics.
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
 
     # Optionally remove scripts/styles
     for tag in soup(["script", "style", "noscript"]):
@@ -63,85 +139,266 @@ def clean_html_to_text(html: str) -> str:
     if main is None:
         main = soup
 
-    md = html_to_md(str(main))
+    # ATX headings ("## Title") so the chunker can follow the section structure
+    md = html_to_md(str(main), heading_style="ATX")
     return md
 
 
+def chunks_from_text(url: str, text: str, max_chars: int, min_chars: int) -> List[Dict]:
+    """
+    Chunk one page's cleaned text into doc chunk dicts. A chunk whose text
+    repeats an earlier one on the page is dropped, so (url, hash) identifies
+    each chunk (embed_index.py's vector ids are derived from it).
+    """
+    file_safe = url_to_safe_name(url)
+    base_id = file_safe
+
+    chunks = []
+    seen = set()
+    for chunk in chunk_markdown(text, max_chars, min_chars):
+        digest = content_hash(chunk["text"])
+        if digest in seen:
+            continue
+        seen.add(digest)
+        chunks.append({
+            "id": f"{base_id}__{len(chunks)}",
+            "url": url,
+            "source": file_safe,
+            "text": chunk["text"],
+            "title": chunk["title"],
+            "section": chunk["section"],
+            "anchor_url": f"{url}#{chunk['anchor']}" if chunk["anchor"] else url,
+            "hash": digest,
+        })
+    return chunks
+
 
-def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> List[str]:
+def load_manifest(path: Path) -> Dict:
+    if not path.exists():
+        return {"pages": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_manifest(manifest: Dict, path: Path) -> None:
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def load_chunks_by_url(path: Path) -> Dict[str, List[Dict]]:
     """
-    Very simple char-based chunking with overlap.
-    Good enough for an MVP; you can later switch to paragraph/heading-aware chunking.
+    Previously written chunks, grouped by page, so unchanged pages can be reused as-is.
+    Repeated chunks on a page (from files written before chunks_from_text()
+    dropped them) are skipped.
     """
-    if overlap >= max_chars:
-        raise ValueError("overlap must be smaller than max_chars to avoid infinite loops")
+    by_url: Dict[str, List[Dict]] = {}
+    seen = set()
+    if not path.exists():
+        return by_url
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            ch = json.loads(line)
+            if "hash" not in ch:
+                ch["hash"] = content_hash(ch["text"])
+            if (ch["url"], ch["hash"]) in seen:
+                continue
+            seen.add((ch["url"], ch["hash"]))
+            by_url.setdefault(ch["url"], []).append(ch)
+    return by_url
 
-    print(f"Chunking text of length {len(text)}")
-    chunks: List[str] = []
-    start = 0
-    n = len(text)
-    
-    while start < n:
-        end = min(start + max_chars, n)
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        if end >= n:
-            break
-        start = max(end - overlap, 0)
 
-    print(f"Generated {len(chunks)} chunks")
-    return chunks
+def crawl_docs(corpus: Corpus, pages: Dict[str, Dict], resume: bool = True) -> Dict[str, Tuple[Dict, bool]]:
+    """
+    Crawl a corpus's docs site from its doc URLs, following links under its
+    crawl prefix. Returns {url: (page state, changed)} for every page fetched.
+    """
+    crawler = Crawler(
+        seeds=list(corpus.doc_urls),
+        prefix=corpus.crawl_prefix,
+        fetch=fetch_page,
+        page_states=pages,
+        frontier_path=corpus.crawl_frontier_file,
+        max_pages=CRAWL_MAX_PAGES,
+        concurrency=CRAWL_CONCURRENCY,
+        per_host_concurrency=CRAWL_PER_HOST_CONCURRENCY,
+        per_host_rps=CRAWL_PER_HOST_RPS,
+        max_retries=CRAWL_MAX_RETRIES,
+    )
+    fetched = crawler.run(resume=resume)
+
+    # Keep the last good copy of pages we couldn't reach this time
+    for url in crawler.failed:
+        if url in pages and raw_html_path(url).exists():
+            fetched[url] = (pages[url], False)
+    return fetched
+
+
+def _chunk_page_from_disk(url: str, max_chars: int, min_chars: int) -> Tuple[List[Dict], float, float]:
+    """
+    Process-pool task: clean and chunk one cached page.
+    Returns (chunks, seconds spent cleaning, seconds spent chunking).
+    """
+    html = raw_html_path(url).read_text(encoding="utf-8")
+
+    t0 = time.perf_counter()
+    text = clean_html_to_text(html)
+    t1 = time.perf_counter()
+    chunks = chunks_from_text(url, text, max_chars, min_chars)
+    t2 = time.perf_counter()
+    print(f"  {url} -> {len(chunks)} chunks")
+    return chunks, t1 - t0, t2 - t1
 
 
-def build_doc_chunks() -> List[Dict]:
+def iter_doc_chunks(
+    corpus: Corpus,
+    manifest: Dict,
+    timings: Dict[str, float],
+    crawl: bool = False,
+    resume_crawl: bool = True,
+    workers: int = CHUNK_WORKERS,
+) -> Iterator[Dict]:
     """
-    For each URL:
-      - download or load cached HTML
-      - clean to text
-      - chunk into pieces
-    Returns a list of dicts representing doc chunks.
+    For each URL of `corpus` (its doc URLs, or every page the crawler finds):
+      - download, revalidate or load cached HTML
+      - if the page is unchanged, reuse its previous chunks
+      - otherwise clean to text and chunk into pieces (across a process pool)
+    Yields doc chunk dicts in page order. `manifest` is updated in place with
+    the new per-page state, and `timings` with seconds spent per stage.
     """
     ensure_dirs()
-    all_chunks: List[Dict] = []
+    pages = manifest.setdefault("pages", {})
+    previous_chunks = load_chunks_by_url(corpus.chunks_file)
+    if manifest.get("chunker_version") != CHUNKER_VERSION:
+        print(f"Chunker changed since the last run, re-chunking all pages (v{CHUNKER_VERSION})")
+        previous_chunks = {}
+    manifest["chunker_version"] = CHUNKER_VERSION
+
+    t0 = time.perf_counter()
+    if crawl:
+        fetched = crawl_docs(corpus, pages, resume=resume_crawl)
+    else:
+        fetched = {}
+        for url in corpus.doc_urls:
+            _, state, changed = load_or_fetch_html(url, pages.get(url))
+            fetched[url] = (state, changed)
+    timings["fetch"] += time.perf_counter() - t0
 
-    for url in DOC_URLS:
-        html = load_or_fetch_html(url)
-        text = clean_html_to_text(html)
+    items = list(fetched.items())
+    to_chunk = [
+        i for i, (url, (_, changed)) in enumerate(items)
+        if changed or url not in previous_chunks
+    ]
+    print(f"{len(to_chunk)}/{len(items)} pages changed, cleaning with {HTML_PARSER}")
 
-        file_safe = url.replace("https://", "").replace("http://", "").replace("/", "_")
-        base_id = file_safe
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(to_chunk) > 1 else None
+    # Only keep a bounded number of pages in flight so memory stays flat
+    window = max(workers, 1) * 4
+    pending: Dict[int, object] = {}
+    next_submit = 0
 
-        chunks = chunk_text(text)
-        print(f"  {url} -> {len(chunks)} chunks")
+    try:
+        for i, (url, (state, changed)) in enumerate(items):
+            while pool is not None and next_submit < len(to_chunk) and to_chunk[next_submit] < i + window:
+                j = to_chunk[next_submit]
+                pending[j] = pool.submit(_chunk_page_from_disk, items[j][0], corpus.chunk_max_chars, corpus.chunk_min_chars)
+                next_submit += 1
+
+            if not changed and url in previous_chunks:
+                chunks = previous_chunks.pop(url)
+                print(f"  {url} unchanged -> reusing {len(chunks)} chunks")
+            else:
+                if pool is not None:
+                    chunks, clean_s, chunk_s = pending.pop(i).result()
+                else:
+                    chunks, clean_s, chunk_s = _chunk_page_from_disk(url, corpus.chunk_max_chars, corpus.chunk_min_chars)
+                timings["clean"] += clean_s
+                timings["chunk"] += chunk_s
 
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{base_id}__{i}"
-            all_chunks.append(
-                {
-                    "id": chunk_id,
-                    "url": url,
-                    "source": file_safe,
-                    "text": chunk,
-                }
-            )
+            # Chunk hashes live in the chunks file; older manifests kept a copy
+            state.pop("chunks", None)
+            pages[url] = state
+            yield from chunks
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
 
-    return all_chunks
+    # Forget pages we no longer index
+    for url in list(pages):
+        if url not in fetched:
+            del pages[url]
 
 
-def save_chunks_to_jsonl(chunks: List[Dict], path: Path) -> None:
-    with path.open("w", encoding="utf-8") as f:
+def save_chunks_to_jsonl(chunks: Iterable[Dict], path: Path) -> int:
+    """
+    Stream chunks to a JSONL file (atomically replaced at the end).
+    Returns the number of chunks written.
+    """
+    count = 0
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
         for ch in chunks:
             f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+            count += 1
+    tmp_path.replace(path)
+    return count
 
 
-def main() -> None:
+def main(
+    corpora: List[Corpus],
+    crawl: bool = False,
+    resume_crawl: bool = True,
+    workers: int = CHUNK_WORKERS,
+) -> None:
     ensure_dirs()
-    chunks = build_doc_chunks()
-    out_path = TEXT_DIR / "sklearn_doc_chunks.jsonl"
-    save_chunks_to_jsonl(chunks, out_path)
-    print(f"Saved {len(chunks)} chunks to {out_path}")
+    for corpus in corpora:
+        print(f"=== {corpus.name} ===")
+        fetch_corpus(corpus, crawl=crawl, resume_crawl=resume_crawl, workers=workers)
+
+
+def fetch_corpus(corpus: Corpus, crawl: bool = False, resume_crawl: bool = True, workers: int = CHUNK_WORKERS) -> None:
+    started = time.perf_counter()
+    timings = {"fetch": 0.0, "clean": 0.0, "chunk": 0.0}
+
+    manifest = load_manifest(corpus.page_manifest_file)
+    chunks = iter_doc_chunks(corpus, manifest, timings, crawl=crawl, resume_crawl=resume_crawl, workers=workers)
+    count = save_chunks_to_jsonl(chunks, corpus.chunks_file)
+    save_manifest(manifest, corpus.page_manifest_file)
+    print(f"Saved {count} chunks to {corpus.chunks_file}")
+
+    total = time.perf_counter() - started
+    print("Stage timings (clean/chunk are summed across workers):")
+    print(f"  fetch: {timings['fetch']:.2f}s")
+    print(f"  clean: {timings['clean']:.2f}s ({HTML_PARSER})")
+    print(f"  chunk: {timings['chunk']:.2f}s")
+    print(f"  total: {total:.2f}s wall, {workers} worker(s)")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Fetch and chunk the docs.")
+    parser.add_argument(
+        "--library",
+        action="append",
+        help="Corpus to fetch, by name or slug (repeatable; default: every enabled corpus).",
+    )
+    parser.add_argument(
+        "--crawl",
+        action="store_true",
+        help="Crawl every page under each corpus's crawl prefix instead of just its doc URLs.",
+    )
+    parser.add_argument(
+        "--restart-crawl",
+        action="store_true",
+        help="Ignore an interrupted crawl's frontier and start from the seeds.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=CHUNK_WORKERS,
+        help="Processes used to clean and chunk pages (1 = no process pool).",
+    )
+    args = parser.parse_args()
+    corpora = [get_corpus(name) for name in args.library] if args.library else enabled_corpora()
+    if None in corpora:
+        parser.error(f"Unknown library in {args.library}")
+    main(corpora, crawl=args.crawl, resume_crawl=not args.restart_crawl, workers=args.workers)
@@ -0,0 +1,119 @@
+import time
+import argparse
+from typing import Dict, List
+import numpy as np
+import faiss
+from app.ingestion.config import INDEX_NPROBE, INDEX_EF_SEARCH
+from app.ingestion.corpora import DEFAULT_CORPUS, get_corpus
+from app.ingestion.index_factory import INDEX_TYPES, make_index, train_index, set_search_params
+
+# Vectors copied out of the memmap per add() call
+ADD_BATCH = 65536
+
+
+def _recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def _search(index: faiss.Index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, len(queries) / (time.perf_counter() - start)
+
+
+def benchmark(
+    embeddings: np.ndarray,
+    kinds: List[str],
+    k: int = 10,
+    n_queries: int = 1000,
+    nprobes: List[int] = (INDEX_NPROBE,),
+    ef_searches: List[int] = (INDEX_EF_SEARCH,),
+) -> List[Dict]:
+    """
+    Build each index type over `embeddings` and compare it with exact search.
+    Queries are corpus vectors picked at random. Returns one row per
+    (index type, tunable value) with recall@k, QPS, size and build time.
+    """
+    n, dim = embeddings.shape
+    rng = np.random.default_rng(0)
+    query_rows = np.sort(rng.choice(n, size=min(n_queries, n), replace=False))
+    queries = np.ascontiguousarray(embeddings[query_rows], dtype=np.float32)
+    ids = np.arange(n, dtype=np.int64)
+
+    results = []
+    truth = None
+    for kind in ["flat"] + [kind for kind in kinds if kind != "flat"]:
+        start = time.perf_counter()
+        index = make_index(dim, n, kind)
+        if not index.is_trained:
+            train_index(index, embeddings)
+        for lo in range(0, n, ADD_BATCH):
+            batch = np.ascontiguousarray(embeddings[lo:lo + ADD_BATCH], dtype=np.float32)
+            index.add_with_ids(batch, ids[lo:lo + ADD_BATCH])
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+
+        if kind in ("ivf_flat", "ivf_pq"):
+            settings = [("nprobe", v, {"nprobe": v}) for v in nprobes]
+        elif kind == "hnsw":
+            settings = [("efSearch", v, {"ef_search": v}) for v in ef_searches]
+        else:
+            settings = [("-", "-", {})]
+
+        for name, value, params in settings:
+            set_search_params(index, **params)
+            found, qps = _search(index, queries, k)
+            if truth is None:
+                truth = found
+            results.append({
+                "index": kind,
+                "param": f"{name}={value}" if params else "-",
+                "recall": _recall_at_k(found, truth),
+                "qps": qps,
+                "size_mb": size_mb,
+                "build_s": build_seconds,
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare approximate FAISS indexes against exact search on the built embeddings."
+    )
+    parser.add_argument("--library", default=DEFAULT_CORPUS, help="Corpus whose embeddings to use.")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma-separated index types.")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query (recall@k).")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of sampled queries.")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="nprobe values to sweep for IVF indexes.")
+    parser.add_argument("--ef-search", default="16,64,256", help="efSearch values to sweep for HNSW.")
+    args = parser.parse_args()
+
+    corpus = get_corpus(args.library)
+    if corpus is None:
+        parser.error(f"Unknown library: {args.library}")
+    embeddings_file = corpus.files.embeddings
+    if not embeddings_file.exists():
+        raise FileNotFoundError(f"Embeddings not found: {embeddings_file}. Run embed_index.py first.")
+
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+    print(f"Benchmarking over {embeddings.shape[0]} vectors (dim={embeddings.shape[1]}), k={args.k}")
+    results = benchmark(
+        embeddings,
+        kinds=args.types.split(","),
+        k=args.k,
+        n_queries=args.queries,
+        nprobes=[int(v) for v in args.nprobe.split(",")],
+        ef_searches=[int(v) for v in args.ef_search.split(",")],
+    )
+
+    print(f"\n{'index':<10}{'param':<14}{'recall@' + str(args.k):>10}{'QPS':>12}{'size MB':>10}{'build s':>10}")
+    for r in results:
+        print(
+            f"{r['index']:<10}{r['param']:<14}{r['recall']:>10.3f}{r['qps']:>12.0f}"
+            f"{r['size_mb']:>10.2f}{r['build_s']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import math
+from typing import Optional
+import numpy as np
+import faiss
+from app.ingestion.config import (
+    INDEX_TYPE,
+    INDEX_IVF_NLIST,
+    INDEX_HNSW_M,
+    INDEX_PQ_M,
+    INDEX_TRAIN_SAMPLE,
+    INDEX_NPROBE,
+    INDEX_EF_SEARCH,
+)
+
+INDEX_TYPES = ["flat", "ivf_flat", "hnsw", "ivf_pq"]
+
+# faiss wants ~39 training points per centroid
+_POINTS_PER_CENTROID = 39
+
+
+def _ivf_nlist(n: int) -> int:
+    if INDEX_IVF_NLIST > 0:
+        return INDEX_IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(n)), n // _POINTS_PER_CENTROID))
+
+
+def _pq_m(dim: int) -> int:
+    # Sub-quantizer count has to divide the dimension
+    return max(m for m in range(1, min(INDEX_PQ_M, dim) + 1) if dim % m == 0)
+
+
+def factory_string(kind: str, dim: int, n: int) -> str:
+    """
+    faiss.index_factory description for an index type sized for `n` vectors.
+    """
+    if kind == "flat":
+        return "Flat"
+    if kind == "ivf_flat":
+        return f"IVF{_ivf_nlist(n)},Flat"
+    if kind == "hnsw":
+        return f"HNSW{INDEX_HNSW_M}"
+    if kind == "ivf_pq":
+        # 8-bit codes need 256 centroids per sub-quantizer; shrink them for tiny corpora
+        nbits = max(1, min(8, int(math.log2(max(n // _POINTS_PER_CENTROID, 2)))))
+        return f"IVF{_ivf_nlist(n)},PQ{_pq_m(dim)}x{nbits}"
+    raise ValueError(f"Unknown index type {kind!r}, expected one of {INDEX_TYPES}")
+
+
+def make_index(dim: int, n: int, kind: str = INDEX_TYPE) -> faiss.Index:
+    """
+    An empty inner-product index (cosine on normalized embeddings), wrapped in
+    an id map so vectors are addressed by their chunk's vid. IVF indexes come
+    back untrained; see train_index().
+    """
+    description = factory_string(kind, dim, n)
+    print(f"Building FAISS index {description} (dim={dim}, n={n})...")
+    return faiss.IndexIDMap2(faiss.index_factory(dim, description, faiss.METRIC_INNER_PRODUCT))
+
+
+def train_index(index: faiss.Index, embeddings: np.ndarray, sample_size: int = INDEX_TRAIN_SAMPLE) -> None:
+    """
+    Train on a random sample of rows of `embeddings` (may be a memmap).
+    """
+    n = len(embeddings)
+    rows = np.arange(n)
+    if n > sample_size:
+        rows = np.sort(np.random.default_rng(0).choice(n, size=sample_size, replace=False))
+    print(f"Training index on {len(rows)} of {n} vectors...")
+    index.train(np.ascontiguousarray(embeddings[rows], dtype=np.float32))
+
+
+def set_search_params(
+    index: faiss.Index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> None:
+    """
+    Apply query-time tunables (defaults: INDEX_NPROBE / INDEX_EF_SEARCH).
+    Knobs the index type doesn't have are ignored.
+    """
+    params = {
+        "nprobe": INDEX_NPROBE if nprobe is None else nprobe,
+        "efSearch": INDEX_EF_SEARCH if ef_search is None else ef_search,
+    }
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        try:
+            space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
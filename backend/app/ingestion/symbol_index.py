@@ -0,0 +1,114 @@
+import re
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+# Fully qualified API name: "sklearn.linear_model.LinearRegression.fit"
+_QUALNAME_RE = re.compile(r"^[A-Za-z_]\w*(?:\.\w+)+$")
+# Signature lines in API pages after markdownify: "*class* sklearn.svm.SVC(*, C=1.0, ...)"
+_SIGNATURE_RE = re.compile(r"^[\s*_]*(?:(?:class|function)[*_]*\s+)?([A-Za-z_]\w*(?:\.\w+)+)\s*\(", re.MULTILINE)
+
+# Chunks kept per symbol: its definitions first, then the rest of its API page
+SYMBOL_MAX_ROWS = 8
+
+
+def _qualname(value: str) -> Optional[str]:
+    if value.startswith("module-"):
+        value = value[len("module-"):]
+    return value if _QUALNAME_RE.match(value) else None
+
+
+def chunk_symbols(record: Dict) -> Dict[str, List[str]]:
+    """
+    API names a chunk documents. "defines" are names whose definition is in
+    the chunk (its permalink anchor, or a signature line); "page" is the
+    name of the API page the chunk is on ("sklearn.svm.SVC.html").
+    """
+    defines = []
+    anchor_url = record.get("anchor_url") or ""
+    if "#" in anchor_url:
+        name = _qualname(anchor_url.rsplit("#", 1)[1])
+        if name:
+            defines.append(name)
+    # markdownify escapes underscores: sklearn.linear\_model
+    text = (record.get("text") or "").replace("\\_", "_")
+    for match in _SIGNATURE_RE.finditer(text):
+        if match.group(1) not in defines:
+            defines.append(match.group(1))
+
+    page = []
+    filename = urlparse(record.get("url") or "").path.rsplit("/", 1)[-1]
+    if filename.endswith(".html"):
+        name = _qualname(filename[:-len(".html")])
+        if name:
+            page.append(name)
+    return {"defines": defines, "page": page}
+
+
+def write_symbol_index(records: Iterable[Dict], path: Path) -> int:
+    """
+    Map fully qualified API names to the rows of the chunks documenting
+    them, definitions before other chunks of the API page, each in row
+    order. Returns the number of symbols.
+    """
+    defines: Dict[str, List[int]] = {}
+    pages: Dict[str, List[int]] = {}
+    for row, record in enumerate(records):
+        found = chunk_symbols(record)
+        for name in found["defines"]:
+            defines.setdefault(name, []).append(row)
+        for name in found["page"]:
+            pages.setdefault(name, []).append(row)
+
+    symbols: Dict[str, List[int]] = {}
+    for name in sorted(set(defines) | set(pages)):
+        rows = list(defines.get(name, []))
+        rows += [row for row in pages.get(name, []) if row not in rows]
+        symbols[name] = rows[:SYMBOL_MAX_ROWS]
+
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"symbols": symbols}, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(path)
+    return len(symbols)
+
+
+class SymbolIndex:
+    """
+    Reader for a file written by write_symbol_index().
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.symbols: Dict[str, List[int]] = json.loads(path.read_text(encoding="utf-8"))["symbols"]
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def lookup(self, name: str) -> List[int]:
+        """
+        Rows documenting `name`. Falls back to the closest documented parent
+        ("pkg.Class.method" -> "pkg.Class") for names without their own entry.
+        """
+        while name:
+            rows = self.symbols.get(name)
+            if rows is not None:
+                return rows
+            name = name.rpartition(".")[0]
+        return []
+
+    def rows_for(self, names: Iterable[str], limit: int) -> List[int]:
+        """
+        Up to `limit` rows for `names`, taking each name's best chunk before
+        any name's second one.
+        """
+        per_name = [self.lookup(name) for name in names]
+        rows: List[int] = []
+        depth = 0
+        while len(rows) < limit and any(depth < len(r) for r in per_name):
+            for name_rows in per_name:
+                if depth < len(name_rows) and name_rows[depth] not in rows:
+                    rows.append(name_rows[depth])
+                    if len(rows) == limit:
+                        break
+            depth += 1
+        return rows
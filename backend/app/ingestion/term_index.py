@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import shutil
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+# Identifier-like tokens: "LinearRegression", "fit_transform", "n_estimators"
+_TOKEN_RE = re.compile(r"[a-z_][a-z0-9_]+")
+
+# Fields indexed per chunk: postings for "text" carry term frequencies
+FIELDS = ["text", "url"]
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    # markdownify escapes underscores: train\_test\_split
+    return _TOKEN_RE.findall(text.replace("\\_", "_").lower())
+
+
+def _field_value(record: Dict, field: str) -> str:
+    if field == "url":
+        return record.get("anchor_url") or record.get("url") or ""
+    return record.get(field) or ""
+
+
+def write_term_index(records: Iterable[Dict], directory: Path) -> int:
+    """
+    Build an inverted index over the chunks' text and URLs, in row order.
+
+    For each field, term t's postings are rows[offsets[t]:offsets[t + 1]]
+    (sorted ascending) with matching term frequencies in tf. Also saves the
+    per-row token count of the text and the vocabulary. Returns the row count.
+
+    The files are written to a new directory that `directory` (a symlink)
+    is then switched to, so a running backend that memory-maps the old
+    files is never handed half-written ones.
+    """
+    vocab: Dict[str, int] = {}
+    parts: Dict[str, Tuple[List[np.ndarray], List[np.ndarray], List[np.ndarray]]] = {
+        field: ([], [], []) for field in FIELDS
+    }
+    doc_lengths: List[int] = []
+
+    n = 0
+    for row, record in enumerate(records):
+        for field in FIELDS:
+            tokens = tokenize(_field_value(record, field))
+            if field == "text":
+                doc_lengths.append(len(tokens))
+            counts = Counter(tokens)
+            term_ids, rows, tfs = parts[field]
+            term_ids.append(np.fromiter((vocab.setdefault(t, len(vocab)) for t in counts), dtype=np.int32))
+            rows.append(np.full(len(counts), row, dtype=np.int32))
+            tfs.append(np.fromiter(counts.values(), dtype=np.int32))
+        n = row + 1
+
+    out = directory.with_name(f"{directory.name}.v{time.time_ns()}")
+    out.mkdir(parents=True)
+    for field in FIELDS:
+        term_ids, rows, tfs = (np.concatenate(p) if p else np.empty(0, dtype=np.int32) for p in parts[field])
+        order = np.lexsort((rows, term_ids))
+        term_ids, rows, tfs = term_ids[order], rows[order], tfs[order]
+        offsets = np.searchsorted(term_ids, np.arange(len(vocab) + 1)).astype(np.int64)
+        np.save(out / f"{field}_offsets.npy", offsets)
+        np.save(out / f"{field}_rows.npy", rows)
+        np.save(out / f"{field}_tf.npy", tfs)
+
+    np.save(out / "doc_lengths.npy", np.array(doc_lengths, dtype=np.int32))
+    terms = sorted(vocab, key=vocab.get)
+    (out / "terms.json").write_text(json.dumps({"rows": n, "terms": terms}), encoding="utf-8")
+    _swap_in(out, directory)
+    return n
+
+
+def _swap_in(out: Path, directory: Path) -> None:
+    """
+    Atomically point the `directory` symlink at `out` and delete the
+    versions it pointed at before. Files already memory-mapped stay
+    readable after they're deleted.
+    """
+    link = directory.with_name(directory.name + ".link")
+    link.unlink(missing_ok=True)
+    link.symlink_to(out.name)
+    if directory.is_dir() and not directory.is_symlink():
+        # Written before the index was versioned
+        shutil.rmtree(directory)
+    os.replace(link, directory)
+    for old in directory.parent.glob(f"{directory.name}.v*"):
+        if old != out:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+class TermIndex:
+    """
+    Memory-mapped reader for a directory written by write_term_index().
+    """
+
+    def __init__(self, directory: Path) -> None:
+        info = json.loads((directory / "terms.json").read_text(encoding="utf-8"))
+        self.rows = info["rows"]
+        self.vocab = {term: i for i, term in enumerate(info["terms"])}
+        self.doc_lengths = np.load(directory / "doc_lengths.npy", mmap_mode="r")
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.rows else 0.0
+        self._postings = {
+            field: (
+                np.load(directory / f"{field}_offsets.npy", mmap_mode="r"),
+                np.load(directory / f"{field}_rows.npy", mmap_mode="r"),
+                np.load(directory / f"{field}_tf.npy", mmap_mode="r"),
+            )
+            for field in FIELDS
+        }
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def postings(self, field: str, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, term frequencies) of the chunks whose `field` contains `term`.
+        """
+        offsets, rows, tfs = self._postings[field]
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return rows[:0], tfs[:0]
+        start, end = offsets[term_id], offsets[term_id + 1]
+        return rows[start:end], tfs[start:end]
+
+    def match_counts(self, field: str, terms: Iterable[str], rows: np.ndarray) -> np.ndarray:
+        """
+        For each of `rows`, how many of `terms` occur in its `field`.
+        """
+        counts = np.zeros(len(rows), dtype=np.int32)
+        if not len(rows):
+            return counts
+        for term in set(terms):
+            posting_rows, _ = self.postings(field, term)
+            if not len(posting_rows):
+                continue
+            pos = np.minimum(np.searchsorted(posting_rows, rows), len(posting_rows) - 1)
+            counts += posting_rows[pos] == rows
+        return counts
+
+    def bm25(self, terms: Iterable[str], top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 over chunk text. Returns (rows, scores) of the best `top_n`
+        chunks that match at least one term, best first.
+        """
+        scores = np.zeros(self.rows, dtype=np.float32)
+        matched = False
+        for term in set(terms):
+            rows, tfs = self.postings("text", term)
+            df = len(rows)
+            if not df:
+                continue
+            matched = True
+            idf = np.log(1.0 + (self.rows - df + 0.5) / (df + 0.5))
+            lengths = self.doc_lengths[rows] / max(self.avg_doc_length, 1e-9)
+            tfs = tfs.astype(np.float32)
+            scores[rows] += idf * tfs * (BM25_K1 + 1) / (tfs + BM25_K1 * (1 - BM25_B + BM25_B * lengths))
+
+        if not matched:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_n:
+            hits = hits[np.argpartition(-scores[hits], top_n - 1)[:top_n]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return hits, scores[hits]
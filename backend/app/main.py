@@ -1,12 +1,27 @@
-from fastapi import FastAPI
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from app.api.router import router as api_router
-from app.models.utils import HealthResponse
+from app.models.utils import HealthResponse, ReadyResponse
+from app.services.executor_pool import get_pool, shutdown_pool
+from app.services.rag import RAG_WARMUP, rag_status, warm_up
 from fastapi.middleware.cors import CORSMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the executor workers now so they import sklearn before the first /run
+    get_pool()
+    # Load the embedding model and index in the background; /ready reports progress
+    if RAG_WARMUP:
+        threading.Thread(target=warm_up, name="rag-warmup", daemon=True).start()
+    yield
+    shutdown_pool()
+
 app = FastAPI(
     title="bondo backend",
     version="0.1.0",
     description="Backend API for bondo (scikit-learn mentor).",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -21,4 +36,21 @@ app.add_middleware(
 def health_check():
     return HealthResponse(status="ok")
 
+@app.get("/ready", response_model=ReadyResponse)
+def ready_check(response: Response):
+    """
+    Readiness probe: 200 once the RAG stack is loaded, 503 until then.
+    """
+    components = rag_status()
+    states = {c["state"] for c in components.values()}
+    if states == {"ready"}:
+        status = "ready"
+    elif "error" in states:
+        status = "error"
+    else:
+        status = "loading"
+    if status != "ready":
+        response.status_code = 503
+    return ReadyResponse(status=status, components=components)
+
 app.include_router(api_router)
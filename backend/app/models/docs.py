@@ -4,6 +4,8 @@ from typing import List, Optional
 class DocSearchRequest(BaseModel):
     query: str
     top_k: int = 5
+    # Corpus to search, by name or slug (default: the default corpus)
+    library: Optional[str] = None
 
 class DocSnippet(BaseModel):
     id: str
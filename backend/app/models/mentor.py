@@ -1,13 +1,28 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.models.docs import DocSnippet
 
 class MentorHelpRequest(BaseModel):
     code: str
     error: Optional[str] = None
     question: Optional[str] = None
+    # Run the code to capture a fresh traceback (default: BONDO_MENTOR_AUTO_RUN, for requests with no error)
+    run_code: Optional[bool] = None
+
+class MentorMeta(BaseModel):
+    # Milliseconds per stage: cache, retrieval, execution, prompt, llm, total
+    timings_ms: Dict[str, float]
+    # Served from the response cache
+    cached: bool = False
+    # Whether the code was run for this request, and how that run ended
+    executed: bool = False
+    termination_reason: Optional[str] = None
+    # Prompt size in tokens (system, user, total) and snippets included
+    prompt_tokens: Optional[Dict[str, int]] = None
 
 class MentorHelpResponse(BaseModel):
     explanation: str
     suggested_fix: Optional[str] = None
     doc_references: List[DocSnippet]
+    # Set by the async pipeline
+    meta: Optional[MentorMeta] = None
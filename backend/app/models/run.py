@@ -8,4 +8,25 @@ class RunRequest(BaseModel):
 class RunResult(BaseModel):
     stdout: str
     stderr: str
-    # later: structured_error, execution_time, etc.
\ No newline at end of file
+    # Time spent waiting for a free execution slot before the code started
+    queue_wait_seconds: float = 0.0
+    # Resource accounting (None when the execution path can't measure it)
+    exit_code: int | None = None
+    wall_time_seconds: float | None = None
+    cpu_user_seconds: float | None = None
+    cpu_system_seconds: float | None = None
+    peak_rss_mb: float | None = None
+    # completed | error | timeout | cpu_limit | memory_limit | output_limit | signal
+    termination_reason: str | None = None
+    # True when served from the run cache instead of executing the code
+    cached: bool = False
+    # later: structured_error, etc.
+
+class RunStreamEnd(BaseModel):
+    # Final frame of /run/stream
+    exit_code: int | None = None
+    duration_seconds: float
+    truncated: bool = False
+    timed_out: bool = False
+    termination_reason: str | None = None
+    queue_wait_seconds: float = 0.0
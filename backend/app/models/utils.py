@@ -1,4 +1,14 @@
+from typing import Dict, Optional
 from pydantic import BaseModel
 
 class HealthResponse(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+class ComponentStatus(BaseModel):
+    state: str  # pending, loading, ready or error
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+class ReadyResponse(BaseModel):
+    status: str  # ready, loading or error
+    components: Dict[str, ComponentStatus]
@@ -1,3 +1,7 @@
+# Bump when the user message built in services/mentor.py changes shape;
+# cached mentor responses from older prompts are dropped.
+MENTOR_PROMPT_VERSION = 2
+
 MENTOR_SYSTEM_PROMPT = """
 You are bondo, an AI coding mentor specialized in the library: {library_name}. 
 You know its APIs, best practices, and common pitfalls.
@@ -1,5 +1,6 @@
 import re
-from typing import List, Set
+import ast
+from typing import Dict, Iterator, List, Optional, Set
 
 API_TOKEN_REGEXES = [
     r"from\s+([\w\.]+)\s+import\s+([\w\*, ]+)",
@@ -8,6 +9,10 @@ API_TOKEN_REGEXES = [
     r"\b([\w\.]+)\b",
 ]
 
+# Estimator methods that return the estimator itself
+RETURNS_SELF = {"fit", "partial_fit", "set_params", "set_output"}
+
+
 def extract_api_tokens(code: str) -> List[str]:
     """
     Extract potential API identifiers from user code.
@@ -41,3 +46,125 @@ def _split_tokens(text: str) -> List[str]:
     cleaned = re.split(r"[\s,\.\(\)\[\]]+", text)
     return [c.strip() for c in cleaned if c.strip()]
 
+
+
+def extract_api_symbols(code: str) -> List[str]:
+    """
+    Fully qualified names of the imported APIs the code actually uses, in
+    order of first use, e.g. "sklearn.linear_model.LinearRegression" and
+    "sklearn.linear_model.LinearRegression.fit" for
+
+        from sklearn.linear_model import LinearRegression
+        model = LinearRegression()
+        model.fit(X, y)
+
+    Import aliases and simple assignments from a call are followed. Code that
+    doesn't parse (a half-written snippet) falls back to its import lines.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        tree = _parse_import_lines(code)
+
+    # local name -> fully qualified name
+    names: Dict[str, str] = {}
+    used: Dict[str, None] = {}
+    # local names bound to the result of a call (estimator instances)
+    instances: Set[str] = set()
+
+    def qualify(node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Name):
+            return names.get(node.id)
+        if isinstance(node, ast.Attribute):
+            base = qualify(node.value)
+            return f"{base}.{node.attr}" if base else None
+        if isinstance(node, ast.Call):
+            # LinearRegression().fit -> instance of LinearRegression
+            return qualify(node.func)
+        return None
+
+    for node in _walk_in_order(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    names[alias.asname] = alias.name
+                else:
+                    root = alias.name.split(".")[0]
+                    names[root] = root
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                if alias.name != "*":
+                    full = f"{node.module}.{alias.name}"
+                    names[alias.asname or alias.name] = full
+                    used[full] = None
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            func = node.value.func
+            if isinstance(func, ast.Attribute) and _is_instance(func.value, instances):
+                # model = model.fit(X) keeps the estimator; other methods return data
+                target = qualify(func.value) if func.attr in RETURNS_SELF else None
+            else:
+                target = qualify(func)
+            for t in node.targets:
+                if isinstance(t, ast.Name):
+                    if target:
+                        names[t.id] = target
+                        instances.add(t.id)
+                    else:
+                        names.pop(t.id, None)
+                        instances.discard(t.id)
+        elif isinstance(node, (ast.Call, ast.Attribute)):
+            full = qualify(node.func if isinstance(node, ast.Call) else node)
+            if full and "." in full:
+                used[full] = None
+
+    return list(used)
+
+
+def imported_modules(code: str) -> List[str]:
+    """
+    Top-level packages the code imports ("sklearn" for
+    `from sklearn.svm import SVC`), in order of first import.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        tree = _parse_import_lines(code)
+
+    found: Dict[str, None] = {}
+    for node in _walk_in_order(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                found[alias.name.split(".")[0]] = None
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            found[node.module.split(".")[0]] = None
+    return list(found)
+
+
+def _is_instance(node: ast.AST, instances: Set[str]) -> bool:
+    return isinstance(node, ast.Call) or (isinstance(node, ast.Name) and node.id in instances)
+
+
+def _parse_import_lines(code: str) -> ast.Module:
+    statements = []
+    for line in code.splitlines():
+        line = line.strip()
+        if line.startswith(("import ", "from ")):
+            try:
+                statements.extend(ast.parse(line).body)
+            except SyntaxError:
+                continue
+    return ast.Module(body=statements, type_ignores=[])
+
+
+def _walk_in_order(tree: ast.AST) -> Iterator[ast.AST]:
+    """
+    Depth-first, in source order, with an assignment's value before the
+    assignment itself (so `m = m.fit(X)` sees the old `m`).
+    """
+    for child in ast.iter_child_nodes(tree):
+        if isinstance(child, ast.Assign):
+            yield from _walk_in_order(child.value)
+            yield child
+        else:
+            yield child
+            yield from _walk_in_order(child)
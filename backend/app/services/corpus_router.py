@@ -0,0 +1,47 @@
+import os
+from typing import Dict, List, Optional, Tuple
+from app.ingestion.corpora import Corpus, default_corpus, enabled_corpora, get_corpus
+from app.services.api_extraction import extract_api_symbols, imported_modules
+
+# Code that imports several libraries is searched in each of their corpora:
+# the one it uses most with full weight, the others with this weight
+SECONDARY_CORPUS_WEIGHT = float(os.getenv("BONDO_SECONDARY_CORPUS_WEIGHT", "0.5"))
+
+
+def route_corpora(code: Optional[str], library: Optional[str] = None) -> List[Tuple[Corpus, float]]:
+    """
+    (corpus, weight) pairs to search for a query about `code`: the enabled
+    corpora of the libraries it imports, most used first (API names used,
+    then import order). `library` picks one corpus by name instead (none if
+    unknown). Code that imports none of them goes to the default corpus.
+    """
+    if library:
+        corpus = get_corpus(library)
+        return [(corpus, 1.0)] if corpus is not None else []
+
+    modules = imported_modules(code) if code else []
+    if not modules:
+        return [(default_corpus(), 1.0)]
+
+    uses: Dict[str, int] = {}
+    for symbol in extract_api_symbols(code):
+        root = symbol.split(".", 1)[0]
+        uses[root] = uses.get(root, 0) + 1
+
+    found = []
+    for corpus in enabled_corpora():
+        positions = [modules.index(m) for m in corpus.modules if m in modules]
+        if positions:
+            found.append((-sum(uses.get(m, 0) for m in corpus.modules), min(positions), corpus))
+    if not found:
+        return [(default_corpus(), 1.0)]
+
+    found.sort(key=lambda f: f[:2])
+    return [(corpus, 1.0 if i == 0 else SECONDARY_CORPUS_WEIGHT) for i, (_, _, corpus) in enumerate(found)]
+
+
+def detect_library(code: Optional[str]) -> str:
+    """
+    Name of the library a request's code is mostly about, for the prompt.
+    """
+    return route_corpora(code)[0][0].name
@@ -0,0 +1,83 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+
+EncodeFn = Callable[[List[str]], np.ndarray]
+
+
+class EncodeBatcher:
+    """
+    Micro-batcher for embedding queries.
+
+    Callers on any thread hand in texts and block for their vectors. One
+    background thread takes the first waiting request, gathers whatever else
+    arrives within `max_wait_ms` (up to `max_batch` texts), runs a single
+    encode over all of them and hands each caller back its own rows.
+    """
+
+    def __init__(self, encode: EncodeFn, max_batch: int = 32, max_wait_ms: float = 2.0) -> None:
+        self.encode_fn = encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._requests: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Vectors for `texts` (one row each), encoded together with any
+        concurrent requests.
+        """
+        if not texts:
+            raise ValueError("nothing to encode")
+        self._ensure_started()
+        future: Future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="encode-batcher", daemon=True)
+                self._thread.start()
+
+    def _gather(self) -> List[Tuple[List[str], Future]]:
+        batch = [self._requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._gather()
+            texts = [t for texts, _ in batch for t in texts]
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+                if vectors.ndim == 1:
+                    vectors = vectors.reshape(1, -1)
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
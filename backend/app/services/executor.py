@@ -1,12 +1,51 @@
 import os
 import sys
+import math
+import time
+import asyncio
 import tempfile
 import subprocess
-from typing import Tuple
+from typing import Dict, Tuple
+from app.models.run import RunResult
+from app.services.executor_pool import get_pool, POOL_SIZE
+from app.services.run_cache import get_run_cache
+from app.services.sandbox import (
+    apply_resource_limits,
+    cpu_limit_seconds,
+    exit_code_from_status,
+    kill_group,
+    sandbox_command,
+    sandbox_subprocess_kwargs,
+    termination_reason,
+    usage_from_rusage,
+    wait_for_exit,
+)
 
 DEFAULT_TIMEOUT_SECONDS = 5
 MAX_OUTPUT_CHARS = 8000
 
+# Capacity of the async /run path: how many scripts may execute at once, how
+# many more may wait for a slot, and for how long, before we push back.
+MAX_CONCURRENT_RUNS = int(os.getenv("BONDO_MAX_CONCURRENT_RUNS", "0")) or POOL_SIZE or (os.cpu_count() or 1)
+MAX_QUEUED_RUNS = int(os.getenv("BONDO_MAX_QUEUED_RUNS", "32"))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("BONDO_MAX_QUEUE_WAIT_SECONDS", "10"))
+
+_run_slots = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+_queued_runs = 0
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when the async path can't take another run right now.
+    Carries the HTTP status and Retry-After value the API should return.
+    """
+
+    def __init__(self, status_code: int, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
 def run_user_code(code: str, timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS) -> Tuple[str, str]:
     """
     Run user-provided Python code in a temporary directory using a subprocess.
@@ -14,48 +53,300 @@ def run_user_code(code: str, timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS) ->
     This is a minimal, "safe-ish" sandbox:
       - Executes in an isolated temp directory
       - Enforces a wall-clock timeout
+      - Applies rlimits (CPU, memory, open files, processes) and caps BLAS/OpenMP threads
       - Captures stdout/stderr
       - Truncates very long outputs
 
+    When the warm executor pool is enabled the code runs in a child forked
+    from a worker that has already imported numpy/scikit-learn; otherwise
+    a fresh interpreter is started for every call.
+
     NOTE: This is NOT secure enough for arbitrary untrusted users on the open internet.
     """
-    
-    safe_stdout = ""
-    safe_stderr = ""
-    
-    # Create a temp dir so the user can't touch project files
+    result = run_user_code_detailed(code, timeout_seconds)
+    return result.stdout, result.stderr
+
+
+def run_user_code_detailed(code: str, timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS) -> RunResult:
+    """
+    Same as run_user_code, but returns the full RunResult including resource usage.
+    """
+    cache = get_run_cache()
+    cache_key = cache.key(code, timeout_seconds) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    pool = get_pool()
+    if pool is None:
+        outcome = _run_in_subprocess(code, timeout_seconds)
+    else:
+        try:
+            outcome = pool.run(code, timeout_seconds, MAX_OUTPUT_CHARS)
+        except Exception as e:
+            outcome = _internal_error(e)
+
+    result = _to_run_result(outcome, timeout_seconds)
+    if cache:
+        cache.put(cache_key, code, result)
+    return result
+
+
+async def run_user_code_async(code: str, timeout_seconds: int = DEFAULT_TIMEOUT_SECONDS) -> RunResult:
+    """
+    Async variant of run_user_code for the /run endpoint.
+
+    At most MAX_CONCURRENT_RUNS scripts execute at once; further requests wait
+    in a bounded queue (see acquire_run_slot). Cache hits skip the queue.
+    """
+    cache = get_run_cache()
+    cache_key = cache.key(code, timeout_seconds) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    queue_wait = await acquire_run_slot()
+    try:
+        outcome = await _run_async(code, timeout_seconds)
+    finally:
+        release_run_slot()
+
+    result = _to_run_result(outcome, timeout_seconds)
+    if cache:
+        cache.put(cache_key, code, result)
+    result.queue_wait_seconds = round(queue_wait, 4)
+    return result
+
+
+async def acquire_run_slot() -> float:
+    """
+    Wait for one of the MAX_CONCURRENT_RUNS execution slots and return how
+    long we waited. Raises ExecutorBusy when the queue is full (429) or no
+    slot freed up within MAX_QUEUE_WAIT_SECONDS (503).
+    Every successful call must be paired with release_run_slot().
+    """
+    global _queued_runs
+
+    queued_at = time.monotonic()
+    if not _run_slots.locked():
+        # Free slot: acquire() returns without suspending.
+        await _run_slots.acquire()
+        return time.monotonic() - queued_at
+
+    if _queued_runs >= MAX_QUEUED_RUNS:
+        raise ExecutorBusy(429, "Too many code runs queued, try again shortly.", _retry_after())
+
+    _queued_runs += 1
+    try:
+        await asyncio.wait_for(_run_slots.acquire(), MAX_QUEUE_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise ExecutorBusy(503, "Code runner is busy, try again shortly.", _retry_after())
+    finally:
+        _queued_runs -= 1
+    return time.monotonic() - queued_at
+
+
+def release_run_slot() -> None:
+    _run_slots.release()
+
+
+def _retry_after() -> int:
+    """
+    Rough number of seconds until a slot frees up, assuming queued runs use
+    the full default timeout.
+    """
+    waves = (_queued_runs + 1) / MAX_CONCURRENT_RUNS
+    return max(1, math.ceil(waves * DEFAULT_TIMEOUT_SECONDS))
+
+
+async def _run_async(code: str, timeout_seconds: int) -> Dict:
+    pool = get_pool()
+    if pool is None:
+        return await _run_in_subprocess_async(code, timeout_seconds)
+
+    try:
+        return await pool.run_async(code, timeout_seconds, MAX_OUTPUT_CHARS)
+    except Exception as e:
+        return _internal_error(e)
+
+
+async def _run_in_subprocess_async(code: str, timeout_seconds: int) -> Dict:
+    """
+    Cold path for the async variant, built on asyncio subprocesses.
+
+    asyncio reaps the child itself, so CPU time and peak RSS aren't
+    available on this path; wall time and the termination reason are.
+    """
     with tempfile.TemporaryDirectory() as tmpdir:
         script_path = os.path.join(tmpdir, "main.py")
-        
-        # Write user's code to the file
+
         with open(script_path, "w", encoding="utf-8") as f:
             f.write(code)
-            
+
+        started = time.monotonic()
         try:
-            # Run the script
-            proc = subprocess.run(
-                [sys.executable, script_path],
+            proc = await asyncio.create_subprocess_exec(
+                *sandbox_command([sys.executable, script_path], timeout_seconds),
                 cwd=tmpdir,
-                capture_output=True,
-                text=True,
-                timeout=timeout_seconds
-            )
-            
-            safe_stdout = _truncate_output(proc.stdout)
-            safe_stderr = _truncate_output(proc.stderr)
-        
-        except subprocess.TimeoutExpired:
-            safe_stdout = ""
-            safe_stderr = (
-               f"Execution timed out after {timeout_seconds} seconds. "
-                "Try simplifying your code or using smaller data." 
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **sandbox_subprocess_kwargs(timeout_seconds),
             )
-            
         except Exception as e:
-            safe_stdout = ""
-            safe_stderr = f"Internal execution error: {e!r}"
-    
-    return safe_stdout, safe_stderr
+            return _internal_error(e)
+
+        timed_out = False
+        out, err = b"", b""
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout_seconds)
+        except asyncio.TimeoutError:
+            timed_out = True
+            # Session leader, so this also takes anything it spawned
+            kill_group(proc.pid)
+            await proc.wait()
+        except asyncio.CancelledError:
+            kill_group(proc.pid)
+            # Reap it before the temp dir goes, even if cancelled again
+            await asyncio.shield(proc.wait())
+            raise
+
+    return _outcome(
+        stdout=out.decode("utf-8", errors="replace"),
+        stderr=err.decode("utf-8", errors="replace"),
+        exit_code=proc.returncode,
+        timed_out=timed_out,
+        wall_time=time.monotonic() - started,
+        rusage=None,
+        timeout_seconds=timeout_seconds,
+    )
+
+
+def _run_in_subprocess(code: str, timeout_seconds: int) -> Dict:
+    """
+    Cold path: run the code in a brand new interpreter.
+    """
+    # Create a temp dir so the user can't touch project files
+    with tempfile.TemporaryDirectory() as tmpdir:
+        script_path = os.path.join(tmpdir, "main.py")
+        stdout_path = os.path.join(tmpdir, ".stdout")
+        stderr_path = os.path.join(tmpdir, ".stderr")
+
+        # Write user's code to the file
+        with open(script_path, "w", encoding="utf-8") as f:
+            f.write(code)
+
+        started = time.monotonic()
+        try:
+            # Output goes to files rather than pipes so we can reap the child
+            # ourselves with wait4() and get its resource usage.
+            with open(stdout_path, "wb") as out_f, open(stderr_path, "wb") as err_f:
+                proc = subprocess.Popen(
+                    sandbox_command([sys.executable, script_path], timeout_seconds),
+                    cwd=tmpdir,
+                    stdin=subprocess.DEVNULL,
+                    stdout=out_f,
+                    stderr=err_f,
+                    **sandbox_subprocess_kwargs(timeout_seconds),
+                )
+
+            rusage = None
+            if hasattr(os, "wait4"):
+                timed_out, status, rusage = wait_for_exit(proc.pid, timeout_seconds)
+                proc.returncode = exit_code_from_status(status)
+            else:
+                try:
+                    proc.wait(timeout=timeout_seconds)
+                    timed_out = False
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    proc.kill()
+                    proc.wait()
+            wall_time = time.monotonic() - started
+
+            with open(stdout_path, "r", encoding="utf-8", errors="replace") as f:
+                stdout = f.read(MAX_OUTPUT_CHARS + 1)
+            with open(stderr_path, "r", encoding="utf-8", errors="replace") as f:
+                stderr = f.read(MAX_OUTPUT_CHARS + 1)
+
+        except Exception as e:
+            return _internal_error(e)
+
+    return _outcome(
+        stdout=stdout,
+        stderr=stderr,
+        exit_code=proc.returncode,
+        timed_out=timed_out,
+        wall_time=wall_time,
+        rusage=rusage,
+        timeout_seconds=timeout_seconds,
+    )
+
+
+def _outcome(
+    stdout: str,
+    stderr: str,
+    exit_code: int | None,
+    timed_out: bool,
+    wall_time: float,
+    rusage,
+    timeout_seconds: int,
+) -> Dict:
+    """
+    Raw result of one execution, in the same shape the executor pool returns.
+    """
+    usage = usage_from_rusage(rusage)
+    cpu_used = None
+    if usage["cpu_user_seconds"] is not None:
+        cpu_used = usage["cpu_user_seconds"] + usage["cpu_system_seconds"]
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "timed_out": timed_out,
+        "exit_code": exit_code,
+        "wall_time_seconds": round(wall_time, 4),
+        **usage,
+        "termination_reason": termination_reason(
+            exit_code, timed_out, stderr, cpu_used, cpu_limit_seconds(timeout_seconds)
+        ),
+    }
+
+
+def _internal_error(e: Exception) -> Dict:
+    return {
+        "stdout": "",
+        "stderr": f"Internal execution error: {e!r}",
+        "timed_out": False,
+    }
+
+
+def _to_run_result(outcome: Dict, timeout_seconds: int) -> RunResult:
+    if outcome["timed_out"]:
+        stdout = ""
+        stderr = _timeout_message(timeout_seconds)
+    else:
+        stdout = _truncate_output(outcome["stdout"])
+        stderr = _truncate_output(outcome["stderr"])
+
+    return RunResult(
+        stdout=stdout,
+        stderr=stderr,
+        exit_code=outcome.get("exit_code"),
+        wall_time_seconds=outcome.get("wall_time_seconds"),
+        cpu_user_seconds=outcome.get("cpu_user_seconds"),
+        cpu_system_seconds=outcome.get("cpu_system_seconds"),
+        peak_rss_mb=outcome.get("peak_rss_mb"),
+        termination_reason=outcome.get("termination_reason"),
+    )
+
+
+def _timeout_message(timeout_seconds: int) -> str:
+    return (
+        f"Execution timed out after {timeout_seconds} seconds. "
+        "Try simplifying your code or using smaller data."
+    )
 
 def _truncate_output(s: str) -> str:
     if not s:
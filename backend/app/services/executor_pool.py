@@ -0,0 +1,548 @@
+import os
+import sys
+import time
+import queue
+import types
+import asyncio
+import signal
+import atexit
+import builtins
+import tempfile
+import threading
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from typing import IO, Dict, List, Optional
+from app.services.sandbox import (
+    apply_resource_limits,
+    cpu_limit_seconds,
+    exit_code_from_status,
+    kill_group,
+    termination_reason,
+    thread_limit_env,
+    usage_from_rusage,
+    wait_for_exit,
+)
+
+# Number of warm interpreters kept around. 0 disables the pool and /run falls
+# back to a cold subprocess per request.
+POOL_SIZE = int(os.getenv("BONDO_EXECUTOR_POOL_SIZE", "2"))
+
+# Recycle a worker after this many jobs, or once its RSS has grown by more
+# than this many MB since it finished preloading.
+MAX_JOBS_PER_WORKER = int(os.getenv("BONDO_EXECUTOR_MAX_JOBS", "200"))
+MAX_RSS_GROWTH_MB = int(os.getenv("BONDO_EXECUTOR_MAX_RSS_GROWTH_MB", "256"))
+
+# How long a fresh worker may take to import its modules, and how much slack
+# we give a busy worker beyond the job's own timeout before declaring it hung.
+WORKER_STARTUP_TIMEOUT_SECONDS = 120
+WORKER_REPLY_GRACE_SECONDS = 5
+
+# Imported once per worker, then shared copy-on-write by every forked job.
+PRELOAD_MODULES = [
+    "numpy",
+    "scipy",
+    "sklearn",
+    "sklearn.base",
+    "sklearn.datasets",
+    "sklearn.linear_model",
+    "sklearn.model_selection",
+    "sklearn.preprocessing",
+    "sklearn.metrics",
+    "sklearn.ensemble",
+    "sklearn.tree",
+    "sklearn.pipeline",
+]
+
+
+def pool_supported() -> bool:
+    """
+    The pool relies on os.fork() inside each worker, so it is POSIX only.
+    """
+    return hasattr(os, "fork") and sys.platform != "win32"
+
+
+# ---------------------------------------------------------------------------
+# Worker side (runs inside the long-lived interpreter)
+# ---------------------------------------------------------------------------
+
+def _current_rss_kb() -> int:
+    """
+    Current resident set size of this process in KB (0 if unknown).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS; only used as a fallback.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception:
+        return 0
+
+
+def _preload() -> None:
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except Exception:
+            # Missing optional libs are fine, the user's import will just fail
+            # the same way it would in a cold interpreter.
+            pass
+
+
+# Pid of the job currently running in this worker, so a terminated worker
+# doesn't leave it behind as an orphan.
+_active_job_pid = 0
+
+
+def _on_terminate(signum, frame) -> None:
+    if _active_job_pid:
+        kill_group(_active_job_pid)
+    os._exit(0)
+
+
+def _worker_main(conn: Connection) -> None:
+    """
+    Entry point of a pool worker: preload heavy modules, then serve jobs
+    sent over `conn` until told to stop or the pipe closes.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _on_terminate)
+    # BLAS/OpenMP read their thread counts at import time, so cap them first.
+    os.environ.update(thread_limit_env())
+    _preload()
+    conn.send({"ready": True, "rss_kb": _current_rss_kb()})
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        result = _run_job(conn, job)
+        result["rss_kb"] = _current_rss_kb()
+        try:
+            conn.send(result)
+        except (BrokenPipeError, OSError):
+            break
+
+
+def _run_job(conn: Connection, job: Dict) -> Dict:
+    """
+    Fork a child to execute one job in a throwaway temp dir and collect its output.
+    """
+    global _active_job_pid
+    # Output goes to anonymous files outside the user's working dir, so the
+    # code being run can't find them by name and rewrite its own output
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace") as stdout_file, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", errors="replace") as stderr_file:
+        script_path = os.path.join(tmpdir, "main.py")
+
+        with open(script_path, "w", encoding="utf-8") as f:
+            f.write(job["code"])
+
+        # Don't let buffered worker output get duplicated into the child.
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        timeout_seconds = job["timeout_seconds"]
+        started = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            _child_exec(conn, script_path, tmpdir, stdout_file.fileno(), stderr_file.fileno(), timeout_seconds)
+
+        _active_job_pid = pid
+        try:
+            timed_out, status, rusage = wait_for_exit(pid, timeout_seconds)
+        finally:
+            _active_job_pid = 0
+        wall_time = time.monotonic() - started
+
+        max_chars = job["max_chars"]
+        stdout = _read_capped(stdout_file, max_chars)
+        stderr = _read_capped(stderr_file, max_chars)
+
+    exit_code = exit_code_from_status(status)
+    usage = usage_from_rusage(rusage)
+    cpu_used = (usage["cpu_user_seconds"] or 0) + (usage["cpu_system_seconds"] or 0)
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "timed_out": timed_out,
+        "exit_code": exit_code,
+        "wall_time_seconds": round(wall_time, 4),
+        **usage,
+        "termination_reason": termination_reason(
+            exit_code, timed_out, stderr, cpu_used, cpu_limit_seconds(timeout_seconds)
+        ),
+    }
+
+
+def _child_exec(
+    conn: Connection,
+    script_path: str,
+    tmpdir: str,
+    stdout_fd: int,
+    stderr_fd: int,
+    timeout_seconds: float,
+) -> None:
+    """
+    Runs in the forked child. Never returns.
+    """
+    status = 1
+    try:
+        # Own process group, so a timeout kill also takes any grandchildren.
+        os.setsid()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        conn.close()
+        os.chdir(tmpdir)
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        for fd in (stdout_fd, stderr_fd):
+            if fd > 2:
+                os.close(fd)
+        apply_resource_limits(timeout_seconds)
+
+        # Look like `python main.py` to the user's code.
+        sys.argv = [script_path]
+        sys.path[0] = tmpdir
+        main_module = types.ModuleType("__main__")
+        main_module.__file__ = script_path
+        main_module.__builtins__ = builtins
+        sys.modules["__main__"] = main_module
+
+        with open(script_path, "r", encoding="utf-8") as f:
+            source = f.read()
+
+        status = _exec_user_code(source, script_path, main_module.__dict__)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)
+
+
+def _exec_user_code(source: str, script_path: str, namespace: Dict) -> int:
+    try:
+        exec(compile(source, script_path, "exec"), namespace)
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        _print_user_traceback(e, script_path)
+        return 1
+
+
+def _print_user_traceback(e: BaseException, script_path: str) -> None:
+    """
+    Print `e` like a normal `python main.py` run would: starting at the
+    first frame in the user's file, without the worker frames that ran it.
+    A SyntaxError has no such frame and prints without a traceback.
+    """
+    tb = e.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != script_path:
+        tb = tb.tb_next
+    traceback.print_exception(type(e), e, tb)
+
+
+def _read_capped(f: IO[str], max_chars: int) -> str:
+    """
+    Read at most max_chars + 1 characters from the start of `f`, enough for
+    the caller to tell whether the output needs truncating without loading
+    all of it.
+    """
+    f.seek(0)
+    return f.read(max_chars + 1)
+
+
+# ---------------------------------------------------------------------------
+# Parent side (runs inside the API process)
+# ---------------------------------------------------------------------------
+
+class WorkerError(RuntimeError):
+    """
+    A pool worker died or stopped answering.
+    """
+
+
+class _Worker:
+    def __init__(self, ctx) -> None:
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn,),
+            name="bondo-executor",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.jobs = 0
+        self.ready = False
+        self.baseline_rss_kb = 0
+        self.rss_kb = 0
+
+    def _recv(self, timeout: float) -> Dict:
+        if not self.conn.poll(timeout):
+            raise WorkerError(f"executor worker {self.process.pid} did not respond in {timeout:.0f}s")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerError(f"executor worker {self.process.pid} died: {e!r}") from e
+
+    def wait_ready(self) -> None:
+        if self.ready:
+            return
+        msg = self._recv(WORKER_STARTUP_TIMEOUT_SECONDS)
+        self.ready = True
+        self.baseline_rss_kb = self.rss_kb = msg.get("rss_kb", 0)
+
+    async def _wait_readable(self, timeout: float) -> None:
+        """
+        Wait for the worker's pipe to become readable without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.conn.fileno()
+
+        def on_readable() -> None:
+            if not readable.done():
+                readable.set_result(None)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            raise WorkerError(f"executor worker {self.process.pid} did not respond in {timeout:.0f}s")
+        finally:
+            loop.remove_reader(fd)
+
+    def _send_job(self, code: str, timeout_seconds: float, max_chars: int) -> None:
+        try:
+            self.conn.send({
+                "code": code,
+                "timeout_seconds": timeout_seconds,
+                "max_chars": max_chars,
+            })
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerError(f"executor worker {self.process.pid} died: {e!r}") from e
+
+    def _finish_job(self, result: Dict) -> Dict:
+        self.jobs += 1
+        self.rss_kb = result.get("rss_kb", self.rss_kb)
+        return result
+
+    def run(self, code: str, timeout_seconds: float, max_chars: int) -> Dict:
+        self.wait_ready()
+        self._send_job(code, timeout_seconds, max_chars)
+        return self._finish_job(self._recv(timeout_seconds + WORKER_REPLY_GRACE_SECONDS))
+
+    async def run_async(self, code: str, timeout_seconds: float, max_chars: int) -> Dict:
+        if not self.ready:
+            await self._wait_readable(WORKER_STARTUP_TIMEOUT_SECONDS)
+            self.wait_ready()
+        self._send_job(code, timeout_seconds, max_chars)
+        await self._wait_readable(timeout_seconds + WORKER_REPLY_GRACE_SECONDS)
+        return self._finish_job(self._recv(WORKER_REPLY_GRACE_SECONDS))
+
+    def should_recycle(self) -> bool:
+        if self.jobs >= MAX_JOBS_PER_WORKER:
+            return True
+        growth_mb = (self.rss_kb - self.baseline_rss_kb) / 1024
+        return growth_mb > MAX_RSS_GROWTH_MB
+
+    def stop(self, graceful: bool = True) -> None:
+        """
+        Stop the worker. A graceful stop lets an idle worker exit on its own;
+        otherwise it is terminated and takes its running job down with it.
+        """
+        if graceful:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ExecutorPool:
+    """
+    Fixed-size pool of warm interpreters. Each job is handed to an idle worker,
+    which forks a child to run it so state never leaks between jobs.
+    """
+
+    def __init__(self, size: int) -> None:
+        if size <= 0:
+            raise ValueError("pool size must be positive")
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._closed = False
+        for _ in range(size):
+            self._spawn()
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def _spawn(self) -> None:
+        worker = _Worker(self._ctx)
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker: _Worker, graceful: bool = True) -> None:
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop(graceful=graceful)
+
+    def _replace(self, worker: _Worker, graceful: bool = True) -> None:
+        self._retire(worker, graceful=graceful)
+        self._spawn()
+
+    def _check_in(self, worker: _Worker) -> None:
+        if worker.should_recycle():
+            print(
+                f"[executor] recycling worker {worker.process.pid} "
+                f"after {worker.jobs} jobs ({worker.rss_kb // 1024} MB RSS)"
+            )
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+    def _wait_idle(self) -> _Worker:
+        """
+        Block until a worker is idle, giving up once the pool is shut down.
+        """
+        while not self._closed:
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        raise WorkerError("executor pool is shut down")
+
+    def _give_back(self, waiter: "asyncio.Future[_Worker]") -> None:
+        # A cancelled caller's thread still takes a worker once one is idle
+        if not waiter.cancelled() and waiter.exception() is None:
+            self._idle.put(waiter.result())
+
+    def run(self, code: str, timeout_seconds: float, max_chars: int) -> Dict:
+        """
+        Run `code` on the next idle worker. Blocks while all workers are busy.
+        Returns a dict with stdout, stderr, timed_out and the resource usage
+        fields of RunResult.
+        """
+        if self._closed:
+            raise WorkerError("executor pool is shut down")
+
+        worker = self._wait_idle()
+        try:
+            result = worker.run(code, timeout_seconds, max_chars)
+        except WorkerError:
+            print(f"[executor] replacing broken worker {worker.process.pid}")
+            self._replace(worker, graceful=False)
+            raise
+
+        self._check_in(worker)
+        return result
+
+    async def run_async(self, code: str, timeout_seconds: float, max_chars: int) -> Dict:
+        """
+        Same as run(), but waits for the worker's reply on the event loop
+        instead of tying up a thread for the duration of the job.
+        """
+        if self._closed:
+            raise WorkerError("executor pool is shut down")
+
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            # Only happens when callers allow more concurrent runs than workers.
+            waiter = asyncio.ensure_future(asyncio.to_thread(self._wait_idle))
+            try:
+                worker = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                waiter.add_done_callback(self._give_back)
+                raise
+
+        # Stopping and spawning workers joins processes, so it happens off the loop
+        try:
+            result = await worker.run_async(code, timeout_seconds, max_chars)
+        except WorkerError:
+            print(f"[executor] replacing broken worker {worker.process.pid}")
+            await asyncio.to_thread(self._replace, worker, graceful=False)
+            raise
+        except asyncio.CancelledError:
+            # The job is still running and its reply would be read by the next
+            # caller, so this worker can't be reused.
+            await asyncio.to_thread(self._replace, worker, graceful=False)
+            raise
+
+        if worker.should_recycle():
+            await asyncio.to_thread(self._check_in, worker)
+        else:
+            self._idle.put(worker)
+        return result
+
+    def shutdown(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool: Optional[ExecutorPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[ExecutorPool]:
+    """
+    Return the shared pool, creating it on first use.
+    Returns None when the pool is disabled or unsupported on this platform.
+    """
+    global _pool
+    if POOL_SIZE <= 0 or not pool_supported():
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ExecutorPool(POOL_SIZE)
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import codecs
+import signal
+import asyncio
+import tempfile
+from typing import AsyncIterator, Tuple, Union
+from app.models.run import RunStreamEnd
+from app.services.executor import MAX_OUTPUT_CHARS, _timeout_message
+from app.services.sandbox import (
+    REASON_OUTPUT_LIMIT,
+    sandbox_command,
+    sandbox_subprocess_kwargs,
+    termination_reason,
+)
+
+# Total bytes of stdout + stderr we forward before killing the process.
+MAX_STREAM_OUTPUT_BYTES = MAX_OUTPUT_CHARS
+
+# Read size per pipe, and how many unread chunks may pile up before the
+# child's pipe is left to fill up (which blocks it until the client catches up).
+STREAM_CHUNK_BYTES = 4096
+STREAM_QUEUE_CHUNKS = 16
+
+StreamEvent = Tuple[str, Union[str, RunStreamEnd]]
+
+
+async def stream_user_code(
+    code: str,
+    timeout_seconds: int,
+    queue_wait_seconds: float = 0.0,
+) -> AsyncIterator[StreamEvent]:
+    """
+    Run user code and yield its output as it is produced.
+
+    Yields ("stdout", text) and ("stderr", text) events, then exactly one
+    ("end", RunStreamEnd) event. The output cap is enforced while streaming:
+    once MAX_STREAM_OUTPUT_BYTES have been forwarded the process is killed.
+
+    Always uses a fresh interpreter (unbuffered), since the warm pool only
+    hands back output once a job has finished.
+    """
+    started = time.monotonic()
+    deadline = started + timeout_seconds
+    truncated = False
+    timed_out = False
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        script_path = os.path.join(tmpdir, "main.py")
+        with open(script_path, "w", encoding="utf-8") as f:
+            f.write(code)
+
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *sandbox_command([sys.executable, "-u", script_path], timeout_seconds),
+                cwd=tmpdir,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **sandbox_subprocess_kwargs(timeout_seconds),
+            )
+        except Exception as e:
+            yield "stderr", f"Internal execution error: {e!r}"
+            yield "end", RunStreamEnd(
+                exit_code=None,
+                duration_seconds=round(time.monotonic() - started, 4),
+                queue_wait_seconds=round(queue_wait_seconds, 4),
+            )
+            return
+
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_CHUNKS)
+
+        async def pump(name: str, reader: asyncio.StreamReader) -> None:
+            while True:
+                data = await reader.read(STREAM_CHUNK_BYTES)
+                await chunks.put((name, data))
+                if not data:
+                    return
+
+        pumps = [
+            asyncio.create_task(pump("stdout", proc.stdout)),
+            asyncio.create_task(pump("stderr", proc.stderr)),
+        ]
+        decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        }
+        open_streams = 2
+        sent_bytes = 0
+
+        try:
+            while open_streams:
+                remaining = deadline - time.monotonic()
+                try:
+                    name, data = await asyncio.wait_for(chunks.get(), max(remaining, 0))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    break
+
+                if not data:
+                    open_streams -= 1
+                    tail = decoders[name].decode(b"", final=True)
+                    if tail:
+                        yield name, tail
+                    continue
+
+                room = MAX_STREAM_OUTPUT_BYTES - sent_bytes
+                if len(data) > room:
+                    data = data[:room]
+                    truncated = True
+                sent_bytes += len(data)
+
+                text = decoders[name].decode(data, final=truncated)
+                if text:
+                    yield name, text
+                if truncated:
+                    yield name, "\n...[truncated]..."
+                    break
+
+            if not (timed_out or truncated):
+                # Streams are closed, but the process may still be running.
+                try:
+                    await asyncio.wait_for(proc.wait(), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    timed_out = True
+        finally:
+            if proc.returncode is None:
+                # Session leader, so this also takes anything it spawned
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    proc.kill()
+            for task in pumps:
+                task.cancel()
+            await proc.wait()
+
+    if timed_out:
+        yield "stderr", "\n" + _timeout_message(timeout_seconds)
+
+    if truncated:
+        reason = REASON_OUTPUT_LIMIT
+    else:
+        reason = termination_reason(proc.returncode, timed_out)
+
+    yield "end", RunStreamEnd(
+        exit_code=proc.returncode,
+        duration_seconds=round(time.monotonic() - started, 4),
+        truncated=truncated,
+        timed_out=timed_out,
+        termination_reason=reason,
+        queue_wait_seconds=round(queue_wait_seconds, 4),
+    )
@@ -1,10 +1,15 @@
 import os
-from openai import OpenAI
+from typing import AsyncIterator
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
+LLM_MODEL = os.getenv("BONDO_LLM_MODEL", "gpt-4.1-mini")
+
+# Both clients also honour OPENAI_BASE_URL, e.g. for a local OpenAI-compatible server
 _client = None
+_async_client = None
 
 def get_client() -> OpenAI:
     global _client
@@ -17,7 +22,18 @@ def get_client() -> OpenAI:
     
     return _client
 
-def call_llm(messages, model="gpt-4.1-mini", response_format=None):
+def get_async_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not set in environment.")
+
+        _async_client = AsyncOpenAI(api_key=api_key)
+
+    return _async_client
+
+def call_llm(messages, model=LLM_MODEL, response_format=None):
     """
     Generic OpenAI chat completion call.
     """
@@ -29,4 +45,40 @@ def call_llm(messages, model="gpt-4.1-mini", response_format=None):
         response_format=response_format,
         temperature=0.2,
     )
-    return resp.choices[0].message.content
\ No newline at end of file
+    return resp.choices[0].message.content
+
+
+async def call_llm_async(messages, model=LLM_MODEL, response_format=None):
+    """
+    call_llm() on the async client, so waiting on OpenAI doesn't hold a thread.
+    """
+    client = get_async_client()
+
+    resp = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format=response_format,
+        temperature=0.2,
+    )
+    return resp.choices[0].message.content
+
+
+async def stream_llm(messages, model=LLM_MODEL, response_format=None) -> AsyncIterator[str]:
+    """
+    Streaming chat completion: yields pieces of the reply's content as they arrive.
+    """
+    client = get_async_client()
+
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format=response_format,
+        temperature=0.2,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
@@ -1,106 +1,106 @@
+import os
 import json
-from typing import List
+import time
+import asyncio
+from typing import Awaitable, Dict, List, NamedTuple, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
 from app.prompts.mentor_prompt import MENTOR_SYSTEM_PROMPT
-from app.services.llm_client import call_llm
+from app.services.llm_client import call_llm_async
 from app.services.rag import search_docs
+from app.services.query_planner import plan_sub_queries
+from app.services.response_cache import Fingerprint, fingerprint, cached_response, cache_response
+from app.services.executor import run_user_code_async, ExecutorBusy, DEFAULT_TIMEOUT_SECONDS
+from app.services.prompt_builder import budget_prompt_parts, count_tokens, prompt_token_stats
+from app.services.api_extraction import extract_api_symbols
 from app.models.docs import DocSnippet
-from app.models.mentor import MentorHelpResponse
+from app.models.mentor import MentorHelpResponse, MentorMeta
+from app.models.run import RunResult
+
+MENTOR_TOP_K = 5
+# Opt-in: set BONDO_MENTOR_AUTO_RUN=1 to run the code of requests that give no
+# error, to get a real traceback. Requests can also ask for it (run_code).
+MENTOR_AUTO_RUN = os.getenv("BONDO_MENTOR_AUTO_RUN", "0") == "1"
+MENTOR_RUN_TIMEOUT_SECONDS = DEFAULT_TIMEOUT_SECONDS
 
 def build_user_message(
     code: str, 
     error: str | None, 
     question: str | None, 
-    doc_snippets: List[DocSnippet]
+    docs: List[Dict]
 ) -> str:
     """
     Combine user intent, code, error, and doc snippets into a single user message for the LLM.
+    The parts are expected to be trimmed to the token budget already (budget_prompt_parts()).
     """
-    docs_json = []
-    for doc in doc_snippets:
-        docs_json.append({
-            "id": doc.id,
-            "title": doc.title,
-            "text": doc.text,
-            "url": doc.url,
-            "score": doc.score
-        })
-
-    return f"""
-    User Intent (if any):
-    {question or "(none)"}
-
-    User Code: 
-    {code}
-    
-    Error Output:
-    {error or "(none)"}
-    
-    Documentation Snippets (JSON array):
-    {json.dumps(docs_json, indent=2)}
-    
-    IMPORTANT:
-    - Use ONLY the exact values from the JSON documentation snippets.
-    - NEVER modify or extend URLs, IDs, or titles.
-    - doc_references.text MUST be a short excerpt (1–3 sentences) directly from the snippet's text
-    """.strip()
-    
-    
-def mentor_help(
-    code: str, 
+    docs_json = json.dumps(docs, ensure_ascii=False, separators=(",", ":"))
+
+    return f"""User Intent (if any):
+{question or "(none)"}
+
+User Code:
+{code}
+
+Error Output:
+{error or "(none)"}
+
+Documentation Snippets (JSON array):
+{docs_json}
+
+IMPORTANT:
+- Use ONLY the exact values from the JSON documentation snippets.
+- NEVER modify or extend URLs, IDs, or titles.
+- doc_references.text MUST be a short excerpt (1–3 sentences) directly from the snippet's text"""
+
+
+def build_messages(
+    code: str,
     error: str | None,
-    question: str | None, 
-    library_name: str
-) -> MentorHelpResponse:
+    question: str | None,
+    library_name: str,
+    doc_snippets: List[DocSnippet],
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    System + user messages for one mentor request, with the user message
+    fitted to PROMPT_TOKEN_BUDGET, and the prompt's token counts.
     """
-    High-level orchestrator:
-      - retrieve documentation
-      - build prompt
-      - call LLM
-      - parse JSON response
-    """
-    # 1. Retrieve docs via RAG
-    rag_results = search_docs(
-        query=error or code,
-        top_k=5,
-        code=code
-    )
-
-    # 2. Build system message for this library
     system_prompt = MENTOR_SYSTEM_PROMPT.format(
         library_name=library_name
     )
-
-    # 3. Build user message
+    overhead = count_tokens(build_user_message("", None, None, []))
+    parts = budget_prompt_parts(
+        code, error, question, doc_snippets,
+        api_symbols=extract_api_symbols(code),
+        overhead_tokens=overhead,
+    )
     user_content = build_user_message(
-        code=code,
-        error=error,
-        question=question,
-        doc_snippets=rag_results,
+        code=parts.code,
+        error=parts.error,
+        question=parts.question,
+        docs=parts.docs,
     )
 
-    # 4. Call OpenAI using JSON response mode
-    response_raw = call_llm(
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content},
-        ],
-        response_format={"type": "json_object"},
-    )
+    counts = {
+        "system": count_tokens(system_prompt),
+        "user": count_tokens(user_content),
+        "snippets": len(parts.docs),
+    }
+    counts["total"] = counts["system"] + counts["user"]
+    prompt_token_stats.record(counts)
+    print(f"[mentor] prompt tokens: {counts['total']} (user {counts['user']}, {counts['snippets']} snippets)")
 
-    # 5. Parse JSON
-    try:
-        data = json.loads(response_raw)
-    except Exception as e:
-        # fallback if model returned invalid JSON
-        data = {
-            "explanation": f"LLM parsing error: {e}. Raw: {response_raw}",
-            "suggested_fix": None,
-            "doc_references": [],
-        }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content},
+    ]
+    return messages, counts
 
-    # 6. Convert doc references if present
+
+def parse_doc_references(items: List) -> List[DocSnippet]:
+    """
+    DocSnippets from the model's doc_references, tolerating malformed entries.
+    """
     doc_refs = []
-    for s in data.get("doc_references", []):
+    for s in items or []:
         if isinstance(s, dict):
             doc_refs.append(
                 DocSnippet(
@@ -122,13 +122,187 @@ def mentor_help(
                     score=0.0,
                 )
             )
+    return doc_refs
 
-    return MentorHelpResponse(
+
+def parse_response(code: str, response_raw: str) -> Tuple[MentorHelpResponse, bool]:
+    """
+    MentorHelpResponse from the model's JSON reply, and whether the reply
+    was valid JSON (only those responses are cached).
+    """
+    valid = True
+    try:
+        data = json.loads(response_raw)
+    except Exception as e:
+        valid = False
+        # fallback if model returned invalid JSON
+        data = {
+            "explanation": f"LLM parsing error: {e}. Raw: {response_raw}",
+            "suggested_fix": None,
+            "doc_references": [],
+        }
+
+    response = MentorHelpResponse(
         explanation=data.get("explanation", ""),
-        suggested_fix=sanitize_suggested_fix(code, data.get("suggested_fix", "")),
-        doc_references=doc_refs,
+        suggested_fix=sanitize_suggested_fix(code, data.get("suggested_fix") or ""),
+        doc_references=parse_doc_references(data.get("doc_references", [])),
     )
-    
+    return response, valid
+
+
+def mentor_help(
+    code: str,
+    error: str | None,
+    question: str | None,
+    library_name: str,
+) -> MentorHelpResponse:
+    """
+    Blocking mentor_help_async(), for scripts. The code isn't run. Don't
+    call it from a running event loop.
+    """
+    return asyncio.run(mentor_help_async(code, error, question, library_name, run_code=False))
+
+
+class PreparedRequest(NamedTuple):
+    fp: Fingerprint
+    # Set on a response cache hit; nothing else is needed then
+    cached: Optional[MentorHelpResponse]
+    messages: List[Dict[str, str]]
+    meta: MentorMeta
+    started: float
+
+
+def _retrieve(code: str, error: str | None, question: str | None) -> List[DocSnippet]:
+    return search_docs(top_k=MENTOR_TOP_K, code=code, sub_queries=plan_sub_queries(code, error, question))
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable: Awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = _elapsed_ms(started)
+
+
+async def _run_for_traceback(code: str) -> Optional[RunResult]:
+    try:
+        return await run_user_code_async(code, MENTOR_RUN_TIMEOUT_SECONDS)
+    except ExecutorBusy as e:
+        print(f"[mentor] Skipping code run: {e}")
+        return None
+
+
+def _run_failed(run: Optional[RunResult]) -> bool:
+    return run is not None and bool(run.stderr.strip()) and (
+        run.exit_code != 0 or run.termination_reason not in (None, "completed")
+    )
+
+
+async def prepare_mentor_request(
+    code: str,
+    error: str | None,
+    question: str | None,
+    library_name: str,
+    run_code: bool | None = None,
+) -> PreparedRequest:
+    """
+    Everything before the LLM call, with independent stages overlapped:
+    retrieval (the fused sub-queries of plan_sub_queries()) runs while
+    the code runs in the executor, if asked to (`run_code`) or, with
+    MENTOR_AUTO_RUN, when no error was given. A fresh traceback from that run is
+    used as the error and retrieval is redone with it. Per-stage timings
+    go in the meta.
+    """
+    started = time.perf_counter()
+    meta = MentorMeta(timings_ms={})
+    timings = meta.timings_ms
+
+    fp = fingerprint(code, error, question, library_name)
+    cached = await _timed(timings, "cache", run_in_threadpool(cached_response, fp, code))
+    if cached is not None:
+        meta.cached = True
+        return PreparedRequest(fp, cached, [], meta, started)
+
+    should_run = run_code if run_code is not None else (MENTOR_AUTO_RUN and not error)
+    retrieval = asyncio.create_task(_timed(
+        timings, "retrieval",
+        run_in_threadpool(_retrieve, code, error, question),
+    ))
+    execution = asyncio.create_task(_timed(timings, "execution", _run_for_traceback(code))) if should_run else None
+
+    try:
+        rag_results = await retrieval
+        run = await execution if execution else None
+    except BaseException:
+        if execution:
+            execution.cancel()
+        raise
+
+    if run is not None:
+        meta.executed = True
+        meta.termination_reason = run.termination_reason
+    if _run_failed(run):
+        # The traceback is what the request is about now: look it up again
+        # and cache the answer under it
+        error = run.stderr
+        fp = fingerprint(code, error, question, library_name)
+        cached = await _timed(timings, "cache_traceback", run_in_threadpool(cached_response, fp, code))
+        if cached is not None:
+            meta.cached = True
+            return PreparedRequest(fp, cached, [], meta, started)
+        # Only the traceback's sub-queries are new; the rest hit the vector cache
+        rag_results = await _timed(timings, "retrieval_traceback", run_in_threadpool(_retrieve, code, error, question))
+
+    # Token counting and snippet compression are CPU work; keep them off the loop
+    messages, counts = await _timed(
+        timings, "prompt",
+        run_in_threadpool(build_messages, code, error, question, library_name, rag_results),
+    )
+    meta.prompt_tokens = counts
+    return PreparedRequest(fp, None, messages, meta, started)
+
+
+async def finish_mentor_request(prepared: PreparedRequest, code: str, response_raw: str) -> MentorHelpResponse:
+    """
+    Parse the model's reply, cache it and attach the request's meta.
+    """
+    response, valid = parse_response(code, response_raw)
+    if valid:
+        await run_in_threadpool(cache_response, prepared.fp, code, response)
+    return with_meta(response, prepared)
+
+
+def with_meta(response: MentorHelpResponse, prepared: PreparedRequest) -> MentorHelpResponse:
+    prepared.meta.timings_ms["total"] = _elapsed_ms(prepared.started)
+    return response.model_copy(update={"meta": prepared.meta})
+
+
+async def mentor_help_async(
+    code: str,
+    error: str | None,
+    question: str | None,
+    library_name: str,
+    run_code: bool | None = None,
+) -> MentorHelpResponse:
+    """
+    mentor_help() for async endpoints: the concurrent pipeline of
+    prepare_mentor_request(), then one call on the async LLM client.
+    """
+    prepared = await prepare_mentor_request(code, error, question, library_name, run_code)
+    if prepared.cached is not None:
+        return with_meta(prepared.cached, prepared)
+
+    response_raw = await _timed(
+        prepared.meta.timings_ms, "llm",
+        call_llm_async(messages=prepared.messages, response_format={"type": "json_object"}),
+    )
+    return await finish_mentor_request(prepared, code, response_raw)
+
+
 def sanitize_suggested_fix(original: str, fix: str) -> str:
     """
     Ensure suggested_fix is minimal and safe:
@@ -0,0 +1,225 @@
+import re
+import json
+import time
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
+from app.models.mentor import MentorHelpResponse
+from app.services.llm_client import stream_llm
+from app.services.mentor import (
+    finish_mentor_request,
+    parse_doc_references,
+    prepare_mentor_request,
+    sanitize_suggested_fix,
+    with_meta,
+)
+
+# Top-level string field whose text is forwarded as it arrives
+STREAMED_FIELD = "explanation"
+# "\\ud83d": first half of a UTF-16 surrogate pair, undecodable on its own
+_HIGH_SURROGATE_RE = re.compile(r"\\u[dD][89abAB][0-9a-fA-F]{2}")
+
+StreamEvent = Tuple[str, Union[str, list, MentorHelpResponse]]
+
+
+class JsonObjectStream:
+    """
+    Incremental parser for a streamed JSON object like
+    {"explanation": "...", "suggested_fix": "...", "doc_references": [...]}.
+
+    feed() takes the next piece of raw text and returns what it completed:
+    ("delta", text) for new characters of the `streamed` string field, and
+    ("field", (key, value)) for any top-level value once it is fully parsed.
+    Anything before the opening brace (e.g. a code fence) is skipped.
+    """
+
+    def __init__(self, streamed: str = STREAMED_FIELD) -> None:
+        self.streamed = streamed
+        self._state = "start"
+        self._key_raw: List[str] = []
+        self._key = ""
+        self._value: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # Raw characters of the streamed field not yet decoded and emitted
+        self._pending = ""
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        for ch in text:
+            self._step(ch, events)
+        if self._state == "string_value" and self._key == self.streamed and self._pending:
+            self._flush_pending(events, final=False)
+        return events
+
+    def _step(self, ch: str, events: List[Tuple[str, Any]]) -> None:
+        state = self._state
+        if state == "start":
+            if ch == "{":
+                self._state = "key_or_end"
+        elif state == "key_or_end":
+            if ch == '"':
+                self._state = "key"
+                self._key_raw = []
+                self._escaped = False
+            elif ch == "}":
+                self._state = "done"
+        elif state == "key":
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._key = json.loads('"' + "".join(self._key_raw) + '"')
+                self._state = "colon"
+                return
+            self._key_raw.append(ch)
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value_start"
+        elif state == "value_start":
+            if ch.isspace():
+                return
+            self._value = [ch]
+            self._escaped = False
+            if ch == '"':
+                self._state = "string_value"
+                self._pending = ""
+            else:
+                self._state = "value"
+                self._depth = 1 if ch in "[{" else 0
+                self._in_string = False
+        elif state == "string_value":
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._value.append(ch)
+                if self._key == self.streamed:
+                    self._flush_pending(events, final=True)
+                self._finish_value(events, "after_value")
+                return
+            self._value.append(ch)
+            if self._key == self.streamed:
+                self._pending += ch
+        elif state == "value":
+            # Arrays, objects, numbers and literals, parsed once complete
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                if self._depth == 0:
+                    # A number or literal ended by the object's closing brace
+                    self._finish_value(events, "done")
+                    return
+                self._depth -= 1
+                if self._depth == 0:
+                    self._value.append(ch)
+                    self._finish_value(events, "after_value")
+                    return
+            elif ch == "," and self._depth == 0:
+                self._finish_value(events, "key_or_end")
+                return
+            self._value.append(ch)
+        elif state == "after_value":
+            if ch == ",":
+                self._state = "key_or_end"
+            elif ch == "}":
+                self._state = "done"
+
+    def _finish_value(self, events: List[Tuple[str, Any]], next_state: str) -> None:
+        raw = "".join(self._value).strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = None
+        events.append(("field", (self._key, value)))
+        self._value = []
+        self._state = next_state
+
+    def _flush_pending(self, events: List[Tuple[str, Any]], final: bool) -> None:
+        cut = len(self._pending) if final else _safe_cut(self._pending)
+        if cut <= 0:
+            return
+        try:
+            text = json.loads('"' + self._pending[:cut] + '"')
+        except ValueError:
+            text = self._pending[:cut]
+        self._pending = self._pending[cut:]
+        if text:
+            events.append(("delta", text))
+
+
+def _safe_cut(raw: str) -> int:
+    """
+    Length of the longest prefix of a raw JSON string body that can be
+    decoded now: not ending inside an escape or between a surrogate pair.
+    """
+    i = raw.rfind("\\")
+    if i < 0:
+        return len(raw)
+    start = i
+    while start > 0 and raw[start - 1] == "\\":
+        start -= 1
+    if (i - start) % 2:
+        # raw[i] is the second half of an escaped backslash
+        return len(raw)
+    tail = raw[i:]
+    if len(tail) == 1 or (tail[1] == "u" and len(tail) < 6) or _HIGH_SURROGATE_RE.fullmatch(tail):
+        # Hold back the unfinished escape, and a high surrogate right before it
+        return i - 6 if _HIGH_SURROGATE_RE.fullmatch(raw[max(i - 6, 0):i]) else i
+    return len(raw)
+
+
+async def stream_mentor_help(
+    code: str,
+    error: Optional[str],
+    question: Optional[str],
+    library_name: str,
+    run_code: Optional[bool] = None,
+) -> AsyncIterator[StreamEvent]:
+    """
+    mentor_help() as a stream of events: ("explanation", text) pieces as the
+    model writes them, ("suggested_fix", text) and ("doc_references", list)
+    as soon as each is complete, then exactly one ("end", MentorHelpResponse)
+    built from the whole reply. A cached response is sent as one frame of
+    each kind. Everything before the LLM call is prepare_mentor_request().
+    """
+    prepared = await prepare_mentor_request(code, error, question, library_name, run_code)
+    if prepared.cached is not None:
+        cached = prepared.cached
+        yield "explanation", cached.explanation
+        yield "suggested_fix", cached.suggested_fix
+        yield "doc_references", [ref.model_dump() for ref in cached.doc_references]
+        yield "end", with_meta(cached, prepared)
+        return
+
+    timings = prepared.meta.timings_ms
+    llm_started = time.perf_counter()
+    parser = JsonObjectStream()
+    raw: List[str] = []
+    async for piece in stream_llm(messages=prepared.messages, response_format={"type": "json_object"}):
+        if not raw:
+            timings["llm_first_token"] = round((time.perf_counter() - llm_started) * 1000, 1)
+        raw.append(piece)
+        for kind, payload in parser.feed(piece):
+            if kind == "delta":
+                yield "explanation", payload
+                continue
+            key, value = payload
+            if key == "suggested_fix":
+                yield "suggested_fix", sanitize_suggested_fix(code, value or "")
+            elif key == "doc_references":
+                refs = parse_doc_references(value if isinstance(value, list) else [])
+                yield "doc_references", [ref.model_dump() for ref in refs]
+    timings["llm"] = round((time.perf_counter() - llm_started) * 1000, 1)
+
+    yield "end", await finish_mentor_request(prepared, code, "".join(raw))
@@ -0,0 +1,333 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Set
+from app.ingestion.term_index import tokenize
+from app.models.docs import DocSnippet
+from app.services import llm_client
+
+# tiktoken counts tokens exactly for OpenAI models, but it's optional; without
+# it (or without its encoding files) we estimate ~4 characters per token.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Token budget for the user message (code, error, question and doc snippets).
+# Code and error output get at most their own share; snippets share the rest.
+PROMPT_TOKEN_BUDGET = int(os.getenv("BONDO_PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_CODE_TOKENS = int(os.getenv("BONDO_PROMPT_CODE_TOKENS", "1200"))
+PROMPT_ERROR_TOKENS = int(os.getenv("BONDO_PROMPT_ERROR_TOKENS", "500"))
+PROMPT_SNIPPET_TOKENS = int(os.getenv("BONDO_PROMPT_SNIPPET_TOKENS", "250"))
+
+# Lines of code kept either side of a line the traceback points at
+CODE_CONTEXT_LINES = 8
+
+_FRAME_RE = re.compile(r'^\s*File "([^"]+)", line (\d+)')
+_LIBRARY_PATH_RE = re.compile(r"site-packages|dist-packages|[\\/]lib[\\/]python\d|<frozen ")
+_FENCE_RE = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?:])\s+(?=[A-Z`*\[(])|\n\s*\n")
+
+# Too common in docs to say whether a sentence is relevant
+_STOPWORDS = frozenset(
+    "the and for are was were with this that from you your not but can has have "
+    "use used using into when which will its all any been one two also more may "
+    "should than then there these those what how why none".split()
+)
+
+
+class PromptParts(NamedTuple):
+    code: str
+    error: Optional[str]
+    question: Optional[str]
+    docs: List[Dict]
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        name = "o200k_base"
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # The encoding file couldn't be loaded (e.g. offline)
+        print(f"[prompt] tiktoken unavailable, estimating token counts: {e!r}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding(llm_client.LLM_MODEL)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _truncate(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """
+    Cut `text` at line boundaries (characters, for a single huge line) until
+    it fits `max_tokens`, keeping the start, or the end if `keep_end`.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+
+    def kept(n: int) -> str:
+        return "\n".join(lines[len(lines) - n:] if keep_end else lines[:n])
+
+    # Binary search for the most lines that fit (at least one)
+    low, high = 1, len(lines)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(kept(mid)) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    text = kept(low)
+    while text and count_tokens(text) > max_tokens:
+        cut = max(len(text) * 3 // 4, 0)
+        text = text[len(text) - cut:] if keep_end else text[:cut]
+    return "...\n" + text if keep_end else text + "\n..."
+
+
+def _is_library_frame(path: str) -> bool:
+    return bool(_LIBRARY_PATH_RE.search(path))
+
+
+def trim_traceback(error: str, max_tokens: int = PROMPT_ERROR_TOKENS) -> str:
+    """
+    Keep the last traceback of an exception chain, with the user's frames
+    and the frame that raised; runs of library frames in between collapse
+    to one line. Output before the traceback (warnings, prints) is kept only
+    if there's room, newest lines first.
+    """
+    lines = error.rstrip().splitlines()
+    starts = [i for i, line in enumerate(lines) if line.startswith("Traceback (most recent call last)")]
+    if not starts:
+        return _truncate(error.strip(), max_tokens, keep_end=True)
+
+    start = starts[-1]
+    before = lines[:start]
+    body = lines[start + 1:]
+
+    # Frames: a "File ..." line plus its indented source lines
+    frames: List[List[str]] = []
+    rest: List[str] = []
+    for line in body:
+        if _FRAME_RE.match(line):
+            frames.append([line])
+        elif frames and not rest and line.startswith((" ", "\t")):
+            frames[-1].append(line)
+        else:
+            rest.append(line)
+
+    kept = [lines[start]]
+    omitted = 0
+    for i, frame in enumerate(frames):
+        path = _FRAME_RE.match(frame[0]).group(1)
+        if _is_library_frame(path) and i != len(frames) - 1:
+            omitted += 1
+            continue
+        if omitted:
+            kept.append(f"  ... {omitted} library frame(s) omitted ...")
+            omitted = 0
+        kept.extend(frame)
+
+    tail = "\n".join(kept + rest)
+    if len(starts) > 1 or any("During handling" in line or "direct cause" in line for line in before):
+        tail = "(earlier chained exceptions omitted)\n" + tail
+        before = []
+    tail = _truncate(tail, max_tokens, keep_end=True)
+
+    room = max_tokens - count_tokens(tail)
+    if before and room > 20:
+        tail = _truncate("\n".join(before), room, keep_end=True) + "\n" + tail
+    return tail
+
+
+def user_frame_lines(error: Optional[str]) -> List[int]:
+    """
+    Line numbers (0-based) the traceback points at outside library code,
+    i.e. in the user's own file, innermost frame last.
+    """
+    found: List[int] = []
+    for line in (error or "").splitlines():
+        match = _FRAME_RE.match(line)
+        if match and not _is_library_frame(match.group(1)):
+            found.append(int(match.group(2)) - 1)
+    return found
+
+
+def trim_code(code: str, error: Optional[str], max_tokens: int = PROMPT_CODE_TOKENS) -> str:
+    """
+    Code within `max_tokens`. Long code keeps its imports and the lines
+    around those the traceback points at in the user's own file.
+    """
+    if count_tokens(code) <= max_tokens:
+        return code
+
+    lines = code.splitlines()
+    around: Set[int] = set()
+    for n in user_frame_lines(error):
+        around.update(range(max(n - CODE_CONTEXT_LINES, 0), min(n + CODE_CONTEXT_LINES + 1, len(lines))))
+    if not around:
+        # Nothing to anchor on: the start of the file
+        return _truncate(code, max_tokens)
+    imports = {i for i, line in enumerate(lines) if line.startswith(("import ", "from "))}
+    wanted = imports | around
+
+    out: List[str] = []
+    previous = -1
+    for i in sorted(wanted):
+        if i != previous + 1:
+            out.append("# ...")
+        out.append(lines[i])
+        previous = i
+    if previous != len(lines) - 1:
+        out.append("# ...")
+    return _truncate("\n".join(out), max_tokens)
+
+
+def query_terms(code: str, error: Optional[str], question: Optional[str], api_symbols: List[str]) -> Set[str]:
+    """
+    Words a snippet sentence is scored on: the question, the end of the
+    error output and the parts of the API names the code uses.
+    """
+    error_tail = "\n".join((error or "").strip().splitlines()[-5:])
+    text = " ".join([question or "", error_tail] + [s.replace(".", " ") for s in api_symbols])
+    return {t for t in tokenize(text) if len(t) > 2 and t not in _STOPWORDS}
+
+
+def _units(text: str) -> List[str]:
+    """
+    Sentences of a snippet, with fenced code blocks kept whole.
+    """
+    units: List[str] = []
+    pos = 0
+    for match in _FENCE_RE.finditer(text):
+        units.extend(_SENTENCE_SPLIT_RE.split(text[pos:match.start()]))
+        units.append(match.group(0))
+        pos = match.end()
+    units.extend(_SENTENCE_SPLIT_RE.split(text[pos:]))
+    return [u.strip() for u in units if u and u.strip()]
+
+
+def _unit_key(unit: str) -> str:
+    return " ".join(unit.lower().split())
+
+
+def compress_snippets(
+    snippets: List[DocSnippet],
+    terms: Set[str],
+    budget_tokens: int,
+    per_snippet_tokens: int = PROMPT_SNIPPET_TOKENS,
+) -> List[Dict]:
+    """
+    Compact dicts for the prompt, best snippet first. Sentences already
+    seen in a better snippet are dropped, and each snippet keeps its first
+    sentence plus those sharing words with the query (most shared first),
+    in their original order, within its share of the budget.
+    """
+    seen: Set[str] = set()
+    docs: List[Dict] = []
+    remaining = budget_tokens
+    for snippet in snippets:
+        if remaining <= 0:
+            break
+        units: List[str] = []
+        for unit in _units(snippet.text):
+            if _unit_key(unit) not in seen:
+                seen.add(_unit_key(unit))
+                units.append(unit)
+        if not units:
+            continue
+
+        allowance = min(per_snippet_tokens, remaining)
+        overlap = [len(terms & set(tokenize(unit))) for unit in units]
+        # The first sentence (what the chunk is about), then the most relevant
+        ranked = [0] + sorted(
+            (i for i in range(1, len(units)) if overlap[i]),
+            key=lambda i: (-overlap[i], i),
+        )
+        chosen: List[int] = []
+        used = 0
+        for i in ranked:
+            cost = count_tokens(units[i])
+            if used + cost > allowance:
+                continue
+            chosen.append(i)
+            used += cost
+        if not chosen:
+            chosen, used = [0], allowance
+            units[0] = _truncate(units[0], allowance)
+
+        chosen.sort()
+        docs.append({
+            "id": snippet.id,
+            "title": snippet.title,
+            "url": snippet.url,
+            "text": " ".join(units[i] for i in chosen),
+            "score": round(snippet.score, 3),
+        })
+        remaining -= used
+    return docs
+
+
+def budget_prompt_parts(
+    code: str,
+    error: Optional[str],
+    question: Optional[str],
+    doc_snippets: List[DocSnippet],
+    api_symbols: List[str],
+    budget_tokens: int = PROMPT_TOKEN_BUDGET,
+    overhead_tokens: int = 0,
+) -> PromptParts:
+    """
+    Fit the pieces of the user message into `budget_tokens`: trimmed error
+    and code first, then compressed snippets in whatever is left.
+    """
+    error = trim_traceback(error) if error else error
+    code = trim_code(code, error)
+    question = _truncate(question, PROMPT_ERROR_TOKENS) if question else question
+
+    used = overhead_tokens + sum(count_tokens(part or "") for part in (code, error, question))
+    terms = query_terms(code, error, question, api_symbols)
+    docs = compress_snippets(doc_snippets, terms, max(budget_tokens - used, 0))
+    return PromptParts(code=code, error=error, question=question, docs=docs)
+
+
+class PromptTokenStats:
+    """
+    Running totals of prompt sizes, for monitoring.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last: Dict[str, int] = {}
+
+    def record(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.total_tokens += counts["total"]
+            self.max_tokens = max(self.max_tokens, counts["total"])
+            self.last = dict(counts)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "avg_tokens": round(self.total_tokens / self.prompts, 1) if self.prompts else 0.0,
+                "max_tokens": self.max_tokens,
+                "budget": PROMPT_TOKEN_BUDGET,
+                "last": dict(self.last),
+            }
+
+
+prompt_token_stats = PromptTokenStats()
@@ -0,0 +1,87 @@
+import os
+from typing import List, Optional, Tuple
+from app.services.api_extraction import extract_api_symbols
+from app.services.prompt_builder import user_frame_lines
+from app.services.response_cache import error_signature
+
+# A mentor request is searched as several weighted sub-queries whose rankings
+# are fused: the error line, the API calls the code makes, the question and
+# windows of the code itself.
+SUBQUERY_ERROR_WEIGHT = float(os.getenv("BONDO_SUBQUERY_ERROR_WEIGHT", "1.0"))
+SUBQUERY_QUESTION_WEIGHT = float(os.getenv("BONDO_SUBQUERY_QUESTION_WEIGHT", "0.8"))
+SUBQUERY_API_WEIGHT = float(os.getenv("BONDO_SUBQUERY_API_WEIGHT", "0.6"))
+SUBQUERY_CODE_WEIGHT = float(os.getenv("BONDO_SUBQUERY_CODE_WEIGHT", "0.4"))
+
+# The retrieval model reads at most 256 tokens, so code is embedded in
+# windows that fit, around the lines the traceback points at if any
+CODE_WINDOW_LINES = 30
+CODE_WINDOW_CHARS = 800
+MAX_CODE_WINDOWS = 3
+# Long error messages (array reprs etc.) add nothing past this
+ERROR_QUERY_CHARS = 400
+MAX_API_SYMBOLS = 8
+
+SubQuery = Tuple[str, float]
+
+
+def error_query(error: Optional[str]) -> Optional[str]:
+    """
+    "ErrorType: message" of the last exception, without paths or line
+    numbers, or the last lines of output that has no exception line.
+    """
+    if not error or not error.strip():
+        return None
+    error_type, message = error_signature(error)
+    if not error_type:
+        message = " ".join(error.strip().splitlines()[-3:])
+    text = f"{error_type}: {message}" if error_type else message
+    return text[:ERROR_QUERY_CHARS].strip() or None
+
+
+def api_query(code: str) -> Optional[str]:
+    symbols = extract_api_symbols(code)[:MAX_API_SYMBOLS]
+    return " ".join(symbols) or None
+
+
+def code_windows(code: str, error: Optional[str]) -> List[str]:
+    """
+    Up to MAX_CODE_WINDOWS pieces of the code that each fit the retrieval
+    model: centred on the user's frames in the traceback (innermost first),
+    or else consecutive windows from the start.
+    """
+    lines = code.splitlines()
+    if not lines:
+        return []
+    half = CODE_WINDOW_LINES // 2
+    starts: List[int] = []
+    for n in reversed(user_frame_lines(error)):
+        if 0 <= n < len(lines):
+            starts.append(max(n - half, 0))
+    if not starts:
+        starts = list(range(0, len(lines), CODE_WINDOW_LINES))
+
+    windows: List[str] = []
+    for start in starts:
+        text = "\n".join(lines[start:start + CODE_WINDOW_LINES]).strip()[:CODE_WINDOW_CHARS]
+        if text and text not in windows:
+            windows.append(text)
+        if len(windows) >= MAX_CODE_WINDOWS:
+            break
+    return windows
+
+
+def plan_sub_queries(code: str, error: Optional[str], question: Optional[str]) -> List[SubQuery]:
+    """
+    Weighted (text, weight) sub-queries for search_docs(), most important first.
+    """
+    planned: List[SubQuery] = []
+    for text, weight in (
+        (error_query(error), SUBQUERY_ERROR_WEIGHT),
+        ((question or "").strip() or None, SUBQUERY_QUESTION_WEIGHT),
+        (api_query(code), SUBQUERY_API_WEIGHT),
+    ):
+        if text and weight > 0:
+            planned.append((text, weight))
+    if SUBQUERY_CODE_WEIGHT > 0:
+        planned.extend((window, SUBQUERY_CODE_WEIGHT) for window in code_windows(code, error))
+    return planned
@@ -1,125 +1,610 @@
 from __future__ import annotations
-import json
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, NamedTuple, Optional, Tuple
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from app.ingestion.config import VECTORSTORE_DIR, EMBED_MODEL_NAME
+from app.ingestion.config import QUERY_EMBED_BACKEND
+from app.ingestion.corpora import Corpus, ShardFiles, default_corpus, enabled_corpora
+from app.ingestion.encoder import load_encoder
+from app.ingestion.index_factory import set_search_params
+from app.ingestion.doc_store import DocStore
+from app.ingestion.term_index import TermIndex, tokenize
+from app.ingestion.symbol_index import SymbolIndex
 from app.models.docs import DocSnippet
-from app.services.api_extraction import extract_api_tokens
+from app.services.api_extraction import extract_api_tokens, extract_api_symbols
+from app.services.corpus_router import route_corpora
+from app.services.encode_batcher import EncodeBatcher
+from app.services.search_cache import TTLCache, normalize_query
 
-METADATA_FILE = VECTORSTORE_DIR / "sklearn_doc_metadata.jsonl"
-FAISS_INDEX_FILE = VECTORSTORE_DIR / "sklearn_doc_index.faiss"
+# Zero-copy mmap of the index's vector storage where faiss supports it
+FAISS_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
 
-_index: Optional[faiss.Index] = None
-_metadata: List[Dict] = []
+# Set BONDO_RAG_WARMUP=0 to skip loading everything at startup
+RAG_WARMUP = os.getenv("BONDO_RAG_WARMUP", "1") == "1"
+
+# Every corpus (library) has its own shard, searched only for queries routed
+# to it. Shards are loaded on first use, and the least recently used are
+# dropped once the loaded ones take more than RAG_SHARD_MEMORY_MB (their size
+# on disk). The default corpus's shard is loaded at startup and never dropped.
+RAG_SHARD_MEMORY_MB = float(os.getenv("BONDO_RAG_SHARD_MEMORY_MB", "2048"))
+SHARD_COMPONENTS = ("doc_store", "terms", "symbols", "index")
+
+
+class Shard(NamedTuple):
+    corpus: Corpus
+    index: faiss.Index
+    # Chunk metadata and text, memory-mapped and decoded per hit
+    store: DocStore
+    # Inverted index over chunk text and URLs, for BM25 and the API-token boosts
+    terms: TermIndex
+    # Fully qualified API name -> rows of the chunks documenting it
+    symbols: SymbolIndex
+    # Build id of the loaded files; part of every result cache key
+    version: Optional[str]
+    size_bytes: int
+
+
+# slug -> loaded shard, least recently used first
+_shards: "OrderedDict[str, Shard]" = OrderedDict()
+_shards_lock = threading.Lock()
 _model: Optional[SentenceTransformer] = None
 
-def _load_metadata(path: Path) -> List[Dict]:
-    chunks: List[Dict] = []
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            chunks.append(json.loads(line))
-    return chunks
+# Rankings fused across shards hold keys, not rows: the shard's position in
+# the search above _ROW_BITS, the row below
+_ROW_BITS = 40
+_ROW_MASK = (1 << _ROW_BITS) - 1
+
+# Query encoding goes through a micro-batcher: concurrent searches wait up to
+# QUERY_BATCH_WAIT_MS so their queries can share one forward pass.
+QUERY_BATCH_MAX = int(os.getenv("BONDO_QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("BONDO_QUERY_BATCH_WAIT_MS", "2"))
+
+# Hybrid retrieval: dense (FAISS, with the API-token boosts) and BM25 rankings
+# are fused with weighted reciprocal-rank fusion, score = sum(w / (k + rank)).
+# A lexical weight of 0 turns BM25 off.
+RAG_DENSE_WEIGHT = float(os.getenv("BONDO_RAG_DENSE_WEIGHT", "1.0"))
+RAG_LEXICAL_WEIGHT = float(os.getenv("BONDO_RAG_LEXICAL_WEIGHT", "1.0"))
+RAG_RRF_K = int(os.getenv("BONDO_RAG_RRF_K", "60"))
+_lexical_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+
+# API reference chunks for the names the user's code imports and calls are
+# looked up exactly and put ahead of the searched results (at most this many)
+RAG_SYMBOL_HITS = int(os.getenv("BONDO_RAG_SYMBOL_HITS", "3"))
+
+# Caches for query vectors (by normalized text) and for ranked results (by
+# query, API tokens, top_k and the shards' versions). Results are dropped
+# whenever a rebuilt shard is picked up.
+QUERY_CACHE_SIZE = int(os.getenv("BONDO_QUERY_CACHE_SIZE", "4096"))
+RESULT_CACHE_SIZE = int(os.getenv("BONDO_RESULT_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("BONDO_SEARCH_CACHE_TTL_SECONDS", "3600"))
+_vector_cache = TTLCache(QUERY_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+_result_cache = TTLCache(RESULT_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+
+# How often to look for a rebuilt shard on disk (0 = never)
+STORE_CHECK_INTERVAL_SECONDS = float(os.getenv("BONDO_RAG_STORE_CHECK_SECONDS", "30"))
+# slug -> when the shard was last checked for a rebuild
+_last_store_check: Dict[str, float] = {}
+
+# Serializes loading so concurrent first requests don't load things twice
+_load_lock = threading.Lock()
+
+
+def _pending() -> Dict:
+    return {"state": "pending", "load_seconds": None, "error": None}
+
+
+# Component ("model", "scikit-learn/index", ...) -> {"state": pending/loading/
+# ready/error, "load_seconds", "error"}. Other shards' components are added
+# when they load and removed when they're dropped.
+_status: Dict[str, Dict] = {"model": _pending()}
+_status.update({f"{default_corpus().name}/{c}": _pending() for c in SHARD_COMPONENTS})
+
+
+def _load_component(name: str, load: Callable[[], object]) -> object:
+    status = _status.setdefault(name, _pending())
+    status.update(state="loading", error=None)
+    started = time.perf_counter()
+    try:
+        value = load()
+    except Exception as e:
+        status.update(state="error", error=str(e), load_seconds=None)
+        raise
+    status.update(state="ready", load_seconds=round(time.perf_counter() - started, 3))
+    return value
 
-def _ensure_loaded() -> None:
+
+def _load_doc_store(path: Path) -> DocStore:
+    if not path.exists():
+        raise RuntimeError(f"Doc store not found: {path} (run embed_index.py)")
+    print(f"[RAG] Mapping doc store {path}")
+    store = DocStore(path)
+    print(f"[RAG] Doc store has {len(store)} entries.")
+    return store
+
+
+def _load_terms(path: Path) -> TermIndex:
+    if not (path / "terms.json").exists():
+        raise RuntimeError(f"Term index not found: {path} (run embed_index.py)")
+    print(f"[RAG] Mapping term index {path}")
+    terms = TermIndex(path)
+    print(f"[RAG] Term index has {len(terms.vocab)} terms.")
+    return terms
+
+
+def _load_symbols(path: Path) -> SymbolIndex:
+    if not path.exists():
+        raise RuntimeError(f"Symbol index not found: {path} (run embed_index.py)")
+    print(f"[RAG] Loading symbol index {path}")
+    symbols = SymbolIndex(path)
+    print(f"[RAG] Symbol index has {len(symbols)} API names.")
+    return symbols
+
+
+def _load_index(path: Path) -> faiss.Index:
+    if not path.exists():
+        raise RuntimeError(f"FAISS index file not found: {path}")
+    print(f"[RAG] Loading FAISS index from {path}")
+    index = faiss.read_index(str(path), FAISS_READ_FLAGS)
+    # nprobe / efSearch for IVF / HNSW indexes (no-op for flat)
+    set_search_params(index)
+    print(f"[RAG] FAISS index ntotal = {index.ntotal}")
+    return index
+
+
+def _load_model() -> SentenceTransformer:
+    model = load_encoder(QUERY_EMBED_BACKEND)
+    # The first forward pass is much slower than the rest
+    model.encode(["warm up"], convert_to_numpy=True, normalize_embeddings=True)
+    return model
+
+
+def _ensure_model() -> None:
     """
-    Lazily load FAISS index, metadata, and embedding model into memory.
-    Called automatically before search.
+    Load the embedding model if it isn't loaded yet. Runs at startup via
+    warm_up(), and before each search in case that failed or hasn't finished.
     """
-    global _index, _metadata, _model
-
-    if _index is not None and _metadata and _model is not None:
+    global _model
+    if _model is not None:
         return
+    with _load_lock:
+        if _model is None:
+            _model = _load_component("model", _load_model)
+
 
-    if not METADATA_FILE.exists():
-        raise RuntimeError(f"Metadata file not found: {METADATA_FILE}")
-    if not FAISS_INDEX_FILE.exists():
-        raise RuntimeError(f"FAISS index file not found: {FAISS_INDEX_FILE}")
+def _build_id(files: ShardFiles) -> Optional[str]:
+    try:
+        return files.build_info.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
 
-    # Load metadata
-    print(f"[RAG] Loading metadata from {METADATA_FILE}")
-    _metadata = _load_metadata(METADATA_FILE)
-    print(f"[RAG] Loaded {len(_metadata)} metadata entries.")
 
-    # Load FAISS index
-    print(f"[RAG] Loading FAISS index from {FAISS_INDEX_FILE}")
-    _index = faiss.read_index(str(FAISS_INDEX_FILE))
-    print(f"[RAG] FAISS index ntotal = {_index.ntotal}")
+def _shard_size(files: ShardFiles) -> int:
+    paths = [files.faiss_index, files.doc_store, files.symbols]
+    if files.terms.is_dir():
+        paths.extend(files.terms.iterdir())
+    return sum(p.stat().st_size for p in paths if p.is_file())
 
-    if len(_metadata) != _index.ntotal:
+
+def _shard_built(corpus: Corpus) -> bool:
+    return corpus.files.doc_store.exists()
+
+
+def _load_shard(corpus: Corpus) -> Shard:
+    """
+    Doc store, term index and FAISS index (memory-mapped) and symbol index
+    of one corpus.
+    """
+    files, name = corpus.files, corpus.name
+    version = _build_id(files)
+    store = _load_component(f"{name}/doc_store", lambda: _load_doc_store(files.doc_store))
+    terms = _load_component(f"{name}/terms", lambda: _load_terms(files.terms))
+    symbols = _load_component(f"{name}/symbols", lambda: _load_symbols(files.symbols))
+    index = _load_component(f"{name}/index", lambda: _load_index(files.faiss_index))
+    if len(store) != index.ntotal:
         # Not fatal, but good to know
         print(
-            f"[RAG] WARNING: metadata count ({len(_metadata)}) "
-            f"!= index.ntotal ({_index.ntotal})"
+            f"[RAG] WARNING: {name} doc store count ({len(store)}) "
+            f"!= index.ntotal ({index.ntotal})"
         )
+    _last_store_check[corpus.slug] = time.monotonic()
+    return Shard(corpus, index, store, terms, symbols, version, _shard_size(files))
 
-    # Load embedding model
-    print(f"[RAG] Loading embedding model: {EMBED_MODEL_NAME}")
-    _model = SentenceTransformer(EMBED_MODEL_NAME)
-    
 
-def search_docs(query: str, top_k: int = 5, code: str | None=None) -> List[DocSnippet]:
+def _get_shard(corpus: Corpus) -> Shard:
     """
-    Run semantic search over doc chunks and return top-k snippets.
+    The corpus's shard, loading it (and dropping others, past the memory
+    budget) if needed.
+    """
+    with _shards_lock:
+        shard = _shards.get(corpus.slug)
+        if shard is not None:
+            _shards.move_to_end(corpus.slug)
+    if shard is not None:
+        return _check_for_rebuild(shard)
+
+    with _load_lock:
+        shard = _shards.get(corpus.slug)
+        if shard is None:
+            shard = _load_shard(corpus)
+            with _shards_lock:
+                _shards[corpus.slug] = shard
+                _evict(keep=corpus.slug)
+    return shard
+
+
+def _evict(keep: str) -> None:
+    """
+    Drop least recently used shards until the rest fit RAG_SHARD_MEMORY_MB.
+    Searches already holding a dropped shard finish with it.
+    """
+    budget = RAG_SHARD_MEMORY_MB * 1024 * 1024
+    pinned = (keep, default_corpus().slug)
+    while sum(s.size_bytes for s in _shards.values()) > budget:
+        victim = next((slug for slug in _shards if slug not in pinned), None)
+        if victim is None:
+            break
+        shard = _shards.pop(victim)
+        _last_store_check.pop(victim, None)
+        for component in SHARD_COMPONENTS:
+            _status.pop(f"{shard.corpus.name}/{component}", None)
+        print(f"[RAG] Dropped the {shard.corpus.name} shard ({shard.size_bytes / 2**20:.0f} MB) to stay within {RAG_SHARD_MEMORY_MB:.0f} MB")
+
+
+def _check_for_rebuild(shard: Shard) -> Shard:
+    """
+    Every STORE_CHECK_INTERVAL_SECONDS, swap in a rebuilt shard if
+    embed_index.py has finished a new build since we loaded ours.
+    """
+    slug = shard.corpus.slug
+    if not STORE_CHECK_INTERVAL_SECONDS:
+        return shard
+    if time.monotonic() - _last_store_check.get(slug, 0.0) < STORE_CHECK_INTERVAL_SECONDS:
+        return shard
+
+    with _load_lock:
+        current = _shards.get(slug, shard)
+        if time.monotonic() - _last_store_check.get(slug, 0.0) < STORE_CHECK_INTERVAL_SECONDS:
+            return current
+        _last_store_check[slug] = time.monotonic()
+        version = _build_id(shard.corpus.files)
+        if version is None or version == current.version:
+            return current
+
+        print(f"[RAG] {shard.corpus.name} vector store was rebuilt, reloading it")
+        try:
+            reloaded = _load_shard(shard.corpus)
+        except Exception as e:
+            print(f"[RAG] Reload failed, keeping the loaded store: {e!r}")
+            return current
+        with _shards_lock:
+            if slug in _shards:
+                _shards[slug] = reloaded
+        _result_cache.clear()
+        return reloaded
+
+
+def _route(code: str | None, library: str | None) -> List[Tuple[Corpus, float]]:
+    """
+    route_corpora(), limited to shards that have been built. Code whose
+    libraries have none falls back to the default corpus.
     """
-    _ensure_loaded()
-    assert _index is not None
+    routed = route_corpora(code, library)
+    if library and not routed:
+        raise RuntimeError(f"Unknown library: {library}")
+    built = [(corpus, weight) for corpus, weight in routed if _shard_built(corpus)]
+    if not built and not library and _shard_built(default_corpus()):
+        built = [(default_corpus(), 1.0)]
+    if not built:
+        names = ", ".join(corpus.name for corpus, _ in routed)
+        raise RuntimeError(f"No vector store built for {names} (run embed_index.py)")
+    return built
+
+
+def search_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"query_vectors": _vector_cache.stats(), "results": _result_cache.stats()}
+
+
+def shard_stats() -> Dict:
+    """
+    Loaded shards (least recently used first) against the memory budget,
+    and which corpora have been built.
+    """
+    with _shards_lock:
+        loaded = [
+            {"library": s.corpus.name, "chunks": len(s.store), "size_mb": round(s.size_bytes / 2**20, 1)}
+            for s in _shards.values()
+        ]
+    return {
+        "budget_mb": RAG_SHARD_MEMORY_MB,
+        "loaded_mb": round(sum(s["size_mb"] for s in loaded), 1),
+        "loaded": loaded,
+        "built": [c.name for c in enabled_corpora() if _shard_built(c)],
+    }
+
+
+def warm_up() -> None:
+    """
+    Load the embedding model and the default corpus's shard ahead of the
+    first request. Meant for a background thread at startup; failures are
+    logged and left for /ready to report.
+    """
+    started = time.perf_counter()
+    try:
+        _ensure_model()
+        _get_shard(default_corpus())
+    except Exception as e:
+        print(f"[RAG] Warm-up failed: {e!r}")
+        return
+    print(f"[RAG] Warm-up done in {time.perf_counter() - started:.2f}s")
+
+
+def rag_status() -> Dict[str, Dict]:
+    """
+    Per-component load state for the readiness probe.
+    """
+    return {name: dict(status) for name, status in _status.items()}
+
+
+def _snippet_title(meta: Dict, library: str) -> str:
+    """
+    "Page title > Section > Subsection" for chunks that carry a heading path.
+    """
+    section = meta.get("section") or []
+    if section:
+        return " > ".join(section)
+    return meta.get("title") or f"{library} docs"
+
+
+def _encode_queries(texts: List[str]) -> np.ndarray:
     assert _model is not None
-    
-    if top_k <= 0:
-        return []
-    
-    api_tokens = extract_api_tokens(code) if code else []
-    
-    query_vec: np.ndarray = _model.encode(
-        [query],
+    return _model.encode(
+        texts,
+        batch_size=max(len(texts), 1),
         convert_to_numpy=True,
         normalize_embeddings=True
     )
-    
-    if query_vec.ndim == 1:
-        query_vec = query_vec.reshape(1, -1)
-        
-    k = min(max(top_k*3,10), _index.ntotal)
-    semantic_scores, semantic_indices = _index.search(query_vec, k)
-    
-    scored_results = []
-
-    for idx, base_score in zip(semantic_indices[0], semantic_scores[0]):
-        if idx < 0 or idx >= len(_metadata):
-            continue
-
-        meta = _metadata[idx]
-        text = meta.get("text", "")
-        url = meta.get("url", "") or ""
-
-        keyword_count = sum(tok.lower() in text.lower() for tok in api_tokens)
-        keyword_score = keyword_count * 0.05
-
-        url_boost_count = sum(tok.lower() in url.lower() for tok in api_tokens)
-        metadata_boost = url_boost_count * 0.10
-
-        final_score = (base_score * 0.75) + (keyword_score * 0.20) + (metadata_boost * 0.05)
-        scored_results.append((final_score, idx))
-
-    scored_results.sort(key=lambda x: x[0], reverse=True)
-    final_indices = [i for (_, i) in scored_results[:top_k]]
-
-    results: List[DocSnippet] = []
-    for i in final_indices:
-        meta = _metadata[i]
-        snippet = DocSnippet(
-            id=meta.get("id", f"chunk-{i}"),
-            title=meta.get("title", "scikit-learn docs"),
-            url=meta.get("url"),
-            text=meta.get("text", ""),
-            score=float(1.0), 
-        )
-        results.append(snippet)
 
-    return results
\ No newline at end of file
+
+_batcher = EncodeBatcher(_encode_queries, QUERY_BATCH_MAX, QUERY_BATCH_WAIT_MS)
+
+
+def _encode_cached(texts: List[str], keys: List[str]) -> np.ndarray:
+    vectors = [_vector_cache.get(key) for key in keys]
+    to_encode = [j for j, v in enumerate(vectors) if v is None]
+    if to_encode:
+        # Concurrent searches share encoder batches
+        encoded = _batcher.encode([texts[j] for j in to_encode])
+        for row, j in enumerate(to_encode):
+            vectors[j] = encoded[row]
+            _vector_cache.put(keys[j], encoded[row])
+    return np.ascontiguousarray(np.stack(vectors))
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """
+    Normalized embeddings of `texts` from the retrieval model (one row each),
+    through the same batcher and vector cache as search queries.
+    """
+    _ensure_model()
+    return _encode_cached(texts, [normalize_query(t) for t in texts])
+
+
+def _dense_ranking(
+    store: DocStore,
+    terms: TermIndex,
+    scores: np.ndarray,
+    vids: np.ndarray,
+    api_tokens: List[str],
+) -> np.ndarray:
+    """
+    Rows of one query's FAISS hits, best first, after the API-token boosts.
+    Token matches are counted over all candidates at once from the term index.
+    """
+    rows = store.rows_for_vids(vids)
+    found = (vids >= 0) & (rows >= 0)
+    rows, base_scores = rows[found], scores[found].astype(np.float32)
+
+    tokens = {tok.lower() for tok in api_tokens}
+    keyword_score = terms.match_counts("text", tokens, rows) * 0.05
+    metadata_boost = terms.match_counts("url", tokens, rows) * 0.10
+
+    final_scores = (base_scores * 0.75) + (keyword_score * 0.20) + (metadata_boost * 0.05)
+    return rows[np.argsort(-final_scores, kind="stable")]
+
+
+def _fuse(rankings: List[Tuple[np.ndarray, float]]):
+    """
+    Weighted reciprocal-rank fusion of several rankings (rows best first,
+    weight): score = sum(weight / (RAG_RRF_K + rank)).
+    Returns (rows, fused scores), best first.
+    """
+    rows = np.concatenate([r for r, _ in rankings] or [np.empty(0)]).astype(np.int64)
+    weights = np.concatenate([w / (RAG_RRF_K + 1 + np.arange(len(r))) for r, w in rankings] or [np.empty(0)])
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=weights, minlength=len(unique_rows))
+    # Ties (e.g. the same rank in two lists) go to the earlier ranking's order
+    first_seen = np.full(len(unique_rows), len(rows))
+    np.minimum.at(first_seen, inverse, np.arange(len(rows)))
+    order = np.lexsort((first_seen, -fused))
+    return unique_rows[order], fused[order]
+
+
+def _key(position: int, rows: np.ndarray) -> np.ndarray:
+    """
+    Fused-ranking keys of `rows` of the shard at `position` in a search.
+    """
+    return np.int64(position << _ROW_BITS) | rows.astype(np.int64)
+
+
+def _rank_hits(
+    shards: List[Shard],
+    rankings: List[Tuple[np.ndarray, float]],
+    top_k: int,
+    pinned: List[DocSnippet],
+    pinned_keys: List[int],
+) -> List[DocSnippet]:
+    """
+    Fuse the dense and BM25 rankings of one query's sub-queries (over every
+    shard searched) and build snippets, after the exact API matches in
+    `pinned`. Only the chunks returned are decoded.
+    """
+    keys, fused_scores = _fuse(rankings)
+    if pinned_keys:
+        keep = ~np.isin(keys, pinned_keys)
+        keys, fused_scores = keys[keep], fused_scores[keep]
+
+    results: List[DocSnippet] = list(pinned)
+    remaining = top_k - len(results)
+    for key, score in zip(keys[:remaining], fused_scores[:remaining]):
+        results.append(_snippet(shards, int(key), float(score)))
+
+    return results
+
+
+def _snippet(shards: List[Shard], key: int, score: float) -> DocSnippet:
+    shard, row = shards[key >> _ROW_BITS], key & _ROW_MASK
+    meta = shard.store.get(row)
+    return DocSnippet(
+        id=meta.get("id", f"chunk-{row}"),
+        title=_snippet_title(meta, shard.corpus.name),
+        url=meta.get("anchor_url") or meta.get("url"),
+        text=meta.get("text", ""),
+        score=round(score, 6),
+    )
+
+
+def _lexical_search(terms: TermIndex, query: str, api_tokens: List[str], top_n: int) -> np.ndarray:
+    if RAG_LEXICAL_WEIGHT <= 0:
+        return np.empty(0, dtype=np.int64)
+    query_terms = set(tokenize(query)) | {tok.lower() for tok in api_tokens}
+    rows, _ = terms.bm25(query_terms, top_n)
+    return rows
+
+
+def _search(
+    groups: List[List[Tuple[str, float]]],
+    top_k: int,
+    code: str | None,
+    library: str | None = None,
+) -> List[List[DocSnippet]]:
+    """
+    Hybrid search where each group of weighted sub-queries yields one fused
+    result list. Only the shards of the libraries `code` imports are
+    searched (or `library`'s), weighted by route_corpora(). All distinct
+    sub-queries are encoded in one batch and searched with one multi-row
+    FAISS call per shard, with BM25 over the term indexes running alongside.
+    API reference chunks for the names `code` uses are looked up in the
+    symbol indexes and come first (score 1.0). Cached results and query
+    vectors are reused.
+    """
+    # Nothing to find: don't load the model or any shard for it
+    if top_k <= 0 or not groups:
+        return [[] for _ in groups]
+
+    _ensure_model()
+    assert _model is not None
+    # Local references, in case a reload swaps a shard mid-search
+    routed = [(_get_shard(corpus), weight) for corpus, weight in _route(code, library)]
+    shards = [shard for shard, _ in routed]
+
+    api_tokens = extract_api_tokens(code) if code else []
+
+    # Exact lookup first: no encoding or search needed if it fills top_k
+    symbol_names = extract_api_symbols(code) if code else []
+    limit = min(top_k, RAG_SYMBOL_HITS)
+    pinned_keys: List[int] = []
+    for position, shard in enumerate(shards):
+        if symbol_names and len(pinned_keys) < limit:
+            rows = np.asarray(shard.symbols.rows_for(symbol_names, limit - len(pinned_keys)), dtype=np.int64)
+            pinned_keys.extend(int(key) for key in _key(position, rows))
+    pinned = [_snippet(shards, key, 1.0) for key in pinned_keys]
+    if len(pinned) >= top_k:
+        return [[s.model_copy() for s in pinned] for _ in groups]
+
+    results: List[Optional[List[DocSnippet]]] = [None] * len(groups)
+    group_keys = [tuple((normalize_query(q), w) for q, w in group) for group in groups]
+    token_key = (tuple(sorted(set(api_tokens))), tuple(pinned_keys))
+    shard_key = tuple((shard.corpus.slug, shard.version, weight) for shard, weight in routed)
+    for i, key in enumerate(group_keys):
+        cached = _result_cache.get((key, token_key, top_k, shard_key))
+        if cached is not None:
+            results[i] = [s.model_copy() for s in cached]
+
+    misses = [i for i, r in enumerate(results) if r is None]
+    if not misses:
+        return results
+
+    # Each distinct sub-query is encoded once and searched once per shard
+    texts: Dict[str, str] = {}
+    for i in misses:
+        for (key, _), (text, _) in zip(group_keys[i], groups[i]):
+            texts.setdefault(key, text)
+    keys = list(texts)
+    depth = [min(max(top_k*3,10), shard.index.ntotal) for shard in shards]
+
+    # Lexical retrieval runs while the queries are encoded and searched
+    lexical = {
+        (position, key): _lexical_pool.submit(_lexical_search, shard.terms, texts[key], api_tokens, depth[position])
+        for position, shard in enumerate(shards)
+        for key in keys
+    }
+
+    query_vecs = _encode_cached([texts[key] for key in keys], keys)
+    dense: Dict[Tuple[int, str], np.ndarray] = {}
+    for position, shard in enumerate(shards):
+        semantic_scores, semantic_indices = shard.index.search(query_vecs, depth[position])
+        for row, key in enumerate(keys):
+            rows = _dense_ranking(shard.store, shard.terms, semantic_scores[row], semantic_indices[row], api_tokens)
+            dense[(position, key)] = _key(position, rows)
+
+    for i in misses:
+        rankings: List[Tuple[np.ndarray, float]] = []
+        for key, weight in group_keys[i]:
+            for position, (_, shard_weight) in enumerate(routed):
+                rankings.append((dense[(position, key)], weight * shard_weight * RAG_DENSE_WEIGHT))
+                lexical_rows = lexical[(position, key)].result()
+                rankings.append((_key(position, lexical_rows), weight * shard_weight * RAG_LEXICAL_WEIGHT))
+        snippets = _rank_hits(shards, rankings, top_k, pinned, pinned_keys)
+        _result_cache.put((group_keys[i], token_key, top_k, shard_key), snippets)
+        results[i] = [s.model_copy() for s in snippets]
+    return results
+
+
+def search_docs_batch(
+    queries: List[str],
+    top_k: int = 5,
+    code: str | None = None,
+    library: str | None = None,
+) -> List[List[DocSnippet]]:
+    """
+    Hybrid search for several queries at once (one encode call and one
+    multi-row FAISS search per shard). Returns the top-k snippets for each query.
+    """
+    return _search([[(q, 1.0)] for q in queries], top_k, code, library)
+
+
+def search_docs(
+    query: str | None = None,
+    top_k: int = 5,
+    code: str | None = None,
+    sub_queries: Optional[List[Tuple[str, float]]] = None,
+    library: str | None = None,
+) -> List[DocSnippet]:
+    """
+    Run semantic search over doc chunks and return top-k snippets.
+
+    With `sub_queries` (text, weight), each is searched separately, in one
+    batch, and the rankings are fused by weight and deduplicated; `query`,
+    if given too, counts as one more sub-query of weight 1. The libraries
+    searched follow `code`'s imports unless `library` names one.
+    """
+    group = ([(query, 1.0)] if query else []) + list(sub_queries or [])
+    if not group:
+        return []
+    return _search([group], top_k, code, library)[0]
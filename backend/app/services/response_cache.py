@@ -0,0 +1,288 @@
+import io
+import os
+import re
+import time
+import hashlib
+import tokenize
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from app.models.mentor import MentorHelpResponse
+from app.prompts.mentor_prompt import MENTOR_SYSTEM_PROMPT, MENTOR_PROMPT_VERSION
+from app.services import llm_client
+from app.services.api_extraction import extract_api_symbols
+from app.services.rag import encode_texts
+
+# Mentor responses are reused for requests with the same fingerprint (error
+# type and message, API symbols used, question), or one whose error/question
+# embeds within MENTOR_CACHE_THRESHOLD cosine similarity of a cached one that
+# uses the same symbols. Requests with neither an error nor a question, and
+# responses that carry a suggested fix (which is written for one snippet),
+# are only reused for the same code. A size of 0 turns the cache off; a
+# threshold of 1 or more only allows exact matches.
+MENTOR_CACHE_SIZE = int(os.getenv("BONDO_MENTOR_CACHE_SIZE", "1024"))
+MENTOR_CACHE_TTL_SECONDS = float(os.getenv("BONDO_MENTOR_CACHE_TTL_SECONDS", "86400"))
+MENTOR_CACHE_THRESHOLD = float(os.getenv("BONDO_MENTOR_CACHE_THRESHOLD", "0.95"))
+
+# Last line of a traceback: "ValueError: ...", "sklearn.exceptions.NotFittedError: ..."
+_ERROR_LINE_RE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Warning|Interrupt|Exit))\b:?\s*(.*)$")
+_TRACEBACK_FRAME_RE = re.compile(r'^\s*File "[^"]*", line \d+.*$', re.MULTILINE)
+_PATH_RE = re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.\-]+)+\.\w+")
+_LINE_NUMBER_RE = re.compile(r"\bline \d+\b")
+_HEX_ADDRESS_RE = re.compile(r"0x[0-9a-fA-F]+")
+
+# What the model answers when the code needs no change
+NO_FIX = "No change needed."
+
+EncodeFn = Callable[[List[str]], Optional[np.ndarray]]
+
+
+class Fingerprint(NamedTuple):
+    library: str
+    error_type: str
+    message: str
+    symbols: Tuple[str, ...]
+    question: str
+    # Hash of the normalized code: set when there's no error or question, or
+    # when the cached response has a fix for that code
+    code: str = ""
+
+    @property
+    def text(self) -> str:
+        """
+        What near-duplicates are compared on.
+        """
+        return f"{self.error_type}: {self.message}\n{self.question}".strip()
+
+    @property
+    def bucket(self) -> Tuple:
+        """
+        Entries are only compared within a bucket: same library, error type,
+        API symbols and (without an error or question, or with a fix) code.
+        """
+        return (self.library, self.error_type, self.symbols, self.code)
+
+
+def error_signature(error: Optional[str]) -> Tuple[str, str]:
+    """
+    (error type, message) of the last exception in `error`, with file paths,
+    line numbers and memory addresses stripped. A message that continues
+    over several lines is kept whole.
+    """
+    if not error:
+        return "", ""
+    text = _TRACEBACK_FRAME_RE.sub("", error)
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    start = next((i for i in range(len(lines) - 1, -1, -1) if _ERROR_LINE_RE.match(lines[i])), None)
+    if start is None:
+        error_type, rest = "", lines
+    else:
+        match = _ERROR_LINE_RE.match(lines[start])
+        error_type = match.group(1).rsplit(".", 1)[-1]
+        rest = [match.group(2)] + lines[start + 1:]
+
+    message = " ".join(rest)
+    message = _PATH_RE.sub("<path>", message)
+    message = _LINE_NUMBER_RE.sub("line N", message)
+    message = _HEX_ADDRESS_RE.sub("0x0", message)
+    return error_type, " ".join(message.split())
+
+
+def code_hash(code: str) -> str:
+    """
+    Hash of the code's tokens, so comments, blank lines and spacing don't
+    change it. Code that doesn't tokenize is hashed line by line instead.
+    """
+    try:
+        parts = [
+            tok.string for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type not in (tokenize.COMMENT, tokenize.NL)
+        ]
+    except (tokenize.TokenError, SyntaxError):
+        parts = [line.strip() for line in code.splitlines() if line.strip()]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(code: str, error: Optional[str], question: Optional[str], library_name: str) -> Fingerprint:
+    """
+    Cache key of a mentor request. The error and question say what the
+    request is about; without either, the answer depends on the code
+    itself, so it's keyed on that too.
+    """
+    error_type, message = error_signature(error)
+    question = " ".join((question or "").lower().split())
+    return Fingerprint(
+        library=library_name,
+        error_type=error_type,
+        message=message,
+        symbols=tuple(sorted(extract_api_symbols(code))),
+        question=question,
+        code="" if error_type or message or question else code_hash(code),
+    )
+
+
+def prompt_version() -> str:
+    """
+    Changes whenever the system prompt, user-message layout or LLM model does.
+    """
+    key = f"{MENTOR_PROMPT_VERSION}\n{llm_client.LLM_MODEL}\n{MENTOR_SYSTEM_PROMPT}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class MentorResponseCache:
+    """
+    Thread-safe LRU of mentor responses with a per-entry TTL, looked up by
+    exact fingerprint and then by embedding similarity within the bucket.
+    Everything is dropped when prompt_version() changes.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # fingerprint -> (created, vector or None, response)
+        self._entries: "OrderedDict[Fingerprint, Tuple[float, Optional[np.ndarray], MentorHelpResponse]]" = OrderedDict()
+        self._buckets: Dict[Tuple, List[Fingerprint]] = {}
+        self._version: Optional[str] = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.threshold < 1.0
+
+    def get(self, fps: Sequence[Fingerprint], encode: Optional[EncodeFn] = None) -> Optional[MentorHelpResponse]:
+        """
+        Cached response for the first of `fps` found, or a near-duplicate of
+        any of them. They must share their text (only the bucket may differ).
+        `encode` embeds fingerprint text (None if it can't); without it only
+        exact matches are found.
+        """
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            self._check_version()
+            for fp in fps:
+                entry = self._live_entry(fp)
+                if entry is not None:
+                    self._entries.move_to_end(fp)
+                    self.hits += 1
+                    return entry[2].model_copy(deep=True)
+            candidates = [k for fp in fps for k in list(self._buckets.get(fp.bucket, []))]
+            candidates = [k for k in candidates if self._live_entry(k) is not None]
+            candidates = [k for k in candidates if self._entries[k][1] is not None]
+
+        if not (self.semantic and encode and candidates):
+            self._count_miss()
+            return None
+
+        vector = encode([fps[0].text])
+        with self._lock:
+            live = [k for k in candidates if k in self._entries]
+            if live and vector is not None:
+                vector = vector[0]
+                similarity = np.stack([self._entries[k][1] for k in live]) @ vector
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    self._entries.move_to_end(live[best])
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._entries[live[best]][2].model_copy(deep=True)
+            self.misses += 1
+        return None
+
+    def put(self, fp: Fingerprint, response: MentorHelpResponse, encode: Optional[EncodeFn] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        vector = encode([fp.text]) if self.semantic and encode else None
+        vector = vector[0] if vector is not None else None
+        with self._lock:
+            self._check_version()
+            if fp not in self._entries:
+                self._buckets.setdefault(fp.bucket, []).append(fp)
+            self._entries[fp] = (time.monotonic(), vector, response.model_copy(deep=True))
+            self._entries.move_to_end(fp)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._forget(oldest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+    def _count_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _live_entry(self, fp: Fingerprint):
+        entry = self._entries.get(fp)
+        if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+            del self._entries[fp]
+            self._forget(fp)
+            return None
+        return entry
+
+    def _forget(self, fp: Fingerprint) -> None:
+        bucket = self._buckets.get(fp.bucket)
+        if bucket is not None:
+            bucket.remove(fp)
+            if not bucket:
+                del self._buckets[fp.bucket]
+
+    def _check_version(self) -> None:
+        version = prompt_version()
+        if version != self._version:
+            if self._version is not None:
+                print("[mentor] Prompt or model changed, dropping cached responses")
+            self._entries.clear()
+            self._buckets.clear()
+            self._version = version
+
+
+def _encode(texts: List[str]) -> Optional[np.ndarray]:
+    try:
+        return encode_texts(texts)
+    except Exception as e:
+        # Fall back to exact matches if the retrieval model isn't available
+        print(f"[mentor] Response cache can't embed: {e!r}")
+        return None
+
+
+_cache = MentorResponseCache(MENTOR_CACHE_SIZE, MENTOR_CACHE_TTL_SECONDS, MENTOR_CACHE_THRESHOLD)
+
+
+def has_fix(response: MentorHelpResponse) -> bool:
+    fix = (response.suggested_fix or "").strip()
+    return bool(fix) and fix != NO_FIX
+
+
+def cached_response(fp: Fingerprint, code: str) -> Optional[MentorHelpResponse]:
+    """
+    Cached response for `fp`: one with a fix only if it was for this code.
+    """
+    if fp.code:
+        return _cache.get([fp], _encode)
+    return _cache.get([fp._replace(code=code_hash(code)), fp], _encode)
+
+
+def cache_response(fp: Fingerprint, code: str, response: MentorHelpResponse) -> None:
+    if has_fix(response) and not fp.code:
+        fp = fp._replace(code=code_hash(code))
+    _cache.put(fp, response, _encode)
+
+
+def response_cache_stats() -> Dict[str, int]:
+    return _cache.stats()
@@ -0,0 +1,153 @@
+import os
+import re
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from importlib import metadata
+from typing import Dict, Optional, Tuple
+from app.models.run import RunResult
+from app.services.sandbox import REASON_COMPLETED, REASON_ERROR
+
+# Opt-in: set BONDO_RUN_CACHE_ENABLED=1 to serve repeated submissions from memory.
+RUN_CACHE_ENABLED = os.getenv("BONDO_RUN_CACHE_ENABLED", "0") == "1"
+RUN_CACHE_MAX_ENTRIES = int(os.getenv("BONDO_RUN_CACHE_MAX_ENTRIES", "1024"))
+RUN_CACHE_MAX_BYTES = int(os.getenv("BONDO_RUN_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Users can opt a snippet out of caching by putting this marker in a comment.
+NO_CACHE_MARKER = "bondo: no-cache"
+
+# Package versions that change what a snippet prints.
+KEY_PACKAGES = ["numpy", "scipy", "scikit-learn"]
+
+# Only runs that ended on their own are worth replaying.
+CACHEABLE_REASONS = {REASON_COMPLETED, REASON_ERROR}
+
+# Each run happens in a new temp dir, so tracebacks differ by path alone.
+_SCRIPT_PATH_RE = re.compile(r'File "[^"]*main\.py"')
+
+
+def _environment_fingerprint() -> str:
+    parts = [sys.executable, sys.version]
+    for name in KEY_PACKAGES:
+        try:
+            parts.append(f"{name}=={metadata.version(name)}")
+        except metadata.PackageNotFoundError:
+            parts.append(f"{name}==missing")
+    return "\n".join(parts)
+
+
+def _output_fingerprint(result: RunResult) -> str:
+    stderr = _SCRIPT_PATH_RE.sub('File "main.py"', result.stderr)
+    h = hashlib.sha256()
+    for part in (result.stdout, stderr, str(result.exit_code)):
+        h.update(part.encode("utf-8", errors="replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class RunResultCache:
+    """
+    Content-addressed LRU cache of run results, bounded by entry count and bytes.
+
+    A result is only served once the same submission has produced identical
+    output twice: the first run is remembered as a candidate, the second run
+    either confirms it (and it becomes cacheable) or marks the snippet as
+    non-deterministic so it is never cached.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[RunResult, int]]" = OrderedDict()
+        self._candidates: "OrderedDict[str, str]" = OrderedDict()
+        self._nondeterministic: "OrderedDict[str, None]" = OrderedDict()
+        self._bytes = 0
+        self._env = _environment_fingerprint()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, code: str, timeout_seconds: int) -> str:
+        h = hashlib.sha256()
+        for part in (self._env, str(timeout_seconds), code):
+            h.update(part.encode("utf-8", errors="replace"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[RunResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+        return result.model_copy(update={"cached": True, "queue_wait_seconds": 0.0})
+
+    def put(self, key: str, code: str, result: RunResult) -> None:
+        if NO_CACHE_MARKER in code:
+            return
+        if result.termination_reason not in CACHEABLE_REASONS:
+            return
+
+        size = len(result.stdout.encode("utf-8")) + len(result.stderr.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        fingerprint = _output_fingerprint(result)
+        with self._lock:
+            if key in self._nondeterministic or key in self._entries:
+                return
+
+            candidate = self._candidates.pop(key, None)
+            if candidate is None:
+                self._remember(self._candidates, key, fingerprint)
+                return
+            if candidate != fingerprint:
+                self._remember(self._nondeterministic, key, None)
+                return
+
+            self._entries[key] = (result.model_copy(), size)
+            self._bytes += size
+            self._evict()
+
+    def _remember(self, table: OrderedDict, key: str, value) -> None:
+        table[key] = value
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_cache: Optional[RunResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_run_cache() -> Optional[RunResultCache]:
+    """
+    Return the shared run cache, or None when caching is disabled.
+    """
+    global _cache
+    if not RUN_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RunResultCache(RUN_CACHE_MAX_ENTRIES, RUN_CACHE_MAX_BYTES)
+    return _cache
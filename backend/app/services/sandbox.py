@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import math
+import time
+import signal
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-run hard limits. They apply to every execution path (warm pool, cold
+# subprocess and streaming).
+RUN_MAX_THREADS = int(os.getenv("BONDO_RUN_MAX_THREADS", "1"))
+RUN_MAX_MEMORY_MB = int(os.getenv("BONDO_RUN_MAX_MEMORY_MB", "4096"))
+RUN_MAX_OPEN_FILES = int(os.getenv("BONDO_RUN_MAX_OPEN_FILES", "256"))
+# RLIMIT_NPROC counts every process of the uid, so this is only a meaningful
+# cap when the backend runs as a dedicated user.
+RUN_MAX_PROCESSES = int(os.getenv("BONDO_RUN_MAX_PROCESSES", "64"))
+RUN_MAX_FILE_SIZE_MB = int(os.getenv("BONDO_RUN_MAX_FILE_SIZE_MB", "64"))
+
+# Thread pools that numpy/scipy/sklearn may spin up. LOKY_MAX_CPU_COUNT is
+# what joblib uses to resolve n_jobs=-1.
+THREAD_LIMIT_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "LOKY_MAX_CPU_COUNT",
+]
+
+# Values for RunResult.termination_reason
+REASON_COMPLETED = "completed"
+REASON_ERROR = "error"
+REASON_TIMEOUT = "timeout"
+REASON_CPU_LIMIT = "cpu_limit"
+REASON_MEMORY_LIMIT = "memory_limit"
+REASON_OUTPUT_LIMIT = "output_limit"
+REASON_SIGNAL = "signal"
+
+
+def thread_limit_env() -> Dict[str, str]:
+    return {name: str(RUN_MAX_THREADS) for name in THREAD_LIMIT_ENV_VARS}
+
+
+def sandbox_env() -> Dict[str, str]:
+    """
+    Environment for a fresh interpreter running user code.
+    """
+    env = os.environ.copy()
+    env.update(thread_limit_env())
+    return env
+
+
+# Run as `python -c` before the user's interpreter: sets the rlimits passed
+# as JSON in argv[1], then execs argv[2:]. Standing in for a preexec_fn,
+# which isn't safe to run in a child forked from a threaded process.
+_LIMITS_WRAPPER = """
+import os, sys, json, resource
+for name, soft, hard in json.loads(sys.argv[1]):
+    which = getattr(resource, name, None)
+    if which is None:
+        continue
+    try:
+        current_hard = resource.getrlimit(which)[1]
+        if current_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        resource.setrlimit(which, (soft, hard))
+    except (ValueError, OSError):
+        pass
+os.execv(sys.argv[2], sys.argv[2:])
+"""
+
+
+def sandbox_command(args: List[str], timeout_seconds: float) -> List[str]:
+    """
+    `args` (an interpreter command line) wrapped so the per-run limits are
+    applied before it starts. Unchanged where rlimits aren't available.
+    """
+    if resource is None:
+        return list(args)
+    limits = json.dumps(resource_limits(timeout_seconds))
+    # -I -S: the wrapper only needs the stdlib, so skip site and the environment
+    return [sys.executable, "-I", "-S", "-c", _LIMITS_WRAPPER, limits, *args]
+
+
+def sandbox_subprocess_kwargs(timeout_seconds: float) -> Dict:
+    """
+    Popen / asyncio.create_subprocess_exec arguments for a fresh interpreter
+    started with sandbox_command().
+    """
+    kwargs = {"env": sandbox_env()}
+    if os.name == "posix":
+        # Own session so a kill takes the whole process group
+        kwargs["start_new_session"] = True
+    return kwargs
+
+
+def cpu_limit_seconds(timeout_seconds: float) -> int:
+    """
+    CPU budget for one run: the wall-clock budget times the allowed threads,
+    plus a second of slack for interpreter start-up.
+    """
+    return math.ceil(timeout_seconds * max(RUN_MAX_THREADS, 1)) + 1
+
+
+def resource_limits(timeout_seconds: float) -> List[Tuple[str, int, int]]:
+    """
+    (rlimit name, soft, hard) for one run.
+    """
+    mb = 1024 * 1024
+    cpu = cpu_limit_seconds(timeout_seconds)
+    return [
+        # Soft limit delivers SIGXCPU, the hard limit a second later SIGKILL.
+        ("RLIMIT_CPU", cpu, cpu + 1),
+        ("RLIMIT_AS", RUN_MAX_MEMORY_MB * mb, RUN_MAX_MEMORY_MB * mb),
+        ("RLIMIT_NOFILE", RUN_MAX_OPEN_FILES, RUN_MAX_OPEN_FILES),
+        ("RLIMIT_NPROC", RUN_MAX_PROCESSES, RUN_MAX_PROCESSES),
+        ("RLIMIT_FSIZE", RUN_MAX_FILE_SIZE_MB * mb, RUN_MAX_FILE_SIZE_MB * mb),
+    ]
+
+
+def apply_resource_limits(timeout_seconds: float) -> None:
+    """
+    Apply rlimits to the current process. Meant to run in the child right
+    before user code starts (the pool's fork child; fresh interpreters get
+    them from sandbox_command()).
+    """
+    if resource is None:
+        return
+
+    for name, soft, hard in resource_limits(timeout_seconds):
+        which = getattr(resource, name, None)
+        if which is None:
+            continue
+        try:
+            _, current_hard = resource.getrlimit(which)
+            if current_hard != resource.RLIM_INFINITY:
+                soft = min(soft, current_hard)
+                hard = min(hard, current_hard)
+            resource.setrlimit(which, (soft, hard))
+        except (ValueError, OSError):
+            # Not allowed to lower this one here (e.g. some macOS limits).
+            pass
+
+
+def kill_group(pid: int) -> None:
+    """
+    SIGKILL the process group led by `pid`, falling back to the process itself.
+    Only call this for a child that hasn't been reaped yet.
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def wait_for_exit(pid: int, timeout_seconds: float) -> Tuple[bool, int, Optional[object]]:
+    """
+    Wait for child `pid` to exit, killing its process group at the deadline.
+    Anything the job left running in the background is killed as well.
+
+    Returns (timed_out, wait status, rusage of the child).
+    """
+    deadline = time.monotonic() + timeout_seconds
+    delay = 0.001
+    timed_out = False
+    while True:
+        wpid, status, rusage = os.wait4(pid, os.WNOHANG)
+        if wpid:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            kill_group(pid)
+            _, status, rusage = os.wait4(pid, 0)
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.02)
+
+    # The child is reaped now, so only signal its group (never the bare pid,
+    # which may already belong to someone else).
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    return timed_out, status, rusage
+
+
+def exit_code_from_status(status: int) -> int:
+    """
+    Convert a wait status into a Popen-style return code (-N for signal N).
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def usage_from_rusage(rusage) -> Dict[str, Optional[float]]:
+    """
+    CPU and peak memory fields for RunResult from a child's rusage.
+    """
+    if rusage is None:
+        return {"cpu_user_seconds": None, "cpu_system_seconds": None, "peak_rss_mb": None}
+
+    # ru_maxrss is KB on Linux but bytes on macOS
+    rss_bytes = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return {
+        "cpu_user_seconds": round(rusage.ru_utime, 4),
+        "cpu_system_seconds": round(rusage.ru_stime, 4),
+        "peak_rss_mb": round(rss_bytes / (1024 * 1024), 2),
+    }
+
+
+def termination_reason(
+    exit_code: Optional[int],
+    timed_out: bool,
+    stderr: str = "",
+    cpu_seconds: Optional[float] = None,
+    cpu_limit: Optional[int] = None,
+) -> str:
+    """
+    Best guess at why a run ended, from how the process exited.
+    """
+    if timed_out:
+        return REASON_TIMEOUT
+    if exit_code == 0:
+        return REASON_COMPLETED
+    if exit_code is not None and exit_code < 0:
+        sig = -exit_code
+        if sig == getattr(signal, "SIGXCPU", None):
+            return REASON_CPU_LIMIT
+        if sig == signal.SIGKILL and cpu_seconds is not None and cpu_limit is not None \
+                and cpu_seconds >= cpu_limit:
+            return REASON_CPU_LIMIT
+        return REASON_SIGNAL
+    # Hitting RLIMIT_AS shows up as a MemoryError traceback, not a signal.
+    if "MemoryError" in stderr[-2000:]:
+        return REASON_MEMORY_LIMIT
+    return REASON_ERROR
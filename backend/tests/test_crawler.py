@@ -0,0 +1,207 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+import pytest
+from app.ingestion import fetch_chunk
+from app.ingestion.crawler import Crawler
+
+# Every page takes this long to serve, so concurrent fetches overlap
+PAGE_DELAY_SECONDS = 0.05
+
+PAGES = {
+    "/docs/index.html": ["/docs/a.html", "/docs/b.html", "/docs/guide/", "/other/out.html"],
+    "/docs/a.html": ["/docs/c.html", "/docs/index.html#top", "https://example.com/docs/x.html"],
+    "/docs/b.html": ["/docs/c.html", "/docs/d.html?version=2"],
+    "/docs/c.html": [],
+    "/docs/d.html": ["/docs/image.png"],
+    "/docs/guide/": ["/docs/e.html", "/docs/f.html"],
+    "/docs/e.html": [],
+    "/docs/f.html": [],
+    "/other/out.html": [],
+}
+
+
+class _DocsSite(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _DocsHandler)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # path -> request times, and the If-None-Match header of each request
+        self.requests: Dict[str, List[float]] = {}
+        self.validators: Dict[str, List[str]] = {}
+        # path -> statuses to answer with before serving the page
+        self.failures: Dict[str, List[int]] = {}
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _DocsHandler(BaseHTTPRequestHandler):
+    server: _DocsSite
+
+    def do_GET(self) -> None:
+        site = self.server
+        with site.lock:
+            site.in_flight += 1
+            site.max_in_flight = max(site.max_in_flight, site.in_flight)
+            site.requests.setdefault(self.path, []).append(time.monotonic())
+            site.validators.setdefault(self.path, []).append(self.headers.get("If-None-Match"))
+            failures = site.failures.get(self.path)
+            status = failures.pop(0) if failures else None
+        try:
+            time.sleep(PAGE_DELAY_SECONDS)
+            if status is not None:
+                self._send(status, b"unavailable")
+            elif self.path not in PAGES:
+                self._send(404, b"not found")
+            elif self.headers.get("If-None-Match") == _etag(self.path):
+                self._send(304, b"")
+            else:
+                links = "".join(f'<a href="{href}">link</a>' for href in PAGES[self.path])
+                self._send(200, f"<html><body>{links}</body></html>".encode(), {"ETag": _etag(self.path)})
+        finally:
+            with site.lock:
+                site.in_flight -= 1
+
+    def _send(self, status: int, body: bytes, headers: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def _etag(path: str) -> str:
+    return f'"{abs(hash(path))}"'
+
+
+@pytest.fixture
+def site():
+    server = _DocsSite()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def raw_html_dir(tmp_path, monkeypatch):
+    path = tmp_path / "raw_html"
+    path.mkdir()
+    monkeypatch.setattr(fetch_chunk, "RAW_HTML_DIR", path)
+    return path
+
+
+def _crawler(site: _DocsSite, tmp_path, page_states: Dict = None, **kwargs) -> Crawler:
+    options = {
+        "concurrency": 8,
+        "per_host_concurrency": 4,
+        "per_host_rps": 0,
+        "max_retries": 3,
+        "backoff_seconds": 0.05,
+    }
+    options.update(kwargs)
+    return Crawler(
+        seeds=[f"{site.base}/docs/index.html"],
+        prefix=f"{site.base}/docs/",
+        fetch=fetch_chunk.fetch_page,
+        page_states=page_states if page_states is not None else {},
+        frontier_path=tmp_path / "frontier.json",
+        **options,
+    )
+
+
+def test_crawl_follows_links_under_prefix(site, tmp_path, raw_html_dir):
+    fetched = _crawler(site, tmp_path).run(resume=False)
+
+    expected = {p for p in PAGES if p.startswith("/docs/")}
+    assert set(fetched) == {site.base + p for p in expected}
+    # Fragments and query strings don't make a page new; other paths and hosts aren't crawled
+    assert all(len(site.requests[p]) == 1 for p in expected)
+    assert "/other/out.html" not in site.requests
+    assert "/docs/image.png" not in site.requests
+
+
+def test_per_host_concurrency_limit(site, tmp_path, raw_html_dir):
+    _crawler(site, tmp_path, concurrency=8, per_host_concurrency=2).run(resume=False)
+
+    assert site.max_in_flight == 2
+
+
+def test_per_host_rate_limit(site, tmp_path, raw_html_dir):
+    rps = 20
+    _crawler(site, tmp_path, per_host_rps=rps).run(resume=False)
+
+    starts = sorted(t for times in site.requests.values() for t in times)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    # Allow for scheduling jitter between taking the slot and sending the request
+    assert min(gaps) >= 1 / rps * 0.5
+    assert starts[-1] - starts[0] >= (len(starts) - 1) / rps * 0.9
+
+
+def test_retries_with_backoff(site, tmp_path, raw_html_dir):
+    site.failures["/docs/b.html"] = [503, 502]
+
+    crawler = _crawler(site, tmp_path, backoff_seconds=0.1)
+    fetched = crawler.run(resume=False)
+
+    assert f"{site.base}/docs/b.html" in fetched
+    assert not crawler.failed
+    times = site.requests["/docs/b.html"]
+    assert len(times) == 3
+    # Backoff doubles: at least 0.1s, then 0.2s, on top of serving time
+    assert times[1] - times[0] >= 0.1
+    assert times[2] - times[1] >= 0.2
+
+
+def test_gives_up_after_max_retries(site, tmp_path, raw_html_dir):
+    site.failures["/docs/b.html"] = [503] * 10
+
+    crawler = _crawler(site, tmp_path, max_retries=2, backoff_seconds=0.01)
+    fetched = crawler.run(resume=False)
+
+    assert len(site.requests["/docs/b.html"]) == 3
+    assert f"{site.base}/docs/b.html" in crawler.failed
+    # Pages only linked from the failed one are never reached
+    assert f"{site.base}/docs/d.html" not in fetched
+    assert f"{site.base}/docs/a.html" in fetched
+
+
+def test_client_errors_are_not_retried(site, tmp_path, raw_html_dir):
+    site.failures["/docs/b.html"] = [404]
+
+    crawler = _crawler(site, tmp_path, backoff_seconds=0.01)
+    crawler.run(resume=False)
+
+    assert len(site.requests["/docs/b.html"]) == 1
+    assert f"{site.base}/docs/b.html" in crawler.failed
+
+
+def test_etag_revalidation_reuses_cached_pages(site, tmp_path, raw_html_dir):
+    first = _crawler(site, tmp_path).run(resume=False)
+    assert all(changed for _, changed in first.values())
+    assert all(state["etag"] == _etag(url[len(site.base):]) for url, (state, _) in first.items())
+    site.requests.clear()
+    site.validators.clear()
+
+    states = {url: state for url, (state, _) in first.items()}
+    second = _crawler(site, tmp_path, page_states=states).run(resume=False)
+
+    # Every page is revalidated with its ETag, answered 304 and read from disk,
+    # which still yields its links
+    assert set(second) == set(first)
+    assert all(not changed for _, changed in second.values())
+    assert all(validators == [_etag(path)] for path, validators in site.validators.items())
+    assert {url: state for url, (state, _) in second.items()} == states
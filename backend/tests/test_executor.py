@@ -0,0 +1,39 @@
+import sys
+import time
+import asyncio
+import pytest
+from app.services import executor
+
+# Runs a grandchild that writes `marker` after a while, then blocks
+SPAWNING_CODE = """
+import subprocess, sys, time
+subprocess.Popen([sys.executable, "-c", "import time; time.sleep(1.5); open({marker!r}, 'w').write('x')"])
+time.sleep(30)
+"""
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="process groups are POSIX only")
+
+
+def test_async_cold_run_timeout_kills_spawned_processes(tmp_path):
+    marker = tmp_path / "marker"
+
+    result = asyncio.run(executor._run_in_subprocess_async(SPAWNING_CODE.format(marker=str(marker)), 1))
+
+    assert result["termination_reason"] == "timeout"
+    time.sleep(2)
+    assert not marker.exists()
+
+
+def test_async_cold_run_cancel_kills_spawned_processes(tmp_path):
+    marker = tmp_path / "marker"
+
+    async def run_and_cancel():
+        task = asyncio.create_task(executor._run_in_subprocess_async(SPAWNING_CODE.format(marker=str(marker)), 20))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run_and_cancel())
+    time.sleep(2)
+    assert not marker.exists()
@@ -0,0 +1,39 @@
+import pytest
+from app.services.executor_pool import ExecutorPool, pool_supported
+
+pytestmark = pytest.mark.skipif(not pool_supported(), reason="the pool forks a child per job")
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ExecutorPool(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_job_output_is_captured(pool):
+    result = pool.run("import sys\nprint('out')\nprint('err', file=sys.stderr)\n", 5, 1000)
+
+    assert result["exit_code"] == 0
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+
+
+def test_output_files_are_not_in_working_dir(pool):
+    code = (
+        "import os\n"
+        "print(sorted(os.listdir('.')))\n"
+        "for name in ('.stdout', '.stderr'):\n"
+        "    open(name, 'w').write('forged')\n"
+    )
+
+    result = pool.run(code, 5, 1000)
+
+    assert result["stdout"] == "['main.py']\n"
+    assert result["stderr"] == ""
+
+
+def test_output_is_capped(pool):
+    result = pool.run("print('x' * 5000)\n", 5, 1000)
+
+    assert result["stdout"] == "x" * 1001
@@ -0,0 +1,258 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import mentor as mentor_api
+from app.services import llm_client, mentor, response_cache
+from app.services.mentor_stream import JsonObjectStream, _safe_cut
+
+# Escapes of every kind in the streamed field: \n, \", \\, \t, \u00e9 (é),
+# \ud83d\ude00 (a surrogate pair, 😀) and \/
+EXPLANATION = 'Line one\nSays "hi" at C:\\path\twith é and 😀 / done'
+REPLY = {
+    "explanation": EXPLANATION,
+    "suggested_fix": "X = X.reshape(-1, 1)",
+    "doc_references": [
+        {"id": "d1", "title": "LinearRegression", "text": "Fit a {linear} model.", "url": None, "score": 1.0},
+    ],
+    "confidence": 0.5,
+}
+# As a model writes it: ASCII-only, so non-ASCII text arrives as \u escapes
+RAW_REPLY = json.dumps(REPLY, ensure_ascii=True).replace("/", "\\/")
+
+CODE = "from sklearn.linear_model import LinearRegression\nLinearRegression().fit([1, 2], [1, 2])\n"
+
+
+def _feed_all(pieces: List[str]) -> Tuple[str, Dict]:
+    parser = JsonObjectStream()
+    deltas, fields = [], {}
+    for piece in pieces:
+        for kind, payload in parser.feed(piece):
+            if kind == "delta":
+                deltas.append(payload)
+            else:
+                key, value = payload
+                fields[key] = value
+    return "".join(deltas), fields
+
+
+def _split(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# -- JsonObjectStream ---------------------------------------------------------
+
+def test_parses_whole_reply():
+    explanation, fields = _feed_all([RAW_REPLY])
+
+    assert explanation == EXPLANATION
+    assert fields == REPLY
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7])
+def test_parses_reply_in_small_pieces(size):
+    explanation, fields = _feed_all(_split(RAW_REPLY, size))
+
+    assert explanation == EXPLANATION
+    assert fields == REPLY
+
+
+def test_every_split_point():
+    # Two pieces, split at every position, including inside each escape
+    for cut in range(len(RAW_REPLY) + 1):
+        explanation, fields = _feed_all([RAW_REPLY[:cut], RAW_REPLY[cut:]])
+        assert explanation == EXPLANATION, cut
+        assert fields == REPLY, cut
+
+
+def test_deltas_are_decoded_text_only():
+    parser = JsonObjectStream()
+    deltas = []
+    for ch in RAW_REPLY:
+        deltas.extend(payload for kind, payload in parser.feed(ch) if kind == "delta")
+
+    # Pieces never end inside an escape or between the halves of a surrogate
+    # pair, so each is valid text on its own
+    assert "".join(deltas) == EXPLANATION
+    for delta in deltas:
+        delta.encode("utf-8")
+    assert "😀" in deltas
+
+
+def test_skips_text_before_the_object():
+    explanation, fields = _feed_all(["```json\n", RAW_REPLY, "\n```"])
+
+    assert explanation == EXPLANATION
+    assert fields["suggested_fix"] == REPLY["suggested_fix"]
+
+
+def test_fields_arrive_as_soon_as_complete():
+    parser = JsonObjectStream()
+    end_of_fix = RAW_REPLY.index('"doc_references"')
+
+    events = parser.feed(RAW_REPLY[:end_of_fix])
+    assert ("field", ("suggested_fix", REPLY["suggested_fix"])) in events
+    assert not any(kind == "field" and payload[0] == "doc_references" for kind, payload in events)
+
+    events = parser.feed(RAW_REPLY[end_of_fix:])
+    assert ("field", ("doc_references", REPLY["doc_references"])) in events
+
+
+@pytest.mark.parametrize(
+    "raw, cut",
+    [
+        ("abc", 3),
+        ("ab\\", 2),
+        ("ab\\u00", 2),
+        ("ab\\u00e9", 8),
+        ("ab\\\\", 4),
+        ("ab\\ud83d", 2),
+        ("ab\\ud83d\\u", 2),
+        ("ab\\ud83d\\ude00", 14),
+    ],
+)
+def test_safe_cut(raw, cut):
+    assert _safe_cut(raw) == cut
+
+
+# -- /mentor/help/stream --------------------------------------------------------
+
+class _FakeOpenAI(ThreadingHTTPServer):
+    """
+    OpenAI-compatible chat completions server that streams `pieces` as the
+    reply's content, one SSE chunk each.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, pieces: List[str]) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeOpenAIHandler)
+        self.pieces = pieces
+        self.bodies: List[Dict] = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: _FakeOpenAI
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.bodies.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        base = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": body["model"]}
+        for piece in self.server.pieces:
+            chunk = {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        done = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    servers = []
+
+    def start(pieces: List[str]) -> _FakeOpenAI:
+        server = _FakeOpenAI(pieces)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm_client, "_async_client", None)
+        return server
+
+    # Retrieval needs a built vector store; the stream doesn't depend on it
+    monkeypatch.setattr(mentor, "_retrieve", lambda code, error, question: [])
+    # Exact matches only, so the cache never loads the embedding model
+    monkeypatch.setattr(response_cache, "_cache", response_cache.MentorResponseCache(16, 0, 1.0))
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(mentor_api.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _sse_events(text: str) -> List[Tuple[str, object]]:
+    events = []
+    for frame in text.split("\n\n"):
+        if not frame.strip():
+            continue
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _post_stream(client: TestClient, **request) -> List[Tuple[str, object]]:
+    with client.stream("POST", "/mentor/help/stream", json={"code": CODE, **request}) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        return _sse_events(resp.read().decode())
+
+
+@pytest.mark.parametrize("size", [1, 3, 8])
+def test_stream_endpoint(fake_openai, client, size):
+    server = fake_openai(_split(RAW_REPLY, size))
+
+    events = _post_stream(client, error="ValueError: Expected 2D array, got 1D array instead", run_code=False)
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "end"
+    assert kinds.count("end") == 1
+    assert "error" not in kinds
+    # The explanation arrives in pieces before anything else completes
+    assert kinds.index("explanation") < kinds.index("suggested_fix") < kinds.index("doc_references")
+    assert "".join(payload for kind, payload in events if kind == "explanation") == EXPLANATION
+
+    end = events[-1][1]
+    assert end["explanation"] == EXPLANATION
+    assert end["suggested_fix"] == REPLY["suggested_fix"]
+    assert [ref["id"] for ref in end["doc_references"]] == ["d1"]
+    assert end["meta"]["cached"] is False
+    assert "llm_first_token" in end["meta"]["timings_ms"]
+    assert server.bodies[0]["stream"] is True
+
+
+def test_stream_endpoint_serves_repeats_from_cache(fake_openai, client):
+    server = fake_openai(_split(RAW_REPLY, 5))
+    request = {"error": "ValueError: Expected 2D array, got 1D array instead", "run_code": False}
+
+    first = _post_stream(client, **request)
+    second = _post_stream(client, **request)
+
+    assert len(server.bodies) == 1
+    assert [kind for kind, _ in second] == ["explanation", "suggested_fix", "doc_references", "end"]
+    assert second[0][1] == EXPLANATION
+    assert second[-1][1]["meta"]["cached"] is True
+    assert second[-1][1]["explanation"] == first[-1][1]["explanation"]
+
+
+def test_stream_endpoint_reports_errors_in_band(fake_openai, client, monkeypatch):
+    fake_openai(_split(RAW_REPLY, 5))
+
+    def fail(code, error, question):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(mentor, "_retrieve", fail)
+    events = _post_stream(client, question="how do I fit this?", run_code=False)
+
+    assert events == [("error", "index unavailable")]
@@ -0,0 +1,66 @@
+import numpy as np
+from app.models.mentor import MentorHelpResponse
+from app.services import response_cache
+from app.services.response_cache import cache_response, cached_response, fingerprint
+
+ERROR = "ValueError: Expected 2D array, got 1D array instead"
+
+CODE_A = "from sklearn.linear_model import LinearRegression\nLinearRegression().fit([1, 2], [1, 2])\n"
+CODE_B = "from sklearn.linear_model import LinearRegression\nx = [3, 4, 5]\nLinearRegression().fit(x, x)\n"
+
+
+def _response(fix: str) -> MentorHelpResponse:
+    return MentorHelpResponse(explanation="Reshape X to 2D.", suggested_fix=fix, doc_references=[], confidence=0.5)
+
+
+def _use_cache(monkeypatch, threshold: float = 1.0) -> None:
+    monkeypatch.setattr(response_cache, "_cache", response_cache.MentorResponseCache(16, 0, threshold))
+
+
+def test_fix_is_not_shared_between_snippets(monkeypatch):
+    _use_cache(monkeypatch)
+    fp_a = fingerprint(CODE_A, ERROR, None, "sklearn")
+    fp_b = fingerprint(CODE_B, ERROR, None, "sklearn")
+    assert fp_a == fp_b
+
+    cache_response(fp_a, CODE_A, _response("X = [[1], [2]]"))
+
+    assert cached_response(fp_b, CODE_B) is None
+    assert cached_response(fp_a, CODE_A).suggested_fix == "X = [[1], [2]]"
+    # Comments and spacing don't make it different code
+    assert cached_response(fp_a, "# fit it\n" + CODE_A.replace(", ", ",")) is not None
+
+
+def test_each_snippet_keeps_its_own_fix(monkeypatch):
+    _use_cache(monkeypatch)
+    fp = fingerprint(CODE_A, ERROR, None, "sklearn")
+
+    cache_response(fp, CODE_A, _response("X = [[1], [2]]"))
+    cache_response(fp, CODE_B, _response("x = [[3], [4], [5]]"))
+
+    assert cached_response(fp, CODE_A).suggested_fix == "X = [[1], [2]]"
+    assert cached_response(fp, CODE_B).suggested_fix == "x = [[3], [4], [5]]"
+
+
+def test_response_without_fix_is_shared(monkeypatch):
+    _use_cache(monkeypatch)
+    fp = fingerprint(CODE_A, ERROR, None, "sklearn")
+
+    cache_response(fp, CODE_A, _response("No change needed."))
+
+    assert cached_response(fp, CODE_B).explanation == "Reshape X to 2D."
+
+
+def test_near_duplicate_error_does_not_share_fix(monkeypatch):
+    _use_cache(monkeypatch, threshold=0.95)
+    # Every text embeds the same, so any error in the bucket is a near-duplicate
+    monkeypatch.setattr(response_cache, "_encode", lambda texts: np.ones((len(texts), 1), dtype="float32"))
+    fp_a = fingerprint(CODE_A, ERROR, None, "sklearn")
+    fp_b = fingerprint(CODE_B, ERROR.replace("1D", "a 1D"), None, "sklearn")
+
+    cache_response(fp_a, CODE_A, _response("X = [[1], [2]]"))
+    assert cached_response(fp_b, CODE_B) is None
+    assert cached_response(fp_b, CODE_A).suggested_fix == "X = [[1], [2]]"
+
+    cache_response(fp_a, CODE_A, _response("No change needed."))
+    assert cached_response(fp_b, CODE_B).suggested_fix == "No change needed."